@@ -16,6 +16,10 @@ DEFAULT_IGNORE_ADDRS = [('127.0.0.1', 53)]
 
 ENABLE_TCP_DATA_MATCHING = None
 
+# find_tcp_matches only compares sockets whose streams start with the
+# same MATCH_KEY_SIZE bytes, where that many are known on both ends.
+MATCH_KEY_SIZE = 16
+
 
 HOST_INFO = []
 TRACE_INFO = {}
@@ -117,14 +121,22 @@ def initialize_hosts(config_filename, enable_tcp_data_matching):
 
       filename = os.path.join(base_dir, tokens[0])
 
-      trace = posix_preprocessor.get_trace_from_filename(filename)
-      trace = posix_preprocessor.preprocess_trace(trace, trace_id)
-      trace_dict[trace_id] = trace
-
+      # With TCP data matching, find_tcp_matches reads the trace through
+      # first and it is parsed then, for both.
       if ENABLE_TCP_DATA_MATCHING:
-        trace_copy = posix_preprocessor.get_trace_from_filename(filename)
-        trace_copy = posix_preprocessor.preprocess_trace(trace_copy, trace_id, False)
+        trace_copy, trace = \
+            posix_preprocessor.get_trace_batches_from_filename_once(filename)
+        trace_copy = posix_preprocessor.preprocess_trace_batches(trace_copy,
+            trace_id, False, is_ignored_addr)
         trace_dict_copy[trace_id] = trace_copy
+      else:
+        trace = posix_preprocessor.get_trace_batches_from_filename(filename)
+
+      # The traces are only preprocessed once the whole configuration, and
+      # so every address to ignore, has been read.
+      trace = posix_preprocessor.preprocess_trace_batches(trace, trace_id,
+          True, is_ignored_addr)
+      trace_dict[trace_id] = trace
 
       TRACE_INFO[trace_id] = {'name': name, 'host': host, 'file': filename}
 
@@ -219,14 +231,18 @@ def initialize_unit_test(trace_filename_list, enable_tcp_data_matching):
     name = "trace" + trace_id
     print " trace", trace_id, "(" + filename + ")"
 
-    trace = posix_preprocessor.get_trace_from_filename(filename)
-    trace = posix_preprocessor.preprocess_trace(trace, trace_id)
-    trace_dict[trace_id] = trace
-
     if ENABLE_TCP_DATA_MATCHING:
-      trace_copy = posix_preprocessor.get_trace_from_filename(filename)
-      trace_copy = posix_preprocessor.preprocess_trace(trace_copy, trace_id, False)
+      trace_copy, trace = \
+          posix_preprocessor.get_trace_batches_from_filename_once(filename)
+      trace_copy = posix_preprocessor.preprocess_trace_batches(trace_copy,
+          trace_id, False, is_ignored_addr)
       trace_dict_copy[trace_id] = trace_copy
+    else:
+      trace = posix_preprocessor.get_trace_batches_from_filename(filename)
+
+    trace = posix_preprocessor.preprocess_trace_batches(trace, trace_id,
+        True, is_ignored_addr)
+    trace_dict[trace_id] = trace
 
     TRACE_INFO[trace_id] = {'name': name, 'host': 0, 'file': filename}
 
@@ -259,24 +275,75 @@ def find_tcp_matches(trace_dict):
   for accepting_sock in accept_sock_list:
     tcp_sockets.add(accepting_sock['name'])
 
+  # Index the accepting sockets by the start of the data they sent and
+  # received, with None for a stream whose start isn't known, which the
+  # other end can't be told apart by.
+  accept_index = {}
+  accept_sent_index = {}
+  accept_received_index = {}
+
+  for accepting_sock in accept_sock_list:
+    sent_key = get_match_key(accepting_sock['sent'])
+    received_key = get_match_key(accepting_sock['received'])
+    accept_index.setdefault((sent_key, received_key), []).append(accepting_sock)
+    accept_sent_index.setdefault(sent_key, []).append(accepting_sock)
+    accept_received_index.setdefault(received_key, []).append(accepting_sock)
+
   for connecting_sock in connect_sock_list:
-    for accepting_sock in accept_sock_list:
-      if connecting_sock['rcvlen'] > accepting_sock['sndlen'] or \
-          accepting_sock['rcvlen'] > connecting_sock['sndlen']:
+    sent_key = get_match_key(connecting_sock['sent'])
+    received_key = get_match_key(connecting_sock['received'])
+
+    if sent_key is not None and received_key is not None:
+      candidates = []
+      for key in [(received_key, sent_key), (received_key, None),
+                  (None, sent_key), (None, None)]:
+        candidates.extend(accept_index.get(key, []))
+    elif received_key is not None:
+      candidates = (accept_sent_index.get(received_key, []) +
+                    accept_sent_index.get(None, []))
+    elif sent_key is not None:
+      candidates = (accept_received_index.get(sent_key, []) +
+                    accept_received_index.get(None, []))
+    else:
+      candidates = accept_sock_list
+
+    for accepting_sock in candidates:
+      connect_sent = connecting_sock['sent']
+      connect_received = connecting_sock['received']
+      accept_sent = accepting_sock['sent']
+      accept_received = accepting_sock['received']
+
+      if connect_received.length > accept_sent.length or \
+          accept_received.length > connect_sent.length:
         continue
 
-      length = min(connecting_sock['rcvlen'], accepting_sock['sndlen'])
-      if connecting_sock['rcvbuf'][:length] != accepting_sock['sndbuf'][:length]:
+      if not connect_received.is_prefix_match(accept_sent,
+                                              connect_received.length):
         continue
 
-      length = min(accepting_sock['rcvlen'], connecting_sock['sndlen'])
-      if accepting_sock['rcvbuf'][:length] != connecting_sock['sndbuf'][:length]:
+      if not accept_received.is_prefix_match(connect_sent,
+                                             accept_received.length):
         continue
 
       tcp_matches.add((connecting_sock['name'], accepting_sock['name']))
 
 
 
+def get_match_key(fingerprint):
+  """
+  Returns the first MATCH_KEY_SIZE bytes of the stream the fingerprint
+  was taken of, or None if fewer are known. If a stream and the one at
+  the other end of its connection both have a key, the keys are the same.
+  """
+
+  if fingerprint.known < MATCH_KEY_SIZE or \
+      len(fingerprint.head) < MATCH_KEY_SIZE:
+    return None
+
+  return fingerprint.head[:MATCH_KEY_SIZE]
+
+
+
 def is_socket_match(connecting_sock, accepting_sock):
   """
   Returns True if the sockets look like they might form a connection.
@@ -301,6 +368,28 @@ def is_connected_socket(sock):
 
 
 
+def is_ignored_addr(ip, port):
+  """
+  Returns True if the address was listed with 'ignore' in the
+  configuration file or is one of DEFAULT_IGNORE_ADDRS. Unlike
+  addr_dont_care, this doesn't depend on the hosts configured.
+  """
+
+  if not ip:
+    return False
+
+  try:
+    ip = ipaddr.IPAddress(ip)
+  except ValueError:
+    return False
+
+  if ip.version == 6 and ip.ipv4_mapped:
+    ip = ip.ipv4_mapped
+
+  return (ip, port) in IGNORE_ADDRS or (ip, 0) in IGNORE_ADDRS
+
+
+
 def addr_dont_care(ip, port):
   """
   If it returns True, then this is an address that we don't care about.
@@ -311,14 +400,14 @@ def addr_dont_care(ip, port):
   if not ip:
     return False
 
+  if is_ignored_addr(ip, port):
+    return True
+
   ip = ipaddr.IPAddress(ip)
 
   if ip.version == 6 and ip.ipv4_mapped:
     ip = ip.ipv4_mapped
 
-  if (ip, port) in IGNORE_ADDRS or (ip, 0) in IGNORE_ADDRS:
-    return True
-
   if ip.is_unspecified or ip.is_loopback or ip.is_multicast:
     return False
 
@@ -27,6 +27,7 @@ import socket
 # source: http://code.google.com/p/ipaddr-py/
 from ipaddr import IPAddress
 import ip_matching
+import payload_digest
 
 from trace_ordering import SyscallException
 from trace_ordering import SyscallError
@@ -704,10 +705,7 @@ def send_syscall(node_name, args, ret):
       return (0, None)
 
    elif msg_len > 0:
-      msg = msg.decode('string_escape')
-
-      if len(msg) > msg_len:
-         msg = msg[:msg_len]
+      msg = get_payload(msg, msg_len)
 
    elif err != 'EPIPE' and err != 'ECONNRESET':
       if err == 'EAGAIN' or err == 'EWOULDBLOCK':
@@ -744,7 +742,7 @@ def send_syscall(node_name, args, ret):
 
          # simulate sending the msg by adding the msg in the string buffer of the socket
          if len(t['a_buffer'][0]) == t['a_buffer'][1]:
-            t['a_buffer'] = (t['a_buffer'][0] + msg, t['a_buffer'][1] + msg_len, t['a_buffer'][2] + msg_len)
+            t['a_buffer'] = (add_to_buffer(t['a_buffer'][0], msg), t['a_buffer'][1] + msg_len, t['a_buffer'][2] + msg_len)
          else:
             t['a_buffer'] = (t['a_buffer'][0], t['a_buffer'][1] + msg_len, t['a_buffer'][2] + msg_len)
 
@@ -774,7 +772,7 @@ def send_syscall(node_name, args, ret):
                raise SyscallError("send_syscall", 'CONN_NOT_CLOSED', "The connection has not been closed yet.")
 
          if len(t['c_buffer'][0]) == t['c_buffer'][1]:
-            t['c_buffer'] = (t['c_buffer'][0] + msg, t['c_buffer'][1] + msg_len, t['c_buffer'][2] + msg_len)
+            t['c_buffer'] = (add_to_buffer(t['c_buffer'][0], msg), t['c_buffer'][1] + msg_len, t['c_buffer'][2] + msg_len)
          else:
             t['c_buffer'] = (t['c_buffer'][0], t['c_buffer'][1] + msg_len, t['c_buffer'][2] + msg_len)
 
@@ -882,11 +880,8 @@ def sendto_syscall(node_name, args, ret):
       else:
          raise SyscallWarning("sendto_syscall", 'UNEXPECTED_FAILURE', "Sendto failed unexpectedly.")
 
-   msg = msg.decode('string_escape')
-
    # especially for sendmsg
-   if len(msg) > msg_len:
-      msg = msg[:msg_len]
+   msg = get_payload(msg, msg_len)
 
    # look for existing mappings we can use
    for t in udp_tuples:
@@ -1066,11 +1061,7 @@ def recv_syscall(node_name, args, ret):
    if msg_len > buf_len:
       raise SyscallWarning("recv_syscall", 'MSG_BIGGER_THAN_BUFFER', "[Application Error] Message is bigger than the buffer size!!")
 
-   msg = msg.decode('string_escape')
-   msg_received = ""
-
-   if len(msg) > msg_len:
-      msg = msg[:msg_len]
+   msg = get_payload(msg, msg_len)
 
    #if flags == MSG_OOB and ('oobdata' not in sockets[(node_name, sock)] or sockets[(node_name, sock)]['oobdata'] != 1):
    #   raise SyscallWarning ("recv_syscall", 'OOB_DATA', 'Receiving out-of-band data..')
@@ -1088,9 +1079,7 @@ def recv_syscall(node_name, args, ret):
             raise SyscallError("recv_syscall", 'NETWORK_ERROR_%s%d' % (node_name, sock), "[Possible Network Misbehavior] \
                   Data 'in the air' or connection not closed but recv/read returns 0 bytes.")
 
-         msg_received = t['c_buffer'][0][:len(msg)]
-
-         if msg_received != msg[:len(msg_received)]:
+         if not is_buffer_match(t['c_buffer'][0], msg):
 
             # Let's start ignoring this connection and carry on since we
             # can't really recover from a data mismatch.
@@ -1111,7 +1100,7 @@ def recv_syscall(node_name, args, ret):
             return (msg_len, None)
 
          # simulate the networks' behavior by removing the part that is received form the stream buffer of the sender
-         t['c_buffer'] = (t['c_buffer'][0][msg_len:], t['c_buffer'][1] - msg_len, t['c_buffer'][2])
+         t['c_buffer'] = (remove_from_buffer(t['c_buffer'][0], msg, msg_len), t['c_buffer'][1] - msg_len, t['c_buffer'][2])
 
          # remove any entry from poll_timeout that does receive something
          if (node_name, sock) in poll_timeout:
@@ -1132,9 +1121,7 @@ def recv_syscall(node_name, args, ret):
             raise SyscallError("recv_syscall", 'NETWORK_ERROR_%s%d' % (node_name, sock), "[Possible Network Misbehavior] \
                   Data 'in the air' or connection not closed but recv/read returns 0 bytes.")
 
-         msg_received = t['a_buffer'][0][:len(msg)]
-
-         if msg_received != msg[:len(msg_received)]:
+         if not is_buffer_match(t['a_buffer'][0], msg):
             # Let's start ignoring this connection and carry on since we
             # can't really recover from a data mismatch.
             active_sockets.discard(t['accepting_fd'])
@@ -1151,7 +1138,7 @@ def recv_syscall(node_name, args, ret):
          if flags == MSG_PEEK:
             return (msg_len, None)
 
-         t['a_buffer'] = (t['a_buffer'][0][msg_len:], t['a_buffer'][1] - msg_len, t['a_buffer'][2])
+         t['a_buffer'] = (remove_from_buffer(t['a_buffer'][0], msg, msg_len), t['a_buffer'][1] - msg_len, t['a_buffer'][2])
 
          # remove any entry from poll_timeout that does receive something
          if (node_name, sock) in poll_timeout:
@@ -1234,12 +1221,9 @@ def recvfrom_syscall(node_name, args, ret):
 
    if sockets[(node_name, sock)]['protocol'] == IPPROTO_UDP:
 
-      msg = msg.decode('string_escape')
-
       # for recvmsg, I noticed that even if the #bytes are correct the buffer is fully filled, even if len(msg) < len(buffer)
       # so for these cases I only compare the first x bytes, where x = #bytes returned 
-      if len(msg) > msg_len:
-         msg = msg[:msg_len]
+      msg = get_payload(msg, msg_len)
 
       if multiaddr != '':
          local_ip = multiaddr
@@ -2145,6 +2129,68 @@ def care_about_fd_list(node_name, fd_list):
 
 
 
+def get_payload(msg, msg_len):
+   """
+   Returns the bytes a send or receive call with the given payload from
+   the trace transferred, as far as strace captured them. Payload digests
+   (see posix_preprocessor.ENABLE_PAYLOAD_DIGESTS) already are.
+   """
+
+   if isinstance(msg, payload_digest.PayloadDigest):
+      return msg
+
+   msg = msg.decode('string_escape')
+
+   if len(msg) > msg_len:
+      msg = msg[:msg_len]
+
+   return msg
+
+
+
+def add_to_buffer(data, msg):
+   """
+   Returns the known data in a TCP send buffer with msg added to it.
+   """
+
+   if isinstance(msg, payload_digest.PayloadDigest) or \
+         isinstance(data, payload_digest.PayloadStream):
+      if not isinstance(data, payload_digest.PayloadStream):
+         data = payload_digest.PayloadStream()
+      return data.send(msg)
+
+   return data + msg
+
+
+
+def is_buffer_match(data, msg):
+   """
+   Returns whether msg, the data captured of a receive, matches the known
+   data at the front of a TCP send buffer.
+   """
+
+   if isinstance(data, payload_digest.PayloadStream):
+      return data.is_match(msg)
+
+   msg_received = data[:len(msg)]
+
+   return msg_received == msg[:len(msg_received)]
+
+
+
+def remove_from_buffer(data, msg, msg_len):
+   """
+   Returns the known data in a TCP send buffer once msg_len bytes, of
+   which msg was captured, have been received.
+   """
+
+   if isinstance(data, payload_digest.PayloadStream):
+      return data.receive(msg, msg_len)
+
+   return data[msg_len:]
+
+
+
 ##### System call mappings #####
 
 SYSCALL_DICT = {
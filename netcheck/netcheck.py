@@ -11,6 +11,9 @@ import model_network_syscalls as model
 import trace_ordering
 import posix_output
 import ip_matching
+import trace_index
+import posix_test_harness_functions as parser
+import json
 import sys
 
 
@@ -20,6 +23,10 @@ import sys
 # up TCP connections.
 ENABLE_TCP_DATA_MATCHING = False
 
+# If set, the counts of what the parser did with each trace line are
+# written to this file as JSON at the end of a run.
+PARSE_COUNTERS_FILENAME = None
+
 
 # System calls that received data over the network.
 RECV_SYSCALLS = [
@@ -142,7 +149,11 @@ def main():
 
   trace_dict = None
 
-  if len(sys.argv) >= 2 and sys.argv[1] == '-u':
+  if len(sys.argv) >= 2 and sys.argv[1] == 'index':
+    trace_index.main(sys.argv[2:])
+    return
+
+  elif len(sys.argv) >= 2 and sys.argv[1] == '-u':
     trace_filenames = sys.argv[2:]
     trace_dict = ip_matching.initialize_unit_test(trace_filenames,
         ENABLE_TCP_DATA_MATCHING)
@@ -154,6 +165,7 @@ def main():
 
   else:
     print "usage: python posix_ordering.py CONFIG_FILE"
+    print "       python posix_ordering.py index [-j PROCESSES] CONFIG_FILE_OR_DIR [...]"
     return
 
   try:
@@ -166,6 +178,12 @@ def main():
   else:
     posix_output.analyze_results()
 
+  if PARSE_COUNTERS_FILENAME is not None:
+    counters_file = open(PARSE_COUNTERS_FILENAME, 'w')
+    json.dump(parser.parseCounters.asDict(), counters_file, indent=2,
+              sort_keys=True)
+    counters_file.close()
+
 
 if __name__ == "__main__":
   main()
@@ -0,0 +1,431 @@
+"""
+Purpose: To stand in for the payloads of send and receive calls when
+only whether the bytes received match the bytes sent matters, so that
+memory use doesn't grow with the amount of data crossing a connection
+(see ENABLE_PAYLOAD_DIGESTS in posix_preprocessor).
+
+A payload is kept as its length, a hash of its bytes and a sample of its
+first few bytes for output. The hash is the polynomial with the
+payload's bytes as coefficients at HASH_BASE, modulo a prime, so the
+hash of two payloads joined together can be worked out from their
+hashes and lengths, and bytes sent and received
+in differently sized pieces can be compared wherever a send and a
+receive end at the same offset in the stream.
+
+StreamFingerprint uses the same hashes to sum up everything sent or
+received on a socket in constant space, for ip_matching to match up TCP
+connections by their data.
+
+"""
+
+import itertools
+import operator
+import struct
+from collections import deque
+
+
+# Payload hashes are taken modulo this (Mersenne) prime.
+HASH_MODULUS = 2 ** 61 - 1
+
+# The point payload polynomials are evaluated at. It can't be a power of
+# two: 2 ** 61 is 1 modulo HASH_MODULUS, so with a base of 256 swapping
+# bytes (or blocks of bytes) 61 apart doesn't change the hash.
+HASH_BASE = 0x0b7e151628aed2a7
+
+# Hashes of every pair of bytes, and the powers of HASH_BASE pairs are
+# multiplied by in a chunk of HASH_CHUNK_PAIRS pairs, so get_hash can
+# work through a payload a chunk at a time instead of a byte at a time.
+HASH_CHUNK_PAIRS = 4096
+PAIR_HASHES = [(first * HASH_BASE + second) % HASH_MODULUS
+               for first in xrange(256) for second in xrange(256)]
+CHUNK_POWERS = [pow(HASH_BASE, 2 * i, HASH_MODULUS)
+                for i in reversed(xrange(HASH_CHUNK_PAIRS))]
+
+# How many of the first bytes of a payload its digest keeps, to show in
+# output and to compare short prefixes exactly.
+SAMPLE_SIZE = 64
+
+# How many of the first bytes of a stream its fingerprint keeps, and the
+# offsets into the stream past those where it keeps the hash of the bytes
+# so far.
+FINGERPRINT_HEAD_SIZE = 4 * 1024
+FINGERPRINT_OFFSETS = (64 * 1024, 1024 * 1024)
+
+
+
+def get_hash(data):
+  """
+  Returns the hash of the given byte string.
+  """
+
+  if not data:
+    return 0
+
+  data_hash = 0
+
+  if len(data) % 2:
+    data_hash = ord(data[0])
+    data = data[1:]
+
+  pairs = struct.unpack('>%dH' % (len(data) / 2), data)
+
+  for start in xrange(0, len(pairs), HASH_CHUNK_PAIRS):
+    chunk = pairs[start:start + HASH_CHUNK_PAIRS]
+    chunk_hash = sum(itertools.imap(operator.mul,
+        itertools.imap(PAIR_HASHES.__getitem__, chunk),
+        CHUNK_POWERS[HASH_CHUNK_PAIRS - len(chunk):]))
+    data_hash = join_hashes(data_hash, chunk_hash % HASH_MODULUS,
+                            2 * len(chunk))
+
+  return data_hash
+
+
+
+def join_hashes(first_hash, second_hash, second_length):
+  """
+  Returns the hash of two byte strings joined together, given the hash of
+  each and the length of the second.
+  """
+
+  return (first_hash * pow(HASH_BASE, second_length, HASH_MODULUS) +
+          second_hash) % HASH_MODULUS
+
+
+
+def get_payload_digest(data):
+  """
+  Returns a PayloadDigest of the given byte string.
+  """
+
+  return PayloadDigest(len(data), get_hash(data), data[:SAMPLE_SIZE])
+
+
+
+class PayloadDigest(object):
+  """
+  A payload as its length, hash and first bytes. Digests compare and hash
+  like the payloads they stand for and have the same len(), so they can
+  be used as datagram dictionary keys and counted in place of strings.
+
+  Adding to a digest with += extends it in place and remembers the hash
+  of the prefix at each join, which is what [:n] returns. A prefix that
+  can't be worked out this way (or from the sample) has no hash and
+  compares equal to any payload of its length, the same way data strace
+  truncated is only compared as far as it was captured.
+  """
+
+  __slots__ = ('length', 'hash', 'sample', 'prefixes')
+
+  def __init__(self, length, hash, sample, prefixes=None):
+    self.length = length
+    self.hash = hash
+    self.sample = sample
+    self.prefixes = prefixes
+
+
+  def __len__(self):
+    return self.length
+
+
+  def __repr__(self):
+    if len(self.sample) < self.length:
+      return repr(self.sample) + '...'
+    return repr(self.sample)
+
+
+  def __eq__(self, other):
+    if isinstance(other, str):
+      other = get_payload_digest(other)
+    elif not isinstance(other, PayloadDigest):
+      return NotImplemented
+
+    if self.length != other.length:
+      return False
+    if self.hash is None or other.hash is None:
+      return True
+    return self.hash == other.hash
+
+
+  def __ne__(self, other):
+    equal = self.__eq__(other)
+    if equal is NotImplemented:
+      return equal
+    return not equal
+
+
+  def __hash__(self):
+    if self.hash is None:
+      raise TypeError("a payload prefix with no hash is unhashable")
+    return hash((self.length, self.hash))
+
+
+  def __add__(self, other):
+    if isinstance(other, str):
+      other = get_payload_digest(other)
+
+    sample = self.sample
+    if len(sample) == self.length:
+      sample = (sample + other.sample)[:SAMPLE_SIZE]
+
+    if self.hash is None or other.hash is None:
+      joined_hash = None
+    else:
+      joined_hash = join_hashes(self.hash, other.hash, other.length)
+
+    return PayloadDigest(self.length + other.length, joined_hash, sample)
+
+
+  def __radd__(self, other):
+    if not isinstance(other, str):
+      return NotImplemented
+
+    joined = get_payload_digest(other) + self
+    joined.prefixes = {}
+    if other:
+      joined.prefixes[len(other)] = get_hash(other)
+    return joined
+
+
+  def __iadd__(self, other):
+    if self.prefixes is None:
+      return self + other
+
+    if isinstance(other, str):
+      other = get_payload_digest(other)
+
+    if not other.length:
+      return self
+
+    joined = self + other
+    self.prefixes[self.length] = self.hash
+    self.length = joined.length
+    self.hash = joined.hash
+    self.sample = joined.sample
+    return self
+
+
+  def __getitem__(self, index):
+    if not isinstance(index, slice) or index.start or index.step:
+      raise TypeError("payload digests only support prefix slices")
+
+    length = index.stop
+    if length is None or length >= self.length:
+      return self
+
+    if length <= len(self.sample):
+      return get_payload_digest(self.sample[:length])
+
+    if self.prefixes and length in self.prefixes:
+      return PayloadDigest(length, self.prefixes[length], self.sample)
+
+    return PayloadDigest(length, None, self.sample)
+
+
+  def startswith(self, prefix):
+    """
+    Returns True if prefix is known to be the start of this payload.
+    """
+
+    if prefix.length > self.length:
+      return False
+    if prefix.length == self.length:
+      return self == prefix
+    if prefix.length <= len(prefix.sample):
+      return self.sample[:prefix.length] == prefix.sample
+
+    return False
+
+
+
+class PayloadStream(object):
+  """
+  The data sent on one direction of a TCP connection but not received
+  yet, for payload digests. len() is the number of those bytes whose
+  hash is known. Sent data is kept as the hash of the stream up to the
+  end of each send, and received data as the hash up to the end of the
+  last receive, both counted from the offset where the known data
+  begins.
+  A receive is checked when it ends where a send did.
+  """
+
+  def __init__(self):
+    self.end = 0
+    self.hash = 0
+    self.sends = deque()
+    self.received = 0
+    self.received_hash = 0
+
+
+  def __len__(self):
+    return max(self.end - self.received, 0)
+
+
+  def send(self, payload):
+    """
+    Adds payload, a PayloadDigest or string, to the end of the known data
+    and returns the stream.
+    """
+
+    if isinstance(payload, str):
+      payload = get_payload_digest(payload)
+
+    # Once everything known has been received, the known data starts
+    # again from here.
+    if not len(self):
+      self.end = self.received
+      self.hash = 0
+      self.sends.clear()
+      self.received_hash = 0
+
+    self.hash = join_hashes(self.hash, payload.hash, payload.length)
+    self.end += payload.length
+    self.sends.append((self.end, self.hash))
+    return self
+
+
+  def is_match(self, payload):
+    """
+    Returns False if payload, the bytes captured of the next receive,
+    doesn't match the data that was sent.
+    """
+
+    if self.received_hash is None:
+      return True
+
+    end = self.received + payload.length
+    received_hash = join_hashes(self.received_hash, payload.hash,
+                                payload.length)
+
+    for send_end, send_hash in self.sends:
+      if send_end == end:
+        return send_hash == received_hash
+      if send_end > end:
+        break
+
+    return True
+
+
+  def receive(self, payload, length):
+    """
+    Removes the length bytes received, payload being the bytes captured
+    of them, and returns the stream. Data received after a receive that
+    strace truncated isn't known, so isn't checked again until the known
+    data starts over.
+    """
+
+    if self.received_hash is not None:
+      if payload.length == length:
+        self.received_hash = join_hashes(self.received_hash, payload.hash,
+                                         payload.length)
+      else:
+        self.received_hash = None
+
+    self.received += length
+
+    while self.sends and self.sends[0][0] <= self.received:
+      self.sends.popleft()
+
+    return self
+
+
+
+class StreamFingerprint(object):
+  """
+  The data sent or received on one direction of a TCP socket, as its
+  length, the first FINGERPRINT_HEAD_SIZE bytes and hashes of the known
+  data (up to and including the first payload strace truncated): at each
+  of FINGERPRINT_OFFSETS and of all of it. Payloads are added as strings
+  or PayloadDigests. For a PayloadDigest only its sample is known, so the
+  head stops where a sample does, and hashes at offsets within a digest
+  are not known.
+  """
+
+  __slots__ = ('length', 'known', 'hash', 'head', 'prefixes')
+
+  def __init__(self):
+    self.length = 0
+    self.known = 0
+    self.hash = 0
+    self.head = ''
+    self.prefixes = {}
+
+
+  def add(self, payload, length):
+    """
+    Adds length bytes to the stream, payload being the bytes strace
+    captured of them.
+    """
+
+    if self.known == self.length:
+      payload = payload[:length]
+      payload_length = len(payload)
+
+      if isinstance(payload, str):
+        sample = payload
+        payload_hash = get_hash(payload)
+      else:
+        sample = payload.sample
+        payload_hash = payload.hash
+
+      if len(self.head) == self.known < FINGERPRINT_HEAD_SIZE:
+        self.head += sample[:FINGERPRINT_HEAD_SIZE - self.known]
+
+      if payload_hash is None:
+        self.hash = None
+
+      if self.hash is not None:
+        end = self.known + payload_length
+        for offset in FINGERPRINT_OFFSETS:
+          if self.known < offset < end and isinstance(payload, str):
+            self.prefixes[offset] = join_hashes(self.hash,
+                get_hash(payload[:offset - self.known]), offset - self.known)
+          elif offset == end:
+            self.prefixes[offset] = join_hashes(self.hash, payload_hash,
+                                                payload_length)
+
+        self.hash = join_hashes(self.hash, payload_hash, payload_length)
+
+      self.known += payload_length
+
+    self.length += length
+
+
+  def get_prefix_hash(self, length):
+    """
+    Returns the hash of the first length bytes, or None if it isn't known.
+    """
+
+    if length == self.known:
+      return self.hash
+    return self.prefixes.get(length)
+
+
+  def is_prefix_match(self, other, length):
+    """
+    Returns False if what is known of the first length bytes of this
+    stream and of other differs. The known data has to end at the same
+    place in both, as far as length.
+    """
+
+    known = min(self.known, length)
+    if known != min(other.known, length):
+      return False
+
+    head_length = min(len(self.head), len(other.head), known)
+    if self.head[:head_length] != other.head[:head_length]:
+      return False
+    if head_length == known:
+      return True
+
+    first_hash = self.get_prefix_hash(known)
+    second_hash = other.get_prefix_hash(known)
+    if first_hash is not None and second_hash is not None:
+      return first_hash == second_hash
+
+    # Fall back on the last offset both know the hash at.
+    for offset in reversed(FINGERPRINT_OFFSETS):
+      if offset < known and offset in self.prefixes and \
+          offset in other.prefixes:
+        return self.prefixes[offset] == other.prefixes[offset]
+
+    return True
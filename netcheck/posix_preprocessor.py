@@ -8,7 +8,35 @@ and not duplicated.
 """
 
 import posix_test_harness_functions as parser
+import payload_digest
+import bz2
+import cStringIO
+import gzip
+import hashlib
+import heapq
+import itertools
+import json
+import marshal
+import mmap
+import multiprocessing
+import os
+import re
 import sys
+import tempfile
+from collections import deque
+
+# xz support needs the lzma module, which Python 2 only has through the
+# backports.lzma package.
+try:
+  from backports import lzma
+except ImportError:
+  lzma = None
+
+# MessagePack traces need the msgpack package.
+try:
+  import msgpack
+except ImportError:
+  msgpack = None
 
 PF_INET = 2
 PF_INET6 = 30
@@ -22,6 +50,89 @@ CLONE_FILES = 0x400
 
 F_DUPFD =  0
 
+# Trace files of at least this many bytes are read through read-only
+# memory maps, so the OS page cache holds them rather than Python file
+# buffers. Set to None to always read trace files normally.
+MMAP_MIN_FILE_SIZE = 64 * 1024 * 1024
+
+# How much of a trace file is mapped at a time. Only one window is mapped
+# at once, which keeps memory use independent of the size of the trace.
+# Must be a multiple of mmap.ALLOCATIONGRANULARITY.
+MMAP_WINDOW_SIZE = 16 * 1024 * 1024
+
+# Trace files with these extensions are decompressed as they are read,
+# COMPRESSED_READ_SIZE decompressed bytes at a time.
+COMPRESSED_EXTENSIONS = ['.gz', '.bz2', '.xz']
+COMPRESSED_READ_SIZE = 1024 * 1024
+
+# 'strace -ff -o NAME' writes the calls made by each process to its own
+# file, NAME.PID. A trace name with no file of its own but with such files
+# is read by merging them on the -t, -tt or -ttt timestamp at the start
+# of each line, and prefixing each line with the pid it came from.
+STRACE_TIMESTAMP_RE = re.compile(r'\s*(\d+:\d+:\d+(?:\.\d+)?|\d+\.\d+)\s')
+
+# Uncompressed trace files of at least PARALLEL_PARSE_MIN_FILE_SIZE bytes
+# are split at line boundaries into PARALLEL_PARSE_CHUNK_SIZE byte chunks
+# which are parsed by PARALLEL_PARSE_PROCESSES worker processes (one per
+# CPU if None). Set PARALLEL_PARSE_MIN_FILE_SIZE to None to always parse
+# traces in this process.
+PARALLEL_PARSE_MIN_FILE_SIZE = None
+PARALLEL_PARSE_CHUNK_SIZE = 32 * 1024 * 1024
+PARALLEL_PARSE_PROCESSES = None
+
+# Keep a marshalled copy of each parsed trace and read that instead of
+# the strace output when the trace is loaded again. Up to date caches are
+# always used, but new ones are only written if ENABLE_TRACE_CACHE is set
+# (or by 'python netcheck.py index', which builds them ahead of time for
+# every trace in a set of configuration files). Caches are stored
+# next to their trace as TRACE_FILE.parsed, or in TRACE_CACHE_DIR named
+# by a hash of the trace's path if it is set. A cache is only used if
+# both the contents of the trace file and the parser source (including
+# this module, which reads NDJSON and MessagePack records) are
+# unchanged since it was written. The trace is only rehashed to check
+# this if its modification time has changed.
+ENABLE_TRACE_CACHE = False
+TRACE_CACHE_DIR = None
+TRACE_CACHE_EXTENSION = '.parsed'
+# Bump this if the layout of cache files changes.
+TRACE_CACHE_FORMAT = 3
+
+# Hash of the parser source, computed the first time it is needed.
+PARSER_VERSION = None
+
+# Traces are passed from the parser through the trace cache to the
+# preprocessor as lists of up to this many system calls.
+TRACE_BATCH_SIZE = 1024
+
+# With TCP data matching, each trace is read twice: once to find TCP
+# connections by the data sent on them and once for ordering. Its parsed
+# system calls are spilled to a temporary file in this directory (the
+# default temporary directory if None) the first time, and read back
+# from there the second (see get_trace_batches_from_filename_once).
+TRACE_SPILL_DIR = None
+
+# Replace the payloads of send and receive calls on sockets with
+# payload_digest.PayloadDigest objects (length, hash and the first
+# payload_digest.SAMPLE_SIZE bytes), which the model compares instead of
+# the data itself, so memory doesn't grow with the amount of data sent.
+ENABLE_PAYLOAD_DIGESTS = False
+
+# Trace files with these extensions hold system call records rather than
+# strace output (see README.txt), as one JSON array per line or as a
+# stream of MessagePack arrays. They may also be compressed, e.g.
+# trace.ndjson.gz.
+NDJSON_EXTENSIONS = ['.ndjson', '.jsonl']
+MSGPACK_EXTENSIONS = ['.msgpack']
+
+# System calls whose arguments include lists of fds.
+FD_LIST_SYSCALLS = ['select_syscall', 'poll_syscall']
+
+# Where the data is in the args of the system calls whose data strace
+# prints as an escaped string. Records give the bytes themselves, which
+# are escaped the same way when they are read.
+ESCAPED_RECORD_ARGS = dict([(name, 2) for name in parser.PAYLOAD_SYSCALLS] +
+                           [('setsockopt_syscall', 4)])
+
 # System calls that received data over the network.
 RECV_SYSCALLS = [
   "recv_syscall", "recvfrom_syscall", "recvmsg_syscall", "read_syscall"
@@ -33,34 +144,754 @@ SEND_SYSCALLS = [
   "write_syscall", "writev_syscall"
 ]
 
+# Send and receive calls whose second argument is their payload.
+PAYLOAD_SYSCALLS = (set(RECV_SYSCALLS + SEND_SYSCALLS) -
+                    set(['sendfile_syscall']))
+
+# strace -yy names of the sockets preprocess_trace keeps track of.
+INET_FD_PROTOCOLS = set(['TCP', 'TCPv6', 'UDP', 'UDPv6', 'UDPLITE',
+                         'UDPLITEv6'])
+
 
 
 def get_trace_from_file(file_obj):
+  """
+  Returns an iterator through the system calls in the given readable
+  trace file.
+  """
+
+  return itertools.chain.from_iterable(get_trace_batches_from_file(file_obj))
+
+
+
+def get_trace_batches_from_file(file_obj):
   """
   A generator that iterates through the system calls in the given
-  readabletrace trace file.
+  readable trace file in lists of up to TRACE_BATCH_SIZE calls.
   """
 
-  trace = []
+  while True:
+    batch = parser.getValidTraceLines(file_obj, TRACE_BATCH_SIZE)
+
+    if not batch:
+      return
+    yield batch
+
+
+
+def get_lines_from_mmap(file_obj):
+  """
+  A generator that iterates through the lines of the given file by
+  walking line boundaries in read-only memory maps of it, one window of
+  MMAP_WINDOW_SIZE bytes at a time.
+  """
+
+  file_size = os.fstat(file_obj.fileno()).st_size
+  offset = 0
+  # A line which runs past the end of a window is finished in the next one.
+  partial_line = ''
+
+  while offset < file_size:
+    length = min(MMAP_WINDOW_SIZE, file_size - offset)
+    window = mmap.mmap(file_obj.fileno(), length, access=mmap.ACCESS_READ,
+                       offset=offset)
+
+    try:
+      line = partial_line + window.readline()
+      partial_line = ''
+
+      while line:
+        if line[-1] != '\n':
+          partial_line = line
+          break
+        yield line
+        line = window.readline()
+    finally:
+      window.close()
+
+    offset += length
+
+  if partial_line:
+    yield partial_line
+
+
+
+def get_lines_from_compressed_file(file_obj):
+  """
+  A generator that iterates through the lines of the given decompressing
+  file object, reading COMPRESSED_READ_SIZE bytes at a time.
+  """
+
+  partial_line = ''
 
   while True:
-    trace += parser.getValidTraceLine(file_obj)
+    data = file_obj.read(COMPRESSED_READ_SIZE)
+    if not data:
+      break
+
+    lines = (partial_line + data).split('\n')
+    # The last piece is either empty or a line continued in the next read.
+    partial_line = lines.pop()
+
+    for line in lines:
+      yield line + '\n'
+
+  if partial_line:
+    yield partial_line
+
+
+
+def open_trace_file(filename):
+  """
+  Opens the given trace file for reading, decompressing it on the fly if
+  its extension is one of COMPRESSED_EXTENSIONS.
+  """
+
+  extension = os.path.splitext(filename)[1]
+
+  if extension == '.gz':
+    return gzip.GzipFile(filename, 'rb')
+  elif extension == '.bz2':
+    return bz2.BZ2File(filename, 'r', COMPRESSED_READ_SIZE)
+  elif extension == '.xz':
+    return lzma.LZMAFile(filename, 'rb')
+  else:
+    return open(filename, 'r')
+
+
+
+def get_trace_format(filename):
+  """
+  Returns 'ndjson' or 'msgpack' if the given trace file name has one of
+  NDJSON_EXTENSIONS or MSGPACK_EXTENSIONS (before any compression
+  extension), and 'strace' otherwise.
+  """
+
+  name, extension = os.path.splitext(filename)
 
-    if not trace:
+  if extension in COMPRESSED_EXTENSIONS:
+    extension = os.path.splitext(name)[1]
+
+  if extension in NDJSON_EXTENSIONS:
+    return 'ndjson'
+  if extension in MSGPACK_EXTENSIONS:
+    return 'msgpack'
+  return 'strace'
+
+
+
+def get_syscall_from_record(record):
+  """
+  Returns the system call tuple for a record from an NDJSON or MessagePack
+  trace: [name, args, ret], optionally followed by [timestamp, duration]
+  and a strace -yy fd annotation. JSON strings stand for byte strings,
+  one character (U+0000 to U+00FF) per byte. Arrays in args and ret
+  become tuples, as the parser makes them (e.g. the (ip, port) returned
+  by getsockname), except for the fd lists of select and poll. Data
+  (payloads and socket option values) is escaped as strace would have
+  printed it, since that is what the parser hands on.
+  """
+
+  if not isinstance(record, list) or not 3 <= len(record) <= 5:
+    raise ValueError("%r is not a [name, args, ret] system call record" %
+                     (record,))
+
+  name = get_record_value(record[0])
+  args = [get_record_value(arg) for arg in record[1]]
+  ret = [get_record_value(value) for value in record[2]]
+
+  if name in ESCAPED_RECORD_ARGS:
+    index = ESCAPED_RECORD_ARGS[name]
+    if index < len(args) and isinstance(args[index], str):
+      args[index] = args[index].encode('string_escape')
+  elif name == 'getsockopt_syscall' and ret and isinstance(ret[0], str):
+    ret[0] = ret[0].encode('string_escape')
+
+  if name in FD_LIST_SYSCALLS:
+    # readfds, writefds and errorfds (pollin, pollout and pollerr) are
+    # lists, and so are the fds select returns.
+    args[1:4] = [list(fds) for fds in args[1:4]]
+    if name == 'select_syscall':
+      ret = [list(value) if isinstance(value, tuple) else value
+             for value in ret]
+
+  syscall = (name, tuple(args), tuple(ret))
+
+  if len(record) == 3:
+    return syscall
+
+  timestamp, duration = record[3]
+
+  if len(record) == 5:
+    return parser.AnnotatedSyscall(syscall, timestamp, duration,
+                                   get_record_value(record[4]))
+
+  return parser.TimedSyscall(syscall, timestamp, duration)
+
+
+
+def get_record_value(value):
+  """
+  Returns a value from an NDJSON or MessagePack record as the parser
+  would have: unicode strings as byte strings and arrays as tuples (with
+  their items unchanged, e.g. the fd lists in poll's result).
+  """
+
+  if isinstance(value, unicode):
+    return value.encode('latin-1')
+
+  if isinstance(value, list):
+    return tuple([get_record_value(item) if not isinstance(item, list)
+                  else [get_record_value(i) for i in item]
+                  for item in value])
+
+  return value
+
+
+
+def get_trace_batches_from_ndjson(lines, filename):
+  """
+  A generator that iterates through the system calls in an NDJSON trace,
+  one record (see get_syscall_from_record) per line, in lists of up to
+  TRACE_BATCH_SIZE calls. Blank lines are skipped.
+  """
+
+  lines = iter(lines)
+  line_number = 0
+
+  while True:
+    chunk = list(itertools.islice(lines, TRACE_BATCH_SIZE))
+    if not chunk:
+      return
+
+    records = [line for line in chunk if line.strip()]
+
+    # Decode the whole batch at once, and only go line by line to find
+    # out where a bad record is.
+    try:
+      records = json.loads('[' + ','.join(records) + ']')
+    except ValueError:
+      for i, line in enumerate(chunk):
+        try:
+          json.loads(line)
+        except ValueError:
+          if line.strip():
+            raise Exception("Line %d of '%s' is not valid JSON" %
+                            (line_number + i + 1, filename))
+      raise
+
+    line_number += len(chunk)
+    yield [get_syscall_from_record(record) for record in records]
+
+
+
+def get_trace_batches_from_msgpack(file_obj):
+  """
+  A generator that iterates through the system calls in a MessagePack
+  trace, a stream of records (see get_syscall_from_record), in lists of
+  up to TRACE_BATCH_SIZE calls.
+  """
+
+  records = msgpack.Unpacker(file_obj, raw=True)
+
+  while True:
+    batch = [get_syscall_from_record(record)
+             for record in itertools.islice(records, TRACE_BATCH_SIZE)]
+    if not batch:
       return
-    while trace:
-      yield trace.pop(0)
+    yield batch
+
+
+
+def get_strace_ff_filenames(filename):
+  """
+  Returns a list of (pid, filename) for the per process files written by
+  'strace -ff -o filename', sorted by pid. These may be compressed.
+  """
+
+  directory, prefix = os.path.split(filename)
+  pattern = re.compile(re.escape(prefix) + r'\.(\d+)(?:\.gz|\.bz2|\.xz)?$')
+
+  try:
+    names = os.listdir(directory or '.')
+  except OSError:
+    return []
+
+  pid_filenames = []
+
+  for name in names:
+    match = pattern.match(name)
+    if match:
+      pid_filenames.append((int(match.group(1)),
+                            os.path.join(directory, name)))
+
+  pid_filenames.sort()
+  return pid_filenames
+
+
+
+def get_timestamped_lines(lines, pid, index):
+  """
+  A generator that iterates through the lines of one 'strace -ff' file
+  as (timestamp, index, line) tuples, with pid prepended to each line the
+  way 'strace -f' would print it. Lines without a timestamp get the
+  timestamp of the line before them, or None (which sorts first) if
+  there hasn't been one.
+  """
+
+  pid_prefix = str(pid) + "  "
+  timestamp = None
+
+  for line in lines:
+    match = STRACE_TIMESTAMP_RE.match(line)
+
+    if match:
+      timestamp = parser.parseTimestamp(match.group(1))
+
+    if not line.endswith('\n'):
+      line += '\n'
+
+    yield timestamp, index, pid_prefix + line
+
+
+
+def get_lines_from_strace_ff_files(pid_filenames):
+  """
+  A generator that merges the lines of the given 'strace -ff' files, as
+  returned by get_strace_ff_filenames, into the single interleaved trace
+  'strace -f' would have written. Only one line from each file is held
+  at a time. Lines with the same timestamp come from the lowest pid first.
+  Files captured without timestamps can't be interleaved, so they are
+  just concatenated, with a warning.
+  """
+
+  file_objs = []
+  streams = []
+
+  for index, (pid, filename) in enumerate(pid_filenames):
+    file_obj = open_trace_file(filename)
+    file_objs.append(file_obj)
+
+    if os.path.splitext(filename)[1] in COMPRESSED_EXTENSIONS:
+      lines = get_lines_from_compressed_file(file_obj)
+    else:
+      lines = file_obj
+
+    streams.append(get_timestamped_lines(lines, pid, index))
+
+  warned = len(streams) < 2
+
+  try:
+    for timestamp, index, line in heapq.merge(*streams):
+      if timestamp is None and not warned:
+        warned = True
+        print ("[Warning] '" + pid_filenames[index][1] + "' has no " +
+               "timestamps, so the 'strace -ff' files can't be merged in " +
+               "the order the calls were made. Capture with -tt or -ttt.")
+      yield line
+  finally:
+    for file_obj in file_objs:
+      file_obj.close()
+
+
+
+def get_trace_chunks(filename, file_size):
+  """
+  Splits the given trace file into chunks of roughly
+  PARALLEL_PARSE_CHUNK_SIZE bytes that start and end on line boundaries.
+  Returns a list of (filename, start, end) byte ranges.
+  """
+
+  chunks = []
+  trace_file = open(filename, 'rb')
+  start = 0
+
+  while start < file_size:
+    trace_file.seek(start + PARALLEL_PARSE_CHUNK_SIZE)
+    trace_file.readline()
+    end = min(trace_file.tell(), file_size)
+    chunks.append((filename, start, end))
+    start = end
+
+  trace_file.close()
+  return chunks
+
+
+
+def parse_trace_chunk(chunk):
+  """
+  Parses one chunk of a trace file in a worker process. Returns
+  (syscalls, pending, lines, counters), where syscalls may
+  contain (parser.RESUMED_LINE, line) entries for resumed lines whose
+  unfinished half is in an earlier chunk, and pending lists the
+  unfinished lines left waiting at the end of the chunk as
+  (pid, command, first half, line number within the chunk), lines is the
+  number of lines in the chunk and counters is its parser.ParseCounters.
+  """
+
+  filename, start, end = chunk
+
+  parser.keepUnmatchedResumedLines = True
+  parser.pendingStraceTable = {}
+  parser.traceLineNumber = 0
+  parser.parseCounters = parser.ParseCounters()
+  parser.lastPendingSweep = 0
+  parser.pendingParseErrors = {}
+
+  trace_file = open(filename, 'rb')
+  trace_file.seek(start)
+  lines = cStringIO.StringIO(trace_file.read(end - start))
+  trace_file.close()
+
+  # A line that couldn't be parsed fails the whole chunk.
+  syscalls = parser.getValidTraceLines(lines, None)
+
+  pending = []
+  for queue in parser.pendingStraceTable.itervalues():
+    for strace in queue:
+      pending.append((strace.pid, strace.command, strace.firstHalf,
+                      strace.lineNumber))
+
+  return syscalls, pending, parser.traceLineNumber, parser.parseCounters
+
+
+
+def merge_trace_chunk(result):
+  """
+  A generator that iterates through the system calls parsed from one
+  chunk by parse_trace_chunk, matching its resumed lines up with the
+  unfinished lines left over from earlier chunks. Chunks must be merged
+  in order.
+  """
+
+  syscalls, pending, lines, counters = result
+  first_line = parser.traceLineNumber
+  counted_lines = parser.parseCounters.lines
+
+  for syscall in syscalls:
+    if syscall[0] == parser.RESUMED_LINE:
+      for resumed_syscall in parser.getValidTraceLine([syscall[1]]):
+        yield resumed_syscall
+    else:
+      yield syscall
+
+  # Resumed lines were counted in their chunk, not again when they were
+  # matched up.
+  parser.traceLineNumber = first_line + lines
+  parser.parseCounters.lines = counted_lines
+  parser.parseCounters.add(counters)
+
+  for pid, command, first_half, line_number in pending:
+    parser.addPendingStrace(parser.PendingStrace(pid, command, first_half,
+                                                 first_line + line_number))
+
+
+
+def get_trace_batches_from_filename_parallel(filename, file_size):
+  """
+  A generator that iterates through the system calls in the given trace
+  file, parsing chunks of it in a pool of worker processes. Each chunk's
+  calls are generated as one list, in the same order as a serial parse.
+  Only a few chunks per worker are parsed ahead of the caller so memory
+  use stays bounded.
+  """
+
+  processes = PARALLEL_PARSE_PROCESSES or multiprocessing.cpu_count()
+  pool = multiprocessing.Pool(processes)
+  in_flight = deque()
+
+  try:
+    for chunk in get_trace_chunks(filename, file_size):
+      in_flight.append(pool.apply_async(parse_trace_chunk, (chunk,)))
+
+      if len(in_flight) >= 2 * processes:
+        yield list(merge_trace_chunk(in_flight.popleft().get()))
+
+    while in_flight:
+      yield list(merge_trace_chunk(in_flight.popleft().get()))
+
+  finally:
+    pool.terminate()
+
+
+
+def get_parser_version():
+  """
+  Returns a hash of the source of the strace parser, the constants it
+  uses and this module (which turns NDJSON and MessagePack records into
+  system calls), so cached traces are rebuilt whenever any of them
+  change.
+  """
+
+  global PARSER_VERSION
+
+  if PARSER_VERSION is None:
+    digest = hashlib.sha1()
+    for module in [parser, parser.lind_fs_constants, parser.lind_net_constants,
+                   sys.modules[__name__]]:
+      source_file = open(os.path.splitext(module.__file__)[0] + '.py', 'rb')
+      digest.update(source_file.read())
+      source_file.close()
+    PARSER_VERSION = digest.hexdigest()
+
+  return PARSER_VERSION
+
+
+
+def get_file_hash(filename):
+  """
+  Returns the SHA-1 hash of the contents of the given file.
+  """
+
+  digest = hashlib.sha1()
+  hash_file = open(filename, 'rb')
+
+  while True:
+    data = hash_file.read(COMPRESSED_READ_SIZE)
+    if not data:
+      break
+    digest.update(data)
+
+  hash_file.close()
+  return digest.hexdigest()
+
+
+
+def get_trace_cache_filename(filename):
+  """
+  Returns the name of the trace cache for the given trace file.
+  """
+
+  if TRACE_CACHE_DIR is None:
+    return filename + TRACE_CACHE_EXTENSION
+
+  path_hash = hashlib.sha1(os.path.abspath(filename)).hexdigest()
+  return os.path.join(TRACE_CACHE_DIR, path_hash + TRACE_CACHE_EXTENSION)
+
+
+
+def get_trace_cache_header(filename):
+  """
+  Returns the header identifying the trace cache for the given trace
+  file: (cache format, parser version, file hash, file size, mtime).
+  """
+
+  # Stat before hashing so a file changed while it is hashed looks stale.
+  stat = os.stat(filename)
+  return (TRACE_CACHE_FORMAT, get_parser_version(), get_file_hash(filename),
+          stat.st_size, stat.st_mtime)
+
+
+
+def open_trace_cache(cache_filename, filename):
+  """
+  Opens the trace cache for the given trace file and reads past its
+  header. Returns None if the cache doesn't exist or is out of date.
+  """
+
+  try:
+    cache_file = open(cache_filename, 'rb')
+  except IOError:
+    return None
+
+  try:
+    header = marshal.load(cache_file)
+  except (EOFError, ValueError, TypeError):
+    header = None
+
+  if (not isinstance(header, tuple) or len(header) != 5 or
+      header[:2] != (TRACE_CACHE_FORMAT, get_parser_version())):
+    cache_file.close()
+    return None
+
+  file_hash, file_size, file_mtime = header[2:]
+  stat = os.stat(filename)
+
+  if file_size != stat.st_size or (file_mtime != stat.st_mtime and
+                                   file_hash != get_file_hash(filename)):
+    cache_file.close()
+    return None
+
+  return cache_file
+
+
+
+def get_trace_batches_from_cache(cache_file):
+  """
+  A generator that iterates through the batches of system calls stored
+  in an open trace cache.
+  """
+
+  try:
+    while True:
+      batch = marshal.load(cache_file)
+      for i, syscall in enumerate(batch):
+        # Timed calls are stored with their timing as a fourth element,
+        # and calls with a strace -yy fd annotation have it as a fifth.
+        if len(syscall) == 4:
+          batch[i] = parser.TimedSyscall(syscall[:3], *syscall[3])
+        elif len(syscall) == 5:
+          batch[i] = parser.AnnotatedSyscall(syscall[:3], syscall[3][0],
+                                             syscall[3][1], syscall[4])
+      yield batch
+  except EOFError:
+    pass
+
+  cache_file.close()
+
+
+
+def get_trace_cache_records(batch):
+  """
+  Returns the batch of system calls as stored in a trace cache, with
+  payloads copied out of their trace lines and the timing and fd
+  annotation of calls that have them as extra elements.
+  """
+
+  records = []
+
+  for syscall in batch:
+    syscall = parser.materializePayload(syscall)
+    if type(syscall) is parser.AnnotatedSyscall:
+      records.append(tuple(syscall) + ((syscall.timestamp,
+          syscall.duration), syscall.fdAnnotation))
+    elif type(syscall) is parser.TimedSyscall:
+      records.append(tuple(syscall) + ((syscall.timestamp,
+          syscall.duration),))
+    else:
+      records.append(syscall)
+
+  return records
+
+
+
+def write_trace_cache(batches, cache_filename, filename):
+  """
+  A generator that passes through the batches of system calls in batches
+  while writing them to the given trace cache. The cache is written to a
+  temporary file and only moved into place once the whole trace has been
+  read, so an interrupted run never leaves a partial cache behind.
+  """
+
+  cache_dir = os.path.dirname(cache_filename) or '.'
+
+  try:
+    if not os.path.isdir(cache_dir):
+      os.makedirs(cache_dir)
+    fd, temp_filename = tempfile.mkstemp(dir=cache_dir,
+        prefix=os.path.basename(cache_filename) + '.')
+  except OSError:
+    # We can't write the cache here, so just don't cache the trace.
+    for batch in batches:
+      yield batch
+    return
+
+  cache_file = os.fdopen(fd, 'wb')
+  complete = False
+
+  try:
+    marshal.dump(get_trace_cache_header(filename), cache_file)
+    for batch in batches:
+      marshal.dump(get_trace_cache_records(batch), cache_file)
+      yield batch
+    complete = True
+  finally:
+    cache_file.close()
+    if complete:
+      os.rename(temp_filename, cache_filename)
+    else:
+      os.remove(temp_filename)
+
+
+
+def spill_trace_batches(batches, spill_file):
+  """
+  A generator that passes through the batches of system calls in batches
+  while writing them to spill_file the way a trace cache stores them
+  (without the header).
+  """
+
+  for batch in batches:
+    marshal.dump(get_trace_cache_records(batch), spill_file)
+    yield batch
+
+
+
+def get_trace_batches_from_spill(spill_file):
+  """
+  A generator that iterates through the batches of system calls written
+  to spill_file by spill_trace_batches, closing (and so removing) it once
+  they have all been read.
+  """
+
+  spill_file.seek(0)
+
+  for batch in get_trace_batches_from_cache(spill_file):
+    yield batch
+
+
+
+def get_trace_batches_from_filename_once(filename):
+  """
+  Returns two generators of the batches of system calls in the given
+  trace file, like get_trace_batches_from_filename, that only parse the
+  file once. The first parses it and spills the batches to a temporary
+  file in TRACE_SPILL_DIR, and the second reads them back. The second
+  can only be used after the first has been read to the end.
+  """
+
+  spill_file = tempfile.TemporaryFile(dir=TRACE_SPILL_DIR)
+  batches = spill_trace_batches(get_trace_batches_from_filename(filename),
+                                spill_file)
+  return batches, get_trace_batches_from_spill(spill_file)
 
 
 
 def get_trace_from_filename(filename):
+  """
+  Returns an iterator through the system calls in the trace file
+  referenced by the given file name (see
+  get_trace_batches_from_filename).
+  """
+
+  return itertools.chain.from_iterable(get_trace_batches_from_filename(filename))
+
+
+
+def get_trace_batches_from_filename(filename):
   """
   A generator that iterates through the system calls in the trace file
-  referenced by the given file name.
+  referenced by the given file name, in lists of up to TRACE_BATCH_SIZE
+  calls (a whole chunk at a time when parsing in parallel). Files
+  compressed with gzip, bzip2 or xz are streamed through a decompressor,
+  and NDJSON and MessagePack traces are read as records instead of being
+  parsed (see get_trace_format). If there is no such file but there are
+  per process files from 'strace -ff -o filename', they are merged into a
+  single trace.
   """
 
+  if not os.path.exists(filename):
+    pid_filenames = get_strace_ff_filenames(filename)
+
+    if pid_filenames:
+      lines = get_lines_from_strace_ff_files(pid_filenames)
+      for batch in get_trace_batches_from_file(lines):
+        yield batch
+      return
+
+  extension = os.path.splitext(filename)[1]
+  trace_format = get_trace_format(filename)
+
+  if extension == '.xz' and lzma is None:
+    print "'" + filename + "' is xz compressed, which requires the backports.lzma package...exiting\n"
+    sys.exit(0)
+
+  if trace_format == 'msgpack' and msgpack is None:
+    print "'" + filename + "' is a MessagePack trace, which requires the msgpack package...exiting\n"
+    sys.exit(0)
+
   try:
-    file_obj = open(filename, 'r')    
+    file_obj = open_trace_file(filename)
   except IOError, e:
     if e[0] == 2:  # error code 2: file does not exist
       print "'" + filename + "' is not at the correct location...exiting\n\n\
@@ -73,222 +904,487 @@ def get_trace_from_filename(filename):
     else:  # for all other cases of IOError's, simply raise them
       raise        
 
-  for syscall in get_trace_from_file(file_obj):
-    yield syscall
+  lines = file_obj
+  batches = None
+
+  if trace_format == 'msgpack':
+    batches = get_trace_batches_from_msgpack(file_obj)
+  elif extension in COMPRESSED_EXTENSIONS:
+    lines = get_lines_from_compressed_file(file_obj)
+  elif trace_format == 'strace':
+    file_size = os.fstat(file_obj.fileno()).st_size
+
+    if (PARALLEL_PARSE_MIN_FILE_SIZE is not None and
+        file_size >= PARALLEL_PARSE_MIN_FILE_SIZE):
+      batches = get_trace_batches_from_filename_parallel(filename, file_size)
+    # Empty files can't be mapped.
+    elif (MMAP_MIN_FILE_SIZE is not None and file_size > 0 and
+          file_size >= MMAP_MIN_FILE_SIZE):
+      lines = get_lines_from_mmap(file_obj)
+
+  if batches is None:
+    if trace_format == 'ndjson':
+      batches = get_trace_batches_from_ndjson(lines, filename)
+    else:
+      batches = get_trace_batches_from_file(lines)
+
+  cache_filename = get_trace_cache_filename(filename)
+  cache_file = open_trace_cache(cache_filename, filename)
+
+  if cache_file is not None:
+    batches = get_trace_batches_from_cache(cache_file)
+  elif ENABLE_TRACE_CACHE:
+    batches = write_trace_cache(batches, cache_filename, filename)
+
+  for batch in batches:
+    yield batch
 
   file_obj.close()
 
 
 
-def preprocess_trace(trace, trace_id, print_warnings=True):
+def preprocess_trace_batches(batches, trace_id, print_warnings=True,
+                             is_ignored_addr=None):
   """
-  A generator that iterates through trace and rewrites the calls so
+  A generator that iterates through the batches of system calls in
+  batches (see get_trace_batches_from_filename) and rewrites the calls so
   file descriptors are replaced with ID numbers with a one-to-one
   correspondence to sockets we might care about and the pids are removed
   Clone, dup, and fcntl calls that duplicate file descriptors are handled
   by the preprocessor and not passed on in the generated trace. Only the
   close call that closes the last open reference to a socket is yielded.
   Any calls not relating to sockets we might care about are also stripped
-  from the trace.
+  from the trace. Timestamps and durations of calls (see
+  parser.TimedSyscall) are kept. For traces captured with strace -yy, the
+  fd annotations (see parser.AnnotatedSyscall) are checked against the
+  sockets the preprocessor thinks each fd refers to. If is_ignored_addr,
+  a function of (ip, port), is given, calls on sockets after they connect
+  or bind to an address it returns True for are stripped as well, apart
+  from connects and the final close.
   """
 
   sock_counter = 0
 
   pid_map = {}
-  fd_map = {}
+
+  # The FdTable of each process, by pid.
+  fd_tables = {}
+
+  # The number of fds referring to each open socket, counting the fds of
+  # an FdTable shared by several processes once.
+  sock_refs = {}
 
   tcp_socks = set()
   sock_pid = {}
 
+  # The (ip, port) each socket connected to or was accepted from.
+  sock_remote = {}
+
+  # Sockets connected or bound to an address is_ignored_addr ignores.
+  ignored_socks = set()
+
   concurrent_access_set = set()
+  annotation_warning_set = set()
 
-  for name, args, ret in trace:
-    real_pid = args[0]
-    pid = pid_map.get(real_pid, real_pid)
-    args = args[1:]
+  for batch in batches:
+    for syscall in batch:
+      name, args, ret = syscall
+      real_pid = args[0]
+      pid = pid_map.get(real_pid, real_pid)
+      args = args[1:]
 
-    # TODO: in cases where we create a file descriptor that we think is
-    # already open, we should flag this somehow
+      # TODO: in cases where we create a file descriptor that we think is
+      # already open, we should flag this somehow
 
-    if name == 'socket_syscall':
-      if args[0] != PF_INET and args[0] != PF_INET6:
-        continue
-      if ret[0] == -1:
+      if name == 'socket_syscall':
+        if args[0] != PF_INET and args[0] != PF_INET6:
+          continue
+        if ret[0] == -1:
+          continue
+
+        sock = sock_counter
+        sock_counter += 1
+        open_fd(get_writable_fds(fd_tables, sock_refs, pid), sock_refs,
+                ret[0], sock)
+        ret = (sock, None)
+
+        if args[1] == SOCK_STREAM and (args[2] == IPPROTO_TCP or args[2] == 0):
+          tcp_socks.add(sock)
+
+      elif name == 'clone_syscall':
+        if ret[0] != -1:
+          if args[0] & CLONE_FILES != 0:
+            pid_map[ret[0]] = pid
+          else:
+            share_fd_table(fd_tables, sock_refs, pid, ret[0])
         continue
 
-      sock = sock_counter
-      sock_counter += 1
-      fd_map[(pid, ret[0])] = sock
-      ret = (sock, None)
-
-      if args[1] == SOCK_STREAM and (args[2] == IPPROTO_TCP or args[2] == 0):
-        tcp_socks.add(sock)
-
-    elif name == 'clone_syscall':
-      if ret[0] != -1:
-        if args[0] & CLONE_FILES != 0:
-          pid_map[ret[0]] = pid
-        else:
-          for fd in fd_map.copy():
-            if fd[0] == pid:
-              fd_map[(ret[0], fd[1])] = fd_map[fd]
-      continue
+      elif name == 'select_syscall':
+        readfds, writefds, errorfds, timeout = args
+        fds = get_fds(fd_tables, pid)
+
+        new_readfds = []
+        for fd in readfds:
+          if fd in fds:
+            new_readfds.append(fds[fd])
 
-    elif name == 'select_syscall':
-      readfds, writefds, errorfds, timeout = args
+        new_writefds = []
+        for fd in writefds:
+          if fd in fds:
+            new_writefds.append(fds[fd])
 
-      new_readfds = []
-      for fd in readfds:
-        if (pid, fd) in fd_map:
-          new_readfds.append(fd_map[(pid, fd)])
+        new_errorfds = []
+        for fd in errorfds:
+          if fd in fds:
+            new_errorfds.append(fds[fd])
 
-      new_writefds = []
-      for fd in writefds:
-        if (pid, fd) in fd_map:
-          new_writefds.append(fd_map[(pid, fd)])
+        if not new_readfds and not new_writefds and not new_errorfds:
+          continue
 
-      new_errorfds = []
-      for fd in errorfds:
-        if (pid, fd) in fd_map:
-          new_errorfds.append(fd_map[(pid, fd)])
+        args = new_readfds, new_writefds, new_errorfds, timeout
 
-      if not new_readfds and not new_writefds and not new_errorfds:
-        continue
+        if not isinstance(ret[0], int):
+          r_in, r_out = ret
+
+          new_r_in = []
+          for fd in r_in:
+            if fd in fds:
+              new_r_in.append(fds[fd])
 
-      args = new_readfds, new_writefds, new_errorfds, timeout
+          new_r_out = []
+          for fd in r_out:
+            if fd in fds:
+              new_r_out.append(fds[fd])
 
-      if not isinstance(ret[0], int):
-        r_in, r_out = ret
+          if not new_r_in and not new_r_out:
+            continue
 
-        new_r_in = []
-        for fd in r_in:
-          if (pid, fd) in fd_map:
-            new_r_in.append(fd_map[(pid, fd)])
+          ret = new_r_in, new_r_out
 
-        new_r_out = []
-        for fd in r_out:
-          if (pid, fd) in fd_map:
-            new_r_out.append(fd_map[(pid, fd)])
+      elif name == 'poll_syscall':
+        pollin, pollout, pollerr, timeout = args
+        fds = get_fds(fd_tables, pid)
 
-        if not new_r_in and not new_r_out:
+        new_pollin = []
+        for fd in pollin:
+          if fd in fds:
+            new_pollin.append(fds[fd])
+
+        new_pollout = []
+        for fd in pollout:
+          if fd in fds:
+            new_pollout.append(fds[fd])
+
+        new_pollerr = []
+        for fd in pollerr:
+          if fd in fds:
+            new_pollerr.append(fds[fd])
+
+        if not new_pollin and not new_pollout and not new_pollerr:
           continue
 
-        ret = new_r_in, new_r_out
+        args = new_pollin, new_pollout, new_pollerr, timeout
+
+        if not isinstance(ret[0], int):
+
+          r_in, r_out, r_err = ret[0]
+
+          new_r_in = []
+          for fd in r_in:
+            if fd in fds:
+              new_r_in.append(fds[fd])
+
+          new_r_out = []
+          for fd in r_out:
+            if fd in fds:
+              new_r_out.append(fds[fd])
+
+          new_r_err = []
+          for fd in r_err:
+            if fd in fds:
+              new_r_err.append(fds[fd])
+
+          if not new_r_in and not new_r_out and not new_r_err:
+            continue 
+
+          ret = ((new_r_in, new_r_out, new_r_err), None)
+
+      else:
+        fd = args[0]
+        fds = get_fds(fd_tables, pid)
+
+        if print_warnings and type(syscall) is parser.AnnotatedSyscall:
+          warning = check_fd_annotation(syscall.fdAnnotation, fds.get(fd),
+                                        sock_remote, trace_id)
+          if warning is not None and \
+              (warning, pid, fd) not in annotation_warning_set:
+            annotation_warning_set.add((warning, pid, fd))
+            print "[Warning] " + (warning % (fd, real_pid))
+
+        if name == 'dup_syscall' or name == 'dup2_syscall' or \
+            (name == 'fcntl_syscall' and args[1] == F_DUPFD):
+          new_fd = ret[0]
+          if new_fd != -1 and new_fd != fd and (new_fd in fds or fd in fds):
+            fds = get_writable_fds(fd_tables, sock_refs, pid)
+            if new_fd in fds:
+              old_sock = close_fd(fds, sock_refs, new_fd)
+              if old_sock is not None:
+                yield parser.copyTiming(('close_syscall', (old_sock,), (0, None)),
+                                        syscall)
+            if fd in fds:
+              open_fd(fds, sock_refs, new_fd, fds[fd])
+          continue
 
-    elif name == 'poll_syscall':
-      pollin, pollout, pollerr, timeout = args
+        if fd not in fds:
+          continue
 
-      new_pollin = []
-      for fd in pollin:
-        if (pid, fd) in fd_map:
-          new_pollin.append(fd_map[(pid, fd)])
+        sock = fds[fd]
+        args = (sock,) + args[1:]
 
-      new_pollout = []
-      for fd in pollout:
-        if (pid, fd) in fd_map:
-          new_pollout.append(fd_map[(pid, fd)])
+        # A UDP socket can connect somewhere else, and the model still has
+        # to be told the socket is closed.
+        if sock in ignored_socks and name != 'connect_syscall' and \
+            name != 'close_syscall':
+          continue
 
-      new_pollerr = []
-      for fd in pollerr:
-        if (pid, fd) in fd_map:
-          new_pollerr.append(fd_map[(pid, fd)])
+        # Only now that we know the fd is a socket is the payload worth
+        # copying out of the trace line.
+        if len(args) > 1 and type(args[1]) is parser.LazyPayload:
+          args = (sock, str(args[1])) + args[2:]
+
+        # Failed calls have no payload (None).
+        if (ENABLE_PAYLOAD_DIGESTS and name in PAYLOAD_SYSCALLS and
+            isinstance(args[1], str)):
+          args = (sock, get_payload_digest(args[1], ret[0])) + args[2:]
+
+        if name in SEND_SYSCALLS or name in RECV_SYSCALLS or name == 'shutdown_syscall':
+          if sock in sock_pid and sock_pid[sock] != real_pid:
+            # TODO: integrate this into trace_output maybe
+            if print_warnings and sock not in concurrent_access_set:
+              concurrent_access_set.add(sock)
+              print ("[Warning] TCP socket %s%d is being used for " +
+                  "network operations by multiple threads") % (trace_id, sock)
+
+          if sock in tcp_socks:
+            sock_pid[sock] = real_pid
+
+        if name == 'close_syscall':
+          fds = get_writable_fds(fd_tables, sock_refs, pid)
+          last_fd = close_fd(fds, sock_refs, fd) is not None
+          # Only print a warning if two threads share the same file descriptor
+          # table so one thread closes the fd for both of them, and the other
+          # thread was using the socket for network operations.
+          if sock in sock_pid and sock_pid[sock] != real_pid and \
+              pid_map.get(sock_pid[sock], sock_pid[sock]) == pid:
+            if print_warnings:
+              print ("[Warning] TCP socket %s%d was closed by a different " +
+                  "thread than the one using it for network operations") % (trace_id, sock)
+          if not last_fd:
+            continue
+
+        elif name == 'connect_syscall':
+          if ret[0] != -1 or ret[1] == 'EINPROGRESS':
+            sock_remote[sock] = (args[1], args[2])
+            if is_ignored_addr is not None and \
+                is_ignored_addr(args[1], args[2]):
+              ignored_socks.add(sock)
+            else:
+              ignored_socks.discard(sock)
+
+        elif name == 'bind_syscall':
+          if ret[0] != -1 and is_ignored_addr is not None and \
+              is_ignored_addr(args[1], args[2]):
+            ignored_socks.add(sock)
+
+        elif name == 'accept_syscall':
+          if ret[0] != -1:
+            new_sock = sock_counter
+            sock_counter += 1
+            open_fd(get_writable_fds(fd_tables, sock_refs, pid), sock_refs,
+                    ret[0], new_sock)
+            ret = (new_sock, None)
+            tcp_socks.add(new_sock)
+            sock_remote[new_sock] = (args[1], args[2])
+
+      yield parser.copyTiming((name, args, ret), syscall)
+
+  # Do implicit closes for all currently open sockets, in a fixed order so
+  # the output can be compared between runs.
+  for sock in sorted(sock_refs):
+    yield ('close_syscall', (sock,), (0, None))
 
-      if not new_pollin and not new_pollout and not new_pollerr:
-        continue
 
-      args = new_pollin, new_pollout, new_pollerr, timeout
 
-      if not isinstance(ret[0], int):
+class FdTable(object):
+  """
+  The fds of a process, mapped to the sockets they refer to. After a
+  clone without CLONE_FILES the parent and child share one FdTable (users
+  counts the processes using it) until either changes an fd, so a fork
+  doesn't copy every fd of the parent.
+  """
 
-        r_in, r_out, r_err = ret[0]
+  __slots__ = ('fds', 'users')
 
-        new_r_in = []
-        for fd in r_in:
-          if (pid, fd) in fd_map:
-            new_r_in.append(fd_map[(pid, fd)])
+  def __init__(self, fds):
+    self.fds = fds
+    self.users = 1
 
-        new_r_out = []
-        for fd in r_out:
-          if (pid, fd) in fd_map:
-            new_r_out.append(fd_map[(pid, fd)])
 
-        new_r_err = []
-        for fd in r_err:
-          if (pid, fd) in fd_map:
-            new_r_err.append(fd_map[(pid, fd)])
 
-        if not new_r_in and not new_r_out and not new_r_err:
-          continue 
+def get_fds(fd_tables, pid):
+  """
+  Returns the fds of pid's FdTable, which must not be changed.
+  """
 
-        ret = ((new_r_in, new_r_out, new_r_err), None)
+  table = fd_tables.get(pid)
+  if table is None:
+    return {}
+  return table.fds
 
-    else:
-      fd = (pid, args[0])
-
-      if name == 'dup_syscall' or name == 'dup2_syscall' or \
-          (name == 'fcntl_syscall' and args[1] == F_DUPFD):
-        if ret[0] != -1 and ret[0] != args[0]:
-          new_fd = (pid, ret[0])
-          if new_fd in fd_map:
-            old_sock = fd_map[new_fd]
-            del fd_map[new_fd]
-            if old_sock not in fd_map.values():
-              yield ('close_syscall', (old_sock,), (0, None))
-          if fd in fd_map:
-            fd_map[new_fd] = fd_map[fd]
-        continue
 
-      if fd not in fd_map:
-        continue
 
-      sock = fd_map[fd]
-      args = (sock,) + args[1:]
-
-      if name in SEND_SYSCALLS or name in RECV_SYSCALLS or name == 'shutdown_syscall':
-        if sock in sock_pid and sock_pid[sock] != real_pid:
-          # TODO: integrate this into trace_output maybe
-          if print_warnings and sock not in concurrent_access_set:
-            concurrent_access_set.add(sock)
-            print ("[Warning] TCP socket %s%d is being used for " +
-                "network operations by multiple threads") % (trace_id, sock)
-
-        if sock in tcp_socks:
-          sock_pid[sock] = real_pid
-
-      if name == 'close_syscall':
-        del fd_map[fd]
-        # Only print a warning if two threads share the same file descriptor
-        # table so one thread closes the fd for both of them, and the other
-        # thread was using the socket for network operations.
-        if sock in sock_pid and sock_pid[sock] != real_pid and \
-            pid_map.get(sock_pid[sock], sock_pid[sock]) == pid:
-          if print_warnings:
-            print ("[Warning] TCP socket %s%d was closed by a different " +
-                "thread than the one using it for network operations") % (trace_id, sock)
-        if sock in fd_map.values():
-          continue
+def get_writable_fds(fd_tables, sock_refs, pid):
+  """
+  Returns the fds of pid's FdTable to be changed, giving pid its own copy
+  first if the table is shared.
+  """
 
-      elif name == 'accept_syscall':
-        if ret[0] != -1:
-          new_sock = sock_counter
-          sock_counter += 1
-          fd_map[(pid, ret[0])] = new_sock
-          ret = (new_sock, None)
-          tcp_socks.add(new_sock)
+  table = fd_tables.get(pid)
 
-    yield (name, args, ret)
+  if table is None:
+    table = fd_tables[pid] = FdTable({})
 
-  # Do implicit closes for all currently open sockets.
-  for sock in set(fd_map.values()):
-    yield ('close_syscall', (sock,), (0, None))
+  elif table.users > 1:
+    table.users -= 1
+    table = fd_tables[pid] = FdTable(dict(table.fds))
+    for sock in table.fds.itervalues():
+      sock_refs[sock] += 1
+
+  return table.fds
+
+
+
+def share_fd_table(fd_tables, sock_refs, pid, child_pid):
+  """
+  Gives child_pid, cloned by pid without CLONE_FILES, pid's fds. The
+  FdTable is shared, unless child_pid already has fds of its own (its pid
+  was reused), in which case pid's fds are copied over them.
+  """
+
+  table = fd_tables.get(pid)
+  if table is None:
+    return
+
+  child_table = fd_tables.get(child_pid)
+
+  if child_table is not None and child_table.fds:
+    child_fds = get_writable_fds(fd_tables, sock_refs, child_pid)
+    for fd, sock in table.fds.items():
+      open_fd(child_fds, sock_refs, fd, sock)
+    return
+
+  if child_table is not None:
+    child_table.users -= 1
+
+  table.users += 1
+  fd_tables[child_pid] = table
+
+
+
+def open_fd(fds, sock_refs, fd, sock):
+  """
+  Points fd at sock in fds, a process's fds from get_writable_fds, and
+  counts the reference in sock_refs. If fd was already open it is dropped
+  silently, as its socket would be if this was its last fd.
+  """
+
+  if fd in fds:
+    close_fd(fds, sock_refs, fd)
+
+  fds[fd] = sock
+  sock_refs[sock] = sock_refs.get(sock, 0) + 1
+
+
+
+def close_fd(fds, sock_refs, fd):
+  """
+  Removes fd from fds. Returns the socket it referred to if that was the
+  socket's last fd, or None if the socket is still open.
+  """
+
+  sock = fds.pop(fd)
+  sock_refs[sock] -= 1
+
+  if sock_refs[sock]:
+    return None
+
+  del sock_refs[sock]
+  return sock
+
+
+
+def preprocess_trace(trace, trace_id, print_warnings=True,
+                     is_ignored_addr=None):
+  """
+  Like preprocess_trace_batches, for a trace of single system calls.
+  """
+
+  return preprocess_trace_batches(([syscall] for syscall in trace), trace_id,
+                                  print_warnings, is_ignored_addr)
+
+
+
+def check_fd_annotation(fd_annotation, sock, sock_remote, trace_id):
+  """
+  Compares what strace -yy says an fd is with sock, the socket
+  preprocess_trace has the fd mapped to (None if it isn't mapped).
+  Returns None if they agree, or a warning that still needs the fd and
+  pid filled in with the % operator.
+  """
+
+  protocol, local, remote = parser.parseFdAnnotation(fd_annotation)
+
+  if sock is None:
+    if protocol in INET_FD_PROTOCOLS:
+      return ("fd %%d of process %%d is a %s socket, but the call that "
+          "created it was not in the trace") % protocol
+    return None
+
+  if not parser.isSocketAnnotation(fd_annotation):
+    return ("Socket %s%d is fd %%d of process %%d, but strace says that fd "
+        "is %s") % (trace_id, sock, fd_annotation)
+
+  if remote is not None and sock in sock_remote and \
+      sock_remote[sock] != remote:
+    return ("Socket %s%d (fd %%d of process %%d) is connected to %s:%d, "
+        "not %s:%d as the trace suggests") % ((trace_id, sock) + remote +
+                                               sock_remote[sock])
+
+  return None
+
+
+
+def get_payload_digest(payload, length):
+  """
+  Returns the PayloadDigest of an escaped payload string from the trace,
+  cut to the number of bytes the call returned.
+  """
+
+  data = payload.decode('string_escape')
+
+  if length >= 0:
+    data = data[:length]
+
+  return payload_digest.get_payload_digest(data)
 
 
 
 def get_sock_data(trace_id, trace):
   """
   Takes a trace and returns (connect_sock_list, accept_sock_list), where
-  both lists contain dictionaries containing sent and received data for
-  TCP sockets communicating within the trace.
+  both lists contain dictionaries containing the data sent and received
+  (as payload_digest.StreamFingerprints) by TCP sockets communicating
+  within the trace.
   """
 
   tcp_sockets = {}
@@ -307,16 +1403,16 @@ def get_sock_data(trace_id, trace):
       dom, typ, prot = args
       if typ == SOCK_STREAM and (prot == IPPROTO_TCP or prot == 0):
         tcp_sockets[impl_ret] = {'name': (trace_id, impl_ret),
-                                 'sndbuf': '', 'rcvbuf': '',
-                                 'sndlen': 0, 'rcvlen':0}
+                                 'sent': payload_digest.StreamFingerprint(),
+                                 'received': payload_digest.StreamFingerprint()}
 
     elif name == 'accept_syscall':
       sock, ip, port = args
       if sock not in tcp_sockets:
         continue
       sock_state = {'name': (trace_id, impl_ret),
-                    'sndbuf': '', 'rcvbuf': '',
-                    'sndlen': 0, 'rcvlen':0}
+                    'sent': payload_digest.StreamFingerprint(),
+                    'received': payload_digest.StreamFingerprint()}
       tcp_sockets[impl_ret] = sock_state
       connected_set.add(impl_ret)
       accept_sock_list.append(sock_state)
@@ -330,7 +1426,7 @@ def get_sock_data(trace_id, trace):
         connect_sock_list.append(tcp_sockets[sock])
 
     elif name in RECV_SYSCALLS:
-      if args[1] not in tcp_sockets:
+      if args[0] not in tcp_sockets:
         continue
 
       flags = 0
@@ -350,15 +1446,14 @@ def get_sock_data(trace_id, trace):
       if impl_ret < 0 or flags == MSG_PEEK:
         continue
 
-      msg = msg.decode('string_escape')
+      if not isinstance(msg, payload_digest.PayloadDigest):
+        msg = msg.decode('string_escape')
 
       if sock not in connected_set:
         connected_set.add(sock)
         connect_sock_list.append(tcp_sockets[sock])
 
-      if len(tcp_sockets[sock]['rcvbuf']) == tcp_sockets[sock]['rcvlen']:
-        tcp_sockets[sock]['rcvbuf'] += msg[:impl_ret]
-      tcp_sockets[sock]['rcvlen'] += impl_ret
+      tcp_sockets[sock]['received'].add(msg, impl_ret)
 
     elif name in SEND_SYSCALLS:
       if args[0] not in tcp_sockets:
@@ -388,15 +1483,14 @@ def get_sock_data(trace_id, trace):
       if impl_ret < 0:
         continue
 
-      msg = msg.decode('string_escape')
+      if not isinstance(msg, payload_digest.PayloadDigest):
+        msg = msg.decode('string_escape')
 
       if sock not in connected_set:
         connected_set.add(sock)
         connect_sock_list.append(tcp_sockets[sock])
 
-      if len(tcp_sockets[sock]['sndbuf']) == tcp_sockets[sock]['sndlen']:
-        tcp_sockets[sock]['sndbuf'] += msg[:impl_ret]
-      tcp_sockets[sock]['sndlen'] += impl_ret
+      tcp_sockets[sock]['sent'].add(msg, impl_ret)
 
   return connect_sock_list, accept_sock_list
 
@@ -404,5 +1498,6 @@ def get_sock_data(trace_id, trace):
 
 if __name__ == "__main__":
   import sys
-  for syscall in preprocess_trace(get_trace_from_filename(sys.argv[1]), ''):
+  for syscall in preprocess_trace_batches(
+      get_trace_batches_from_filename(sys.argv[1]), ''):
     print syscall
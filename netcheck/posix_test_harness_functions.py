@@ -7,6 +7,11 @@
 import re
 import sys
 
+from collections import deque
+
+import lind_fs_constants
+import lind_net_constants
+
 from lind_fs_constants import *
 from lind_net_constants import *
 
@@ -30,2609 +35,2039 @@ ALL_COMMANDS = set([
 
 UNIMPLEMENTED_ERROR = -1
 
+# Everything the argument tokenizer needs to look at: the start of a
+# quoted string, brackets, and separators.
+PARAMETER_TOKEN_RE = re.compile(r'["{}\[\]()]|, ')
+OPEN_BRACKETS = "{[("
+CLOSE_BRACKETS = "}])"
 
 
 
-SIGS = ["---", "+++"]
-DEBUG = False
-pendingStraceTable = []
-ignore_fds = []
-
-
-
-
-###########
-# STRUCTS #
-###########
-
-class PendingStrace(object):
-
-    def __init__(self, pid, command, firstHalf):
-
-        self.pid = pid
-        self.command = command
-        self.firstHalf = firstHalf
-
-
-    def __str__(self):
-
-        line = str([self.pid, self.command, self.firstHalf])
-        return line
-
-
-
-
-#############
-# FUNCTIONS #
-#############
-
-def getNumberValidTraceLines(fh, num):
-
-    traces = []
-    trace = []
-
-    if num == -1:
-        trace = getValidTraceLine(fh)
-
-        while trace != []:
-            traces += trace
-            trace = getValidTraceLine(fh)
-
-    else:
-        while num > 0:
-            trace = getValidTraceLine(fh)
-
-            if trace == []:
-                break
-
-            traces += trace
-            num -= 1
-
-    return traces
-
-
-
-
-def getValidTraceLine(fh):
-
-    TRACE = []
-
-    # Open the file and process each line
-    for line in fh:
-        line = line.strip()
-
-        # Ignore SIGS
-        if line[:3] in SIGS:
-            continue
-
-        # EG
-        try:
-            pid = int(line[line.find(" ")+1:line.find("]")])
-        except:
-            try:
-                pid = int(line[:line.find(" ")])
-            except:
-                pid = 0
-
-        # Did the strace get interrupted?
-        if line.find("<unfinished ...>") != -1:
-
-            # Ignore lines with only unfinished
-            if line != "<unfinished ...>":
-
-                if "]" in line and line.find("]") < line.find("("):
-                    command = line[line.find("]")+1:line.find("(")].strip()
-
-                else:
-                    command = line[line.find(" ")+1:line.find("(")].strip()
-
-                if command in ALL_COMMANDS:
-                    pendingStraceTable.append(PendingStrace(pid, command, line[:line.find("<unfinished ...>")].strip()))
-
-            continue
-
-        # Is the strace resuming?
-        if line.find("<... ") != -1 and line.find(" resumed>") != -1:
-
-            command = line[line.find("<... ") + 5:line.find(" resumed>")]
-            pendingIdx = findPendingStrace(pendingStraceTable, pid, command)
-
-            # If pending strace isn't found, ignore and continue
-            if pendingIdx == None:
-                continue
-
-            else:
-                pending = pendingStraceTable[pendingIdx]
-                secondHalf = line[line.find("resumed>")+8:].strip()
-
-                if secondHalf[0] != ')':
-                    secondHalf = " " + secondHalf
-
-                oldLine = line
-                line = pending.firstHalf + secondHalf
-                pendingStraceTable.pop(pendingIdx)
-
-        # Ignore lines starting with Process:
-        if line[:line.find(" ")] == "Process":
-            continue
-
-        # Ignore incomplete strace lines without '(', ')', and '='
-        if line.find('(') == -1 or line.find(')') == -1 or line.find('=') == -1:
-            continue
-
-        # Get the first command name, parameters, and result
-        if DEBUG:
-            log(line)
-
-        if line[0] == '[':
-            command = line[line.find(']')+2:line.find('(')]
-        elif len(line[:line.find('(')].split(" ")) > 1:
-            command = line[:line.find('(')].split(" ")[-1]
-        else:
-            command = line[:line.find('(')]
-
-        if command not in ALL_COMMANDS:
-            continue
-
-        parameterChunk = line[line.find('(')+1:line.rfind('=')].strip()
-        parameters = parameterChunk[:-1].split(", ")
-        straceResult = line[line.rfind('=')+2:].strip()
-
-        #EFM
-
-        # Fix errors from split on messages
-        mergeQuoteParameters(parameters)
-
-        #JR
-
-        # Is the result a status number or error message?
-        spaced_results = straceResult.split(" ")
-
-        if len(spaced_results) > 1:
-            straceResult = straceResult[:straceResult.find(" ")]
-
-        # Apparently the strace result can also be a ?...
-        try:
-            straceResult = int(straceResult)
-        except:
-            pass
-
-        if straceResult == "?":
-            straceResult = -1
-
-        if straceResult == -1 and len(spaced_results) > 1:
-            straceResult = (straceResult, spaced_results[1])
-        else:
-            straceResult = (straceResult, None)
-
-
-        # Convert parameters into ints, execute, and assert ==
-
-
-        #################### NET CALLS ####################
-
-
-        ##### SOCKET #####
-
-        if command == "socket":
-
-            try:
-                domain = int(parameters[0])
-            except:
-                domain = splitAndCombine(parameters[0])
-
-            try:
-                socktype = int(parameters[1])
-            except:
-                socktype = splitAndCombine(parameters[1])
-
-            try:
-                protocol = int(parameters[2])
-            except:
-                protocol = splitAndCombine(parameters[2])
-
-            if DEBUG:
-                log(command, domain, socktype, protocol, straceResult, '\n')
-
-            if domain == UNIMPLEMENTED_ERROR or socktype == UNIMPLEMENTED_ERROR or protocol == UNIMPLEMENTED_ERROR:
-
-                if DEBUG:
-                    log("Unimplemented parameter, skipping...\n")
-
-            else:
-                TRACE.append(('socket_syscall', (pid, domain, socktype, protocol), straceResult))
-
-
-        ##### BIND #####
-
-        elif command == "bind":
-
-            sockfd = int(parameters[0])
-
-            localip = UNIMPLEMENTED_ERROR
-            localport = UNIMPLEMENTED_ERROR
-
-            if parameters[1].find('AF_INET6') != -1:
-               for index in range(1,len(parameters)-1, 1):
 
-                  p = parameters[index]
+# Lind constants that convert has never resolved, left out of CONSTANTS
+# so they still give UNIMPLEMENTED_ERROR. CSIGNAL is the signal mask in
+# clone flags rather than a flag, and F_FREESP isn't a Linux fcntl.
+UNCONVERTED_CONSTANTS = set(['CSIGNAL', 'F_FREESP'])
 
-                  if p.find("sin6_addr") != -1:
+# Maps the names of constants that show up in strace output to their
+# values. Built from the lind constants in the same order they are
+# imported above, so lind_net_constants wins where the two disagree.
+CONSTANTS = {}
 
-                     # I don't know if the ip addr is always in the previous position
-                     pp = parameters[index-1]
-                     localip = pp[pp.find("\"")+1:pp.rfind("\"")]
+for constants_module in (lind_fs_constants, lind_net_constants):
+    for name, value in vars(constants_module).items():
+        if not name.startswith('_') and isinstance(value, (int, long)) and \
+                name not in UNCONVERTED_CONSTANTS:
+            CONSTANTS[name] = value
 
-                  elif p.find("sin6_port") != -1:
-                     localport = int(p[p.find("(")+1:p.rfind(")")])
+CONSTANTS.update({
+    "MSG_CMSG_CLOEXEC": FD_CLOEXEC,
+    "MSG_DONTWAIT": O_NONBLOCK,
 
-            else:
-               for index in range(1,len(parameters)-1, 1):
-
-                  p = parameters[index]
-
-                  if p.find("sin_addr") != -1:
-                     localip = p[p.find("\"")+1:p.rfind("\"")]
-
-                  elif p.find("sin_port") != -1:
-                     localport = int(p[p.find("(")+1:p.rfind(")")])
-
-            if DEBUG:
-                log(command, sockfd, localip, localport, straceResult, '\n')
-
-            if localip == UNIMPLEMENTED_ERROR or localport == UNIMPLEMENTED_ERROR:
-
-                if DEBUG:
-                    log("Unimplemented parameter, skipping...\n")
-
-            else:
-                TRACE.append(('bind_syscall',(pid, sockfd, localip, localport), straceResult))
-
-
-        ##### CONNECT #####
-
-        elif command == "connect":
-
-            sockfd = int(parameters[0])
-
-            remoteip = UNIMPLEMENTED_ERROR
-            remoteport = UNIMPLEMENTED_ERROR
-
-            if parameters[1].find('AF_INET6') != -1:
-               for index in range(1,len(parameters)-1, 1):
-
-                  p = parameters[index]
-
-                  if p.find("sin6_addr") != -1:
-
-                     # I don't know if the ip addr is always in the previous position
-                     pp = parameters[index-1]
-                     remoteip = pp[pp.find("\"")+1:pp.rfind("\"")]
-
-                  elif p.find("sin6_port") != -1:
-                     remoteport = int(p[p.find("(")+1:p.rfind(")")])
-
-            else:
-               for index in range(1,len(parameters)-1, 1):
-
-                  p = parameters[index]
-
-                  if p.find("sin_addr") != -1:
-                     remoteip = p[p.find("\"")+1:p.rfind("\"")]
-
-                  elif p.find("sin_port") != -1:
-                     remoteport = int(p[p.find("(")+1:p.rfind(")")])
-
-            if DEBUG:
-                log(command, sockfd, remoteip, remoteport, straceResult)
-
-            if remoteip == UNIMPLEMENTED_ERROR or remoteport == UNIMPLEMENTED_ERROR:
-
-                if DEBUG:
-                    log("Unimplemented parameter, skipping...")
-
-            else:
-                TRACE.append(('connect_syscall',(pid, sockfd, remoteip, remoteport), straceResult))
-
-
-        # BUG: If message is larger than a certain length then strace will cut it off with '...' which could cause a false failure in comparison
-
-        ##### SENDTO #####
-
-        elif command == "sendto":
-
-            sockfd = int(parameters[0])
-
-            # Get the message without quotes
-
-            if parameters[1].endswith("..."):
-                message = parameters[1][1:len(parameters[1])-4]
-            else:
-                message = parameters[1][1:len(parameters[1])-1]
-
-            #message += "*" * (int(parameters[2]) - len(message))
-
-            try:
-                flags = int(parameters[3])
-            except:
-                flags = splitAndCombine(parameters[3])
-
-            if parameters[4] == "NULL":
-                remoteip = ''
-                remoteport = 0
-
-            else:
-                remoteip = UNIMPLEMENTED_ERROR
-                remoteport = UNIMPLEMENTED_ERROR
-
-                if parameters[1].find('AF_INET6') != -1:
-                   for index in range(1,len(parameters)-1, 1):
-
-                      p = parameters[index]
-
-                      if p.find("sin6_addr") != -1:
-                         # I don't know if the ip addr is always in the previous position
-                         pp = parameters[index-1]
-                         remoteip = pp[pp.find("\"")+1:pp.rfind("\"")]
-
-                      elif p.find("sin6_port") != -1:
-                         remoteport = int(p[p.find("(")+1:p.rfind(")")])
-
-                else:
-                   for index in range(1,len(parameters)-1, 1):
-
-                      p = parameters[index]
-
-                      if p.find("sin_addr") != -1:
-                         remoteip = p[p.find("\"")+1:p.rfind("\"")]
-
-                      elif p.find("sin_port") != -1:
-                         remoteport = int(p[p.find("(")+1:p.rfind(")")])
-
-            if DEBUG:
-                log(command, sockfd, message, flags, remoteip, remoteport, straceResult)
-
-            if remoteip == UNIMPLEMENTED_ERROR or remoteport == UNIMPLEMENTED_ERROR or flags == UNIMPLEMENTED_ERROR:
-
-                if DEBUG:
-                    log("Unimplemented parameter, skipping...")
-
-            else:
-                TRACE.append(('sendto_syscall',(pid, sockfd, message, flags, remoteip, remoteport), straceResult))
-
-
-        ##### SEND #####
-
-        elif command == "send":
-
-            if(len(parameters) > 4):
-                merge(parameters, 1, len(parameters)-2)
-
-            sockfd = int(parameters[0])
-
-            # Get the message without quotes
-
-            if parameters[1].endswith("..."):
-                message = parameters[1][1:len(parameters[1])-4]
-            else:
-                message = parameters[1][1:len(parameters[1])-1]
-
-            #message += "*" * (int(parameters[2]) - len(message))
-
-            try:
-                flags = int(parameters[-1])
-            except:
-                flags = splitAndCombine(parameters[-1])
-
-            if DEBUG:
-                log(command, sockfd, message, flags, straceResult)
-
-            if flags == UNIMPLEMENTED_ERROR:
-
-                if DEBUG:
-                    log("Unimplemented parameter, skipping...")
-
-            else:
-                TRACE.append(('send_syscall',(pid, sockfd, message, flags), straceResult))
-
-
-        ##### EG: WRITE #####
-
-        elif command == "write":
-
-            if(len(parameters) > 3):
-                merge(parameters, 1, len(parameters)-1)
-
-            sockfd = int(parameters[0])
-
-            # Get the message without quotes
-
-            if parameters[1].endswith("..."):
-                message = parameters[1][1:len(parameters[1])-4]
-            else:
-                message = parameters[1][1:len(parameters[1])-1]
-
-            #message += "*" * (int(parameters[2]) - len(message))
-
-            if DEBUG:
-                log(command, sockfd, message, straceResult)
-
-            else:
-                TRACE.append(('write_syscall',(pid, sockfd, message), straceResult))
-
-
-        ##### EG: WRITEV #####
-
-        elif command == "writev":
-
-            sockfd = int(parameters[0])
-
-            parameterChunk = parameterChunk[:-1]
-            paratmp = parameterChunk.split(',', 1)
-            paratmp2 = paratmp[1].rsplit(',', 1)
-
-            parameters = []
-            parameters.insert(0, paratmp[0])
-            parameters.insert(1, paratmp2[0])
-            parameters.insert(2, paratmp2[1])
-
-            iocount = int(parameters[2])
-            ioi = 0
-            rs = parameters[1].split('},')
-            message = ""
-
-            # we concatanate all the messages together
-            # this is what the receiver will see
-            # stupid and sloppy string operations! there may be a smarter way to do it!
-
-            while ioi < iocount:
-
-                if ioi == 0:
-                    rs[ioi] = rs[ioi].replace('[', '', 1)
-
-                if ioi == iocount-1:
-                    if rs[ioi][len(rs[ioi])-1] == ']':
-                        rs[ioi] = rs[ioi][:-1]
-
-                rs[ioi] = rs[ioi].strip().replace('{', '', 1)
-
-                if rs[ioi][len(rs[ioi])-1] == '}':
-                    rs[ioi] = rs[ioi][:-1]
-
-                table = rs[ioi].rsplit(',', 1)
-
-                if table[0] == 'NULL' or table[0] == "":
-                    message += table[0]
-
-                else: 
-                    # Get the message without quotes
-
-                    if table[0].rfind("...") != -1:
-                        partmessage = table[0].strip("...")[1:len(table[0])-4]
-                    else:
-                        partmessage = table[0][1:len(table[0])-1]
-
-                    message += partmessage
-                    #message += "*" * (int(table[1]) - len(message))
-
-                ioi += 1
-
-            if DEBUG:
-                log(command, sockfd, message, iocount, straceResult)
-
-            else:
-                TRACE.append(('writev_syscall',(pid, sockfd, message, iocount), straceResult))
-
-
-        ##### EG: SENDFILE #####
-
-        elif command == "sendfile":
-
-            sockfd = int(parameters[0])
-
-            in_fd = int(parameters[1])
-
-            if parameters[2] == "NULL":
-                offset = 0
-            else:
-                offset = int(parameters[2].replace('[', '').replace(']', ''))
-
-            count = int(parameters[3])
-
-            if DEBUG:
-                log(command, sockfd, in_fd, offset, count, straceResult)
-
-            else:
-                TRACE.append(('sendfile_syscall',(pid, sockfd, in_fd, offset, count), straceResult))
-
-
-        ##### EG: READ #####
-
-        elif command == "read":
-
-            if(len(parameters) > 3):
-                merge(parameters, 1, len(parameters)-1)
-
-            sockfd = int(parameters[0])
-
-            if straceResult[0] == -1:
-                message = None
-            # Get the message without quotes
-            elif parameters[1].endswith("..."):
-                message = parameters[1][1:len(parameters[1])-4]
-            else:
-                message = parameters[1][1:len(parameters[1])-1]
-
-            length = int(parameters[2])
-
-            if DEBUG:
-                log(command, sockfd, message, length, straceResult)
-
-            else:
-                TRACE.append(('read_syscall',(pid, sockfd, message, length), straceResult))
-
-
-        ##### RECVFROM #####
+    # Parameters that don't translate to POSIX model but are often used...
 
-        elif command == "recvfrom":
+    # Ignoring MSG_NOSIGNAL
+    "MSG_NOSIGNAL": 0,
 
-            sockfd = int(parameters[0])
+    # Ignoring SOCK_CLOEXEC because it seems to be needed more for multi-threading
+    "SOCK_CLOEXEC": 0,
 
-            if straceResult[0] == -1:
-                message = None
-            # Get the message without quotes
-            elif parameters[1].endswith("..."):
-                message = parameters[1][1:len(parameters[1])-4]
-            else:
-                message = parameters[1][1:len(parameters[1])-1]
+    # SOCK_NONBLOCK is the same as O_NONBLOCK
+    "SOCK_NONBLOCK": O_NONBLOCK,
+})
+
+# Whole '|' separated flag expressions already resolved by splitAndCombine.
+FLAG_EXPRESSION_CACHE = {}
+MAX_FLAG_EXPRESSIONS = 4096
+
+# Recently parsed sockaddr structs, mapped to their (family, ip, port).
+# UDP traces tend to repeat the same few addresses on every sendto and
+# recvfrom. When SOCKADDR_CACHE fills up it replaces OLD_SOCKADDR_CACHE
+# and starts again empty, and structs found in the old one are moved
+# back, so the least recently used ones are the ones that get dropped.
+SOCKADDR_CACHE = {}
+OLD_SOCKADDR_CACHE = {}
+MAX_SOCKADDRS = 1024
+
+# sockaddr families parseSockaddr returns an (ip, port) for.
+INET_FAMILIES = set(['AF_INET', 'AF_INET6'])
+
+
+# Pulls the pid and system call name out of a line without doing any
+# other work, so lines for calls we don't care about can be thrown away
+# immediately. Skips the "<... " of a resumed line. Groups are
+# ("[pid 1234]" pid, "1234 " pid, -t/-tt/-ttt timestamp, name).
+SYSCALL_NAME_RE = re.compile(r'\s*(?:\[pid\s+(\d+)\]|(\d+)(?=\s))?\s*(?:(\d+:\d+:\d+(?:\.\d+)?|\d+\.\d+)\s+)?(?:<\.\.\. )?([a-z_0-9]+)[( ]')
+
+# Limits on how long an '<unfinished ...>' line waits for its
+# 'resumed>' half. Anything older than PENDING_STRACE_MAX_AGE trace lines,
+# or pushed out of a full per-(pid, command) queue, is dropped as an
+# orphan (e.g. the thread was killed before the call returned).
+PENDING_STRACE_LIMIT = 16
+PENDING_STRACE_MAX_AGE = 1000000
+PENDING_STRACE_SWEEP_INTERVAL = 10000
+
+# When keepUnmatchedResumedLines is set, a 'resumed>' line whose
+# '<unfinished ...>' half hasn't been seen is returned as
+# (RESUMED_LINE, line) instead of being dropped. This lets a trace be
+# parsed in pieces, with resumed lines matched up with unfinished lines
+# from earlier pieces afterwards.
+RESUMED_LINE = "resumed_line"
+keepUnmatchedResumedLines = False
+
+# strace -yy prints what each fd refers to right after it, e.g.
+# 3<TCP:[10.0.0.1:45678->10.0.0.2:80]>, 4<pipe:[1234]> or 5</var/log/x>.
+# Groups are (fd, annotation).
+FD_ANNOTATION_RE = re.compile(r'(\d+)<(\w+:\[.*?\]|/[^<>]*(?:<[^<>]*>)?|[^<>\[\]]*)>')
+
+# Calls that are dropped as soon as their fd is annotated as something
+# other than a socket, and calls that have fds past their first argument.
+NON_SOCKET_DROPPED_COMMANDS = set(['read', 'write', 'writev', 'close'])
+MULTIPLE_FD_COMMANDS = set(['dup2', 'dup3', 'sendfile', 'select', 'poll'])
+
+# Annotation prefixes of fds that can't be sockets (paths are spotted by
+# their leading '/').
+NON_SOCKET_FD_TYPES = set(['pipe', 'anon_inode'])
+
+# Parsed system calls whose third argument (after the pid and fd) is their
+# payload, counted in ParseCounters.payloadChars.
+PAYLOAD_SYSCALLS = set([
+  'read_syscall', 'write_syscall', 'writev_syscall', 'send_syscall',
+  'sendto_syscall', 'sendmsg_syscall', 'recv_syscall', 'recvfrom_syscall',
+  'recvmsg_syscall'])
 
-            length = int(parameters[2])
 
-            try:
-                flags = int(parameters[3])
-            except:
-                flags = splitAndCombine(parameters[3])
+DEBUG = False
+ignore_fds = []
 
-            if parameters[4] == "NULL":
-                remoteip = ''
-                remoteport = 0
+# Maps (pid, command) to a FIFO of PendingStrace objects.
+pendingStraceTable = {}
+traceLineNumber = 0
+lastPendingSweep = 0
+# Errors raised while parsing a batch that already had system calls in
+# it, held back until the next call to getValidTraceLines for the same
+# trace. Maps id(fh) to (fh, exc_info), keeping fh so its id isn't reused.
+pendingParseErrors = {}
 
-            else:
-                remoteip = UNIMPLEMENTED_ERROR
-                remoteport = UNIMPLEMENTED_ERROR
 
-                if parameters[1].find('AF_INET6') != -1:
-                   for index in range(1,len(parameters)-1, 1):
 
-                      p = parameters[index]
 
-                      if p.find("sin6_addr") != -1:
-                         # I don't know if the ip addr is always in the previous position
-                         pp = parameters[index-1]
-                         remoteip = pp[pp.find("\"")+1:pp.rfind("\"")]
+###########
+# STRUCTS #
+###########
 
-                      elif p.find("sin6_port") != -1:
-                         remoteport = int(p[p.find("(")+1:p.rfind(")")])
+class PendingStrace(object):
 
-                else:
-                   for index in range(1,len(parameters)-1, 1):
+    def __init__(self, pid, command, firstHalf, lineNumber=0):
 
-                      p = parameters[index]
+        self.pid = pid
+        self.command = command
+        self.firstHalf = firstHalf
+        self.lineNumber = lineNumber
 
-                      if p.find("sin_addr") != -1:
-                         remoteip = p[p.find("\"")+1:p.rfind("\"")]
 
-                      elif p.find("sin_port") != -1:
-                         remoteport = int(p[p.find("(")+1:p.rfind(")")])
+    def __str__(self):
 
-            if DEBUG:
-                log(command, sockfd, message, remoteip, remoteport, flags, straceResult)
+        line = str([self.pid, self.command, self.firstHalf])
+        return line
 
-            if remoteip == UNIMPLEMENTED_ERROR or remoteport == UNIMPLEMENTED_ERROR or flags == UNIMPLEMENTED_ERROR:
 
-                if DEBUG:
-                    log("Unimplemented parameter, skipping...")
 
-            else:
-                TRACE.append(('recvfrom_syscall',(pid, sockfd, message, length, flags, remoteip, remoteport), straceResult))
 
+class ParseCounters(object):
+    """
+    Counts of what the parser has done with the trace lines it has read:
+    how many lines there were, how many were thrown away for each of the
+    reasons in REJECTION_COUNTERS, how many of each system call were
+    parsed and how many characters of payload text those calls carried.
+    Keeping the counts only costs an integer or dictionary update where
+    a line is rejected or a call is parsed. asDict() gives them in a form
+    that can be dumped as JSON.
+    """
 
-        ##### RECV #####
+    REJECTION_COUNTERS = [
+        # Lines with no system call on them: signals, "Process N
+        # attached" and "+++ exited with N +++" lines, and anything else.
+        'signalLines', 'processLines', 'unrecognizedLines',
+        # Calls we never parse, dropped by name before anything else.
+        'ignoredCalls',
+        # Unfinished halves never resumed (see PENDING_STRACE_LIMIT and
+        # PENDING_STRACE_MAX_AGE), and resumed halves never started.
+        'orphanedUnfinished', 'orphanedResumed',
+        # Lines missing '(', ')' or '=', and names with no parser.
+        'incompleteLines', 'unknownCalls',
+        # strace -yy calls on files and pipes.
+        'nonSocketCalls',
+        # Calls the parser gave up on, e.g. for UNIMPLEMENTED_ERROR
+        # arguments, and calls it failed on.
+        'unimplementedCalls', 'parseErrors']
 
-        elif command == "recv":
+    def __init__(self):
 
-            if(len(parameters) > 4):
+        self.lines = 0
+        for counter in self.REJECTION_COUNTERS:
+            setattr(self, counter, 0)
+        self.syscalls = {}
+        self.payloadChars = 0
 
-                merge(parameters, 1, len(parameters)-2)
 
-            sockfd = int(parameters[0])
+    def add(self, other):
+        """
+        Adds the counts in other, e.g. from parsing part of a trace in
+        another process, to these.
+        """
 
-            if straceResult[0] == -1:
-                message = None
-            # Get the message without quotes
-            elif parameters[1].endswith("..."):
-                message = parameters[1][1:len(parameters[1])-4]
-            else:
-                message = parameters[1][1:len(parameters[1])-1]
+        self.lines += other.lines
+        for counter in self.REJECTION_COUNTERS:
+            setattr(self, counter,
+                    getattr(self, counter) + getattr(other, counter))
+        for name, count in other.syscalls.iteritems():
+            self.syscalls[name] = self.syscalls.get(name, 0) + count
+        self.payloadChars += other.payloadChars
 
-            length = int(parameters[-2])
 
-            try:
-                flags = int(parameters[-1])
-            except:
-                flags = splitAndCombine(parameters[-1])
+    def asDict(self):
 
-            if DEBUG:
-                log(command, sockfd, length, flags, straceResult)
+        return {'lines': self.lines,
+                'rejected': dict((counter, getattr(self, counter))
+                                 for counter in self.REJECTION_COUNTERS),
+                'syscalls': dict(self.syscalls),
+                'payloadChars': self.payloadChars}
 
-            if flags == UNIMPLEMENTED_ERROR:
 
-                if DEBUG:
-                    log("Unimplemented parameter, skipping...")
+# The counts for everything parsed so far.
+parseCounters = ParseCounters()
 
-            else:
-                TRACE.append(('recv_syscall',(pid, sockfd, message, length, flags), straceResult))
 
 
-        ##### GETSOCKNAME #####
 
-        elif command == "getsockname":
+class TimedSyscall(tuple):
+    """
+    A (name, args, ret) system call tuple from a trace captured with -t,
+    -tt, -ttt or -T. timestamp is when the call started in seconds (since
+    midnight for -t/-tt, since the epoch for -ttt) and duration is how many
+    seconds it took; either may be None. It unpacks and compares like the
+    plain tuple, so code that doesn't care about timing can ignore it.
+    Traces without timing just produce plain tuples.
+    """
 
-            sockfd = int(parameters[0])
+    def __new__(cls, syscall, timestamp, duration):
 
-            localip = UNIMPLEMENTED_ERROR
-            localport = UNIMPLEMENTED_ERROR
+        self = tuple.__new__(cls, syscall)
+        self.timestamp = timestamp
+        self.duration = duration
+        return self
 
-            if parameters[1].find('AF_INET6') != -1:
-               for index in range(1,len(parameters)-1, 1):
 
-                  p = parameters[index]
+    def __reduce__(self):
 
-                  if p.find("sin6_addr") != -1:
-                     # I don't know if the ip addr is always in the previous position
-                     pp = parameters[index-1]
-                     localip = pp[pp.find("\"")+1:pp.rfind("\"")]
+        return (TimedSyscall, (tuple(self), self.timestamp, self.duration))
 
-                  elif p.find("sin6_port") != -1:
-                     localport = int(p[p.find("(")+1:p.rfind(")")])
 
-            else:
-               for index in range(1,len(parameters)-1, 1):
 
-                  p = parameters[index]
 
-                  if p.find("sin_addr") != -1:
-                     localip = p[p.find("\"")+1:p.rfind("\"")]
+class AnnotatedSyscall(TimedSyscall):
+    """
+    A TimedSyscall from a trace captured with -yy, whose first argument
+    is a socket fd. fdAnnotation is what strace printed about the fd,
+    e.g. 'TCP:[10.0.0.1:45678->10.0.0.2:80]' (see parseFdAnnotation).
+    The timestamp and duration are None if the trace has no timing.
+    """
 
-                  elif p.find("sin_port") != -1:
-                     localport = int(p[p.find("(")+1:p.rfind(")")])
+    def __new__(cls, syscall, timestamp, duration, fdAnnotation):
 
-            if DEBUG:
-                log(command, sockfd, localip, localport, straceResult)
+        self = TimedSyscall.__new__(cls, syscall, timestamp, duration)
+        self.fdAnnotation = fdAnnotation
+        return self
 
-            if localip == UNIMPLEMENTED_ERROR or localport == UNIMPLEMENTED_ERROR:
 
-                if DEBUG:
-                    log("Unimplemented parameter, skipping...")
+    def __reduce__(self):
 
-            else:
-                straceResult = ((localip, localport),) + straceResult[1:]
-                TRACE.append(('getsockname_syscall',(pid, sockfd), straceResult))
+        return (AnnotatedSyscall, (tuple(self), self.timestamp, self.duration,
+                                   self.fdAnnotation))
 
 
-        ##### GETPEERNAME #####
 
-        elif command == "getpeername":
 
-            sockfd = int(parameters[0])
+class LazyPayload(object):
+    """
+    The payload of a read, write, send or recv call, kept as the position
+    of its quoted string in the strace line. Nothing is copied out of the
+    line until str() is called, so calls on files and pipes that get
+    thrown away later never pay for their payloads. It prints, compares
+    and hashes like the payload string, and pickles as one.
+    """
 
-            remoteip = UNIMPLEMENTED_ERROR
-            remoteport = UNIMPLEMENTED_ERROR
+    __slots__ = ('line', 'start', 'end')
 
-            if parameters[1].find('AF_INET6') != -1:
-               for index in range(1,len(parameters)-1, 1):
+    def __init__(self, line, start, end):
 
-                  p = parameters[index]
+        self.line = line
+        self.start = start
+        self.end = end
 
-                  if p.find("sin6_addr") != -1:
-                     # I don't know if the ip addr is always in the previous position
-                     pp = parameters[index-1]
-                     remoteip = pp[pp.find("\"")+1:pp.rfind("\"")]
 
-                  elif p.find("sin6_port") != -1:
-                     remoteport = int(p[p.find("(")+1:p.rfind(")")])
+    def __str__(self):
 
-            else:
-               for index in range(1,len(parameters)-1, 1):
+        return decodePayload(self.line[self.start:self.end])
 
-                  p = parameters[index]
 
-                  if p.find("sin_addr") != -1:
-                     remoteip = p[p.find("\"")+1:p.rfind("\"")]
+    def __repr__(self):
 
-                  elif p.find("sin_port") != -1:
-                     remoteport = int(p[p.find("(")+1:p.rfind(")")])
+        return repr(str(self))
 
-            if DEBUG:
-                log(command, sockfd, remoteip, remoteport, straceResult)
 
-            if remoteip == UNIMPLEMENTED_ERROR or remoteport == UNIMPLEMENTED_ERROR:
+    def __eq__(self, other):
 
-                if DEBUG:
-                    log("Unimplemented parameter, skipping...")
+        return str(self) == other
 
-            else:
-                straceResult = ((remoteip,remoteport),) + straceResult[1:]
-                TRACE.append(('getpeername_syscall',(pid, sockfd), straceResult))
 
+    def __ne__(self, other):
 
-        ##### LISTEN  #####
+        return str(self) != other
 
-        elif command == "listen":
 
-            sockfd = int(parameters[0])
+    def __hash__(self):
 
-            try:
-                backlog = int(parameters[1])
-            except:
-                backlog = splitAndCombine(parameters[1])
+        return hash(str(self))
 
-            if DEBUG:
-                log(command, sockfd, backlog, straceResult)
 
-            TRACE.append(('listen_syscall',(pid, sockfd, backlog), straceResult))
+    def __reduce__(self):
 
+        return (str, (str(self),))
 
-        ##### ACCEPT #####
 
-        # TODO: change it to parse accept4 syscall
 
-        elif command == "accept": # or command == "accept4":
 
-            sockfd = int(parameters[0])
+#############
+# FUNCTIONS #
+#############
 
-            remoteip = UNIMPLEMENTED_ERROR
-            remoteport = UNIMPLEMENTED_ERROR
+def getNumberValidTraceLines(fh, num):
 
-            if parameters[1].find('AF_INET6') != -1:
-               for index in range(1,len(parameters)-1, 1):
+    if num == -1:
+        return getValidTraceLines(fh, None)
 
-                  p = parameters[index]
+    if num <= 0:
+        return []
 
-                  if p.find("sin6_addr") != -1:
-                     # I don't know if the ip addr is always in the previous position
-                     pp = parameters[index-1]
-                     remoteip = pp[pp.find("\"")+1:pp.rfind("\"")]
+    return getValidTraceLines(fh, num)
 
-                  elif p.find("sin6_port") != -1:
-                     remoteport = int(p[p.find("(")+1:p.rfind(")")])
 
-            else:
-               for index in range(1,len(parameters)-1, 1):
 
-                  p = parameters[index]
 
-                  if p.find("sin_addr") != -1:
-                     remoteip = p[p.find("\"")+1:p.rfind("\"")]
+def getValidTraceLine(fh):
 
-                  elif p.find("sin_port") != -1:
-                     remoteport = int(p[p.find("(")+1:p.rfind(")")])
+    return getValidTraceLines(fh, 1)
 
-            if DEBUG:
-                log(command, sockfd, remoteip, remoteport, straceResult)
 
-            if remoteip == UNIMPLEMENTED_ERROR or remoteport == UNIMPLEMENTED_ERROR:
 
-                if DEBUG:
-                    log("Unimplemented parameter, skipping...")
 
-            else:
-                TRACE.append(('accept_syscall',(pid, sockfd,remoteip,remoteport), straceResult))
+def getValidTraceLines(fh, count):
+    """
+    Parses lines from fh until count system calls have been parsed, or
+    to the end of fh if count is None. Returns the list of system calls,
+    which is empty once fh has run out. fh has to be an iterator (e.g. a
+    file) for later calls to carry on where the last one stopped. What
+    happened to each line is counted in parseCounters.
+    """
 
+    firstLine = traceLineNumber
 
-        ##### GETSOCKOPT #####
+    try:
+        return parseTraceLines(fh, count)
+    finally:
+        parseCounters.lines += traceLineNumber - firstLine
 
-        elif command == "getsockopt":
 
-            sockfd = int(parameters[0])
 
-            try:
-                level = int(parameters[1])
-            except:
-                level = splitAndCombine(parameters[1])
 
-            try:
-                optname = int(parameters[2])
-            except:
-                optname = splitAndCombine(parameters[2])
+def countUnmatchedLine(counters, line):
+    """
+    Counts a line that isn't a system call, by what it looks like.
+    """
 
-            # TODO: handle opt_val correctly!!
+    if line.find('--- SIG') != -1:
+        counters.signalLines += 1
+    elif line.find('Process ') != -1 or line.find('+++ ') != -1:
+        counters.processLines += 1
+    else:
+        counters.unrecognizedLines += 1
 
-            try:
-                if optname == SO_RCVTIMEO or optname == IP_ADD_MEMBERSHIP:
-                    optval = parameters[3].strip('\"')
 
-                else:
-                    try:
-                        optval = int(parameters[3].strip("[]"))
 
-                    except:
-                        optval = splitAndCombine(parameters[3])
 
-                result = (optval, None)
+def parseTraceLines(fh, count):
 
-            except:
-                result = straceResult
+    global traceLineNumber
 
-            if DEBUG:
-                log(command, sockfd, level, optname, result)
+    if pendingParseErrors:
+        pending = pendingParseErrors.pop(id(fh), None)
+        if pending is not None:
+            error = pending[1]
+            raise error[0], error[1], error[2]
 
-            if level == UNIMPLEMENTED_ERROR or optname == UNIMPLEMENTED_ERROR:
+    syscalls = []
+    counters = parseCounters
+    syscallCounts = counters.syscalls
 
-                if DEBUG:
-                    log("Unimplemented parameter, skipping...")
+    # Open the file and process each line
+    for line in fh:
+        traceLineNumber += 1
+
+        # Drop lines for system calls we never parse before doing anything
+        # else. Signals and "Process" lines either don't match at all or
+        # match with the pid taken as the call name.
+        match = SYSCALL_NAME_RE.match(line)
+        if match is None:
+            countUnmatchedLine(counters, line)
+            continue
 
+        if match.group(4) not in ALL_COMMANDS:
+            if match.group(4).isdigit():
+                countUnmatchedLine(counters, line)
             else:
-                TRACE.append(('getsockopt_syscall',(pid, sockfd, level, optname), result))
-
+                counters.ignoredCalls += 1
+            continue
 
-        ##### SETSOCKOPT #####
+        line = line.strip()
+        pid = int(match.group(1) or match.group(2) or 0)
+        timestamp = match.group(3)
+        duration = None
+        fdAnnotation = None
 
-        elif command == "setsockopt":
+        # Did the strace get interrupted?
+        if line.find("<unfinished ...>") != -1:
 
-            sockfd = int(parameters[0])
+            # Ignore lines with only unfinished
+            if line != "<unfinished ...>":
+                command = match.group(4)
+                addPendingStrace(PendingStrace(pid, command, line[:line.find("<unfinished ...>")].strip(), traceLineNumber))
 
-            try:
-                level = int(parameters[1])
-            except:
-                level = splitAndCombine(parameters[1])
+            continue
 
-            try:
-                optname = int(parameters[2])
-            except:
-                optname = splitAndCombine(parameters[2])
+        # Is the strace resuming?
+        if line.find("<... ") != -1 and line.find(" resumed>") != -1:
 
-            if optname == SO_RCVTIMEO or optname == IP_ADD_MEMBERSHIP:
-                optval = parameters[3].strip('\"')
+            command = line[line.find("<... ") + 5:line.find(" resumed>")]
+            pending = findPendingStrace(pid, command)
 
-            elif optname == SO_LINGER:
-                onoff = parameters[3][parameters[3].find('=')+1:]
-                linger = parameters[4][parameters[4].rfind('=')+1:parameters[4].rfind('}')]
-                optval = (int(onoff), int(linger))
+            # If pending strace isn't found, ignore and continue
+            if pending == None:
+                if keepUnmatchedResumedLines:
+                    syscalls.append((RESUMED_LINE, line))
+                    if len(syscalls) == count:
+                        return syscalls
+                else:
+                    counters.orphanedResumed += 1
+                continue
 
             else:
-                try:
-                    optval = int(parameters[3].strip("[]"))
-                except:
-                    optval = splitAndCombine(parameters[3])
+                secondHalf = line[line.find("resumed>")+8:].strip()
 
-            if DEBUG:
-                log(command, sockfd, level, optname, optval, straceResult)
+                if secondHalf[0] != ')':
+                    secondHalf = " " + secondHalf
 
-            if level == UNIMPLEMENTED_ERROR or optname == UNIMPLEMENTED_ERROR:
+                oldLine = line
+                line = pending.firstHalf + secondHalf
 
-                if DEBUG:
-                    log("Unimplemented parameter, skipping...")
+                # The call started when the unfinished half was printed.
+                if timestamp is not None:
+                    timestamp = SYSCALL_NAME_RE.match(line).group(3)
 
+        # Pull off the " <seconds>" -T adds after the result. Anything else
+        # in brackets there (e.g. "= ? <unavailable>") is left for the
+        # result handling below.
+        if line[-1] == '>' and line[line.rfind('<')-1] == ' ':
+            try:
+                duration = float(line[line.rfind('<')+1:-1])
+            except ValueError:
+                pass
             else:
-                TRACE.append(('setsockopt_syscall',(pid, sockfd, level, optname, optval), straceResult))
+                line = line[:line.rfind('<')].rstrip()
 
+        # Ignore incomplete strace lines without '(', ')', and '='
+        if line.find('(') == -1 or line.find(')') == -1 or line.find('=') == -1:
+            counters.incompleteLines += 1
+            continue
 
-        ##### SHUTDOWN #####
+        # Get the first command name, parameters, and result
+        if DEBUG:
+            log(line)
 
-        elif command == "shutdown":
+        command = match.group(4)
 
-            sockfd = int(parameters[0])
+        parse = SYSCALL_PARSERS.get(command)
 
-            if " " in parameters[1]:
-                parameters[1] = parameters[1][:parameters[1].find(" ")]
+        if parse is None:
+            counters.unknownCalls += 1
+            continue
 
-            try:
-                how = int(parameters[1])
-            except:
-                how = splitAndCombine(parameters[1])
+        # Take out strace -yy fd annotations, and drop I/O on files and
+        # pipes before any of the line is parsed.
+        if line.find('<') != -1:
+            line, fdAnnotation = stripFdAnnotations(line, command)
 
-            if DEBUG:
-                log(command, sockfd, how, straceResult)
+            if fdAnnotation is not None and \
+                    command in NON_SOCKET_DROPPED_COMMANDS and \
+                    not isSocketAnnotation(fdAnnotation):
+                counters.nonSocketCalls += 1
+                continue
 
-            if how == UNIMPLEMENTED_ERROR:
+        if command in UNTOKENIZED_COMMANDS:
+            parameters = None
+        else:
+            parameters = tokenizeParameters(getParameterChunk(line)[:-1])
 
-                if DEBUG:
-                    log("Unimplemented parameter, skipping...")
+        straceResult = line[line.rfind('=')+2:].strip()
 
-            else:
-                TRACE.append(('shutdown_syscall',(pid, sockfd, how), straceResult))
+        # Is the result a status number or error message?
+        spaced_results = straceResult.split(" ")
 
+        if len(spaced_results) > 1:
+            straceResult = straceResult[:straceResult.find(" ")]
 
-        ##### CLOSE #####
+        # Apparently the strace result can also be a ?...
+        try:
+            straceResult = int(straceResult)
+        except:
+            pass
 
-        elif command == "close":
+        if straceResult == "?":
+            straceResult = -1
 
-            sockfd = int(parameters[0])
+        if straceResult == -1 and len(spaced_results) > 1:
+            straceResult = (straceResult, spaced_results[1])
+        else:
+            straceResult = (straceResult, None)
 
-            if DEBUG:
-                log(command, sockfd, straceResult)
+        # Hand back the calls parsed before a line that can't be parsed,
+        # the same as if they had been parsed one at a time. There is no
+        # next call to raise the error from when parsing to the end of fh.
+        try:
+            syscall = parse(pid, parameters, straceResult, line)
+        except Exception:
+            counters.parseErrors += 1
+            if count is None or not syscalls:
+                raise
+            pendingParseErrors[id(fh)] = (fh, sys.exc_info())
+            return syscalls
 
-            TRACE.append(('close_syscall', (pid, sockfd), straceResult))
+        if DEBUG:
+            log('\n')
 
+        if syscall is None:
+            counters.unimplementedCalls += 1
 
-        # TODO I need to take care of these cases: eg: recvmsg(21, 0xabeceeac, 0)
+        else:
+            name = syscall[0]
+            syscallCounts[name] = syscallCounts.get(name, 0) + 1
 
-        # Not done yet!!
+            if name in PAYLOAD_SYSCALLS:
+                # Payloads are counted in characters as strace printed
+                # them, escapes and all, less the quotes and any "..."
+                # after them, not in bytes.
+                payload = syscall[1][2]
+                if type(payload) is LazyPayload:
+                    length = payload.end - payload.start - 2
+                    if payload.line.endswith('...', 0, payload.end):
+                        length -= 3
+                    counters.payloadChars += length
+                elif type(payload) is str:
+                    counters.payloadChars += len(payload)
 
-        ##### EG: RECVMSG #####
+            if timestamp is not None:
+                timestamp = parseTimestamp(timestamp)
 
-        elif command == "recvmsg":
+            if fdAnnotation is not None and isSocketAnnotation(fdAnnotation):
+                syscall = AnnotatedSyscall(syscall, timestamp, duration,
+                                           fdAnnotation)
+            elif timestamp is not None or duration is not None:
+                syscall = TimedSyscall(syscall, timestamp, duration)
 
-            sockfd = int(parameters[0])
+            syscalls.append(syscall)
+            if len(syscalls) == count:
+                return syscalls
 
-            message = UNIMPLEMENTED_ERROR
 
-            all_message = ""
-            len_msg = 0
+    return syscalls
 
-            if parameterChunk.find("msg_iov") != -1:
 
-                if parameterChunk.find('[{') == -1 or parameterChunk.rfind('}],') == -1:
-                    continue
 
-                table = parameterChunk[parameterChunk.find('[{')+1:parameterChunk.rfind('}],')]
-                table = table.split('}, {')
 
-                for index in range(len(table)):
 
-                    p = table[index]
-                    message = p[p.find("\"")+1:p.rfind("\"")]
+def getParameterChunk(line):
 
-                    if message == "":
-                        continue
+    return line[line.find('(')+1:line.rfind('=')].strip()
 
-                    len_msg = int(p.rsplit(', ', 1)[1])
-                    message += "*" * (len_msg - len(message))
-                    all_message += message
 
-            try:
-                flags = int(parameters[-1])
-            except:
-                flags = splitAndCombine(parameters[-1])
 
-            remoteip = UNIMPLEMENTED_ERROR
-            remoteport = UNIMPLEMENTED_ERROR
 
-            if parameters[1].find('AF_INET6') != -1:
-               for index in range(1,len(parameters)-1, 1):
+def tokenizeParameters(parameterChunk):
+    """
+    Splits the text between the parentheses of a system call into its
+    arguments in a single pass. Separators inside quoted strings
+    (including escaped quotes and truncated "..." strings) and inside
+    {...}, [...] and (...) groups are not split on, so sockaddr structs,
+    fd sets and payloads each come back as a single argument.
+    """
 
-                  p = parameters[index]
+    parameters = []
+    depth = 0
+    start = 0
 
-                  if p.find("sin6_addr") != -1:
-                     # I don't know if the ip addr is always in the previous position
-                     pp = parameters[index-1]
-                     remoteip = pp[pp.find("\"")+1:pp.rfind("\"")]
+    match = PARAMETER_TOKEN_RE.search(parameterChunk)
 
-                  elif p.find("sin6_port") != -1:
-                     remoteport = int(p[p.find("(")+1:p.rfind(")")])
+    while match is not None:
+        token = match.group()
+        position = match.end()
 
-            else:
-               for index in range(1,len(parameters)-1, 1):
+        if token == '"':
+            # Jump straight to the closing quote, skipping escaped ones.
+            while True:
+                position = parameterChunk.find('"', position)
 
-                  p = parameters[index]
+                if position == -1:
+                    position = len(parameterChunk)
+                    break
 
-                  if p.find("sin_addr") != -1:
-                     remoteip = p[p.find("\"")+1:p.rfind("\"")]
+                backslashes = 0
+                while parameterChunk[position-backslashes-1] == '\\':
+                    backslashes += 1
 
-                  elif p.find("sin_port") != -1:
-                     remoteport = int(p[p.find("(")+1:p.rfind(")")])
+                position += 1
 
-            if remoteip == -1:
-                remoteip = ''
+                if backslashes % 2 == 0:
+                    break
 
-            if remoteport == -1:
-                remoteport = 0
+        elif token == ", ":
+            if depth <= 0:
+                if match.start() > start or not parameters:
+                    parameters.append(parameterChunk[start:match.start()])
+                start = position
 
-            if DEBUG:
-                log(command, sockfd, all_message, remoteip, remoteport, flags, straceResult)
+        elif token in OPEN_BRACKETS:
+            depth += 1
 
-            if flags == UNIMPLEMENTED_ERROR:
+        else:
+            depth -= 1
 
-                if DEBUG:
-                    log("Unimplemented parameter, skipping...")
+        match = PARAMETER_TOKEN_RE.search(parameterChunk, position)
 
-            else:
-                TRACE.append(('recvmsg_syscall',(pid, sockfd, all_message, len_msg, remoteip, remoteport, flags), straceResult))
+    if start < len(parameterChunk) or not parameters:
+        parameters.append(parameterChunk[start:])
 
+    return parameters
 
-       ##### EG: SENDMSG #####
 
-        elif command == "sendmsg":
 
-            sockfd = int(parameters[0])
 
-            message = UNIMPLEMENTED_ERROR
-            all_message = ""
+def stripFdAnnotations(line, command):
+    """
+    Takes the strace -yy fd annotations (see FD_ANNOTATION_RE) out of a
+    trace line. Returns the line and the annotation of the first
+    argument, or None if it doesn't have one. Only the first argument and
+    the result are looked at, except for MULTIPLE_FD_COMMANDS, so
+    payloads are never touched.
+    """
 
-            if parameterChunk.find("msg_iov") != -1:
+    if command in MULTIPLE_FD_COMMANDS:
+        match = FD_ANNOTATION_RE.match(line, line.find('(') + 1)
+        return FD_ANNOTATION_RE.sub(r'\1', line), match and match.group(2)
 
-                if parameterChunk.find('[{') == -1 or parameterChunk.rfind('}],') == -1:
-                    continue
+    fdAnnotation = None
 
-                table = parameterChunk[parameterChunk.find('[{')+1:parameterChunk.rfind('}],')]
-                table = table.split('}, {')
+    # Results that are fds (socket, accept, dup, ...)
+    if line[-1] == '>':
+        match = FD_ANNOTATION_RE.match(line, line.rfind('= ') + 2)
+        if match is not None and match.end() == len(line):
+            line = line[:match.end(1)]
 
-                for index in range(len(table)):
+    match = FD_ANNOTATION_RE.match(line, line.find('(') + 1)
+    if match is not None:
+        fdAnnotation = match.group(2)
+        line = line[:match.end(1)] + line[match.end():]
 
-                    p = table[index]
-                    message = p[p.find("\"")+1:p.rfind("\"")]	
+    return line, fdAnnotation
 
-                    if message == "":
-                        continue
 
-                    len_msg = int(p.rsplit(', ', 1)[1])
-                    message += "*" * (len_msg - len(message))
-                    all_message += message
 
-            try:
-                flags = int(parameters[-1])
-            except:
-                flags = splitAndCombine(parameters[-1])
 
-            remoteip = UNIMPLEMENTED_ERROR
-            remoteport = UNIMPLEMENTED_ERROR
+def isSocketAnnotation(fdAnnotation):
+    """
+    Returns False if a strace -yy fd annotation is for a file, pipe or
+    anon_inode, and True otherwise.
+    """
 
-            if parameters[1].find('AF_INET6') != -1:
-               for index in range(1,len(parameters)-1, 1):
+    return not fdAnnotation.startswith('/') and \
+        fdAnnotation.split(':', 1)[0] not in NON_SOCKET_FD_TYPES
 
-                  p = parameters[index]
 
-                  if p.find("sin6_addr") != -1:
-                     # I don't know if the ip addr is always in the previous position
-                     pp = parameters[index-1]
-                     remoteip = pp[pp.find("\"")+1:pp.rfind("\"")]
 
-                  elif p.find("sin6_port") != -1:
-                     remoteport = int(p[p.find("(")+1:p.rfind(")")])
 
-            else:
-               for index in range(1,len(parameters)-1, 1):
+def parseFdAnnotation(fdAnnotation):
+    """
+    Splits a strace -yy socket annotation such as
+    'TCP:[10.0.0.1:45678->10.0.0.2:80]' or 'TCPv6:[[::1]:45678->[::1]:80]'
+    into (protocol, local, remote). local and remote are (ip, port), or
+    None if the annotation doesn't have them, e.g. 'TCP:[12345]' for a
+    socket that isn't bound or connected yet only gives its inode.
+    """
 
-                  p = parameters[index]
+    protocol, _, endpoints = fdAnnotation.partition(':')
+    local, arrow, remote = endpoints[1:-1].partition('->')
 
-                  if p.find("sin_addr") != -1:
-                     remoteip = p[p.find("\"")+1:p.rfind("\"")]
+    addresses = []
+    for endpoint in (local, remote):
+        ip, _, port = endpoint.rpartition(':')
+        if ip and port.isdigit():
+            addresses.append((ip.strip('[]'), int(port)))
+        else:
+            addresses.append(None)
 
-                  elif p.find("sin_port") != -1:
-                     remoteport = int(p[p.find("(")+1:p.rfind(")")])
+    return protocol, addresses[0], addresses[1]
 
-            if remoteip == -1:
-                remoteip = ''
 
-            if remoteport == -1:
-                remoteport = 0
 
-            if DEBUG:
-                log(command, sockfd, all_message, remoteip, remoteport, flags, straceResult)
 
-            if remoteip == UNIMPLEMENTED_ERROR or remoteport == UNIMPLEMENTED_ERROR or flags == UNIMPLEMENTED_ERROR:
+def decodePayload(parameter):
+    """
+    Returns a quoted payload argument without its quotes or the "..."
+    strace adds when it truncates one.
+    """
 
-                if DEBUG:
-                    log("Unimplemented parameter, skipping...")
+    if parameter.endswith("..."):
+        return parameter[1:len(parameter)-4]
 
-            else:
-                TRACE.append(('sendmsg_syscall',(pid, sockfd, all_message, remoteip, remoteport, flags), straceResult))
+    return parameter[1:len(parameter)-1]
 
 
-        ##### EG: DUP #####
 
-        elif command == "dup":
 
-            sockfd = int(parameters[0])
+def splitPayloadParameters(line, trailing):
+    """
+    Returns the arguments of a call whose second argument is its payload
+    and whose last trailing arguments can't contain ', ' (read, write,
+    send, recv), without scanning the payload. The fd and trailing
+    arguments are found from either end of the argument list and the
+    payload comes back as a LazyPayload. Lines that don't split that
+    way go through tokenizeParameters with the payload decoded.
+    """
 
-            if DEBUG:
-                log(command, sockfd, straceResult)
+    start = line.find('(') + 1
+    end = line.rfind(')', start, line.rfind('='))
+    payloadStart = line.find(', ', start, end)
+    payloadEnd = end
 
-            else:
-                TRACE.append(('dup_syscall',(pid, sockfd), straceResult))
+    for i in xrange(trailing):
+        payloadEnd = line.rfind(', ', payloadStart + 1, payloadEnd)
 
+    if payloadStart == -1 or payloadEnd == -1:
+        parameters = tokenizeParameters(getParameterChunk(line)[:-1])
 
-        ##### EG: DUP2 #####
+        if len(parameters) > 1:
+            parameters[1] = decodePayload(parameters[1])
 
-        elif command == "dup2":
+        return parameters
 
-            sockfd = int(parameters[0])
-            sockfd2 = int(parameters[1])
+    return ([line[start:payloadStart],
+             LazyPayload(line, payloadStart + 2, payloadEnd)] +
+            line[payloadEnd + 2:end].split(', ', trailing - 1))
 
-            if DEBUG:
-                log(command, sockfd, sockfd2, straceResult)
 
-            else:
-                TRACE.append(('dup2_syscall',(pid, sockfd, sockfd2), straceResult))
 
 
-        ##### FCNTL #####
+def materializePayload(syscall):
+    """
+    Returns syscall with a LazyPayload argument replaced by its string,
+    for code that stores or compares raw parser output.
+    """
 
-        elif command == "fcntl" or command == "fcntl64":
+    name, args, ret = syscall
 
-            fd = int(parameters[0])
+    if len(args) > 2 and type(args[2]) is LazyPayload:
+        materialized = (name, args[:2] + (str(args[2]),) + args[3:], ret)
 
-            try:
-                cmd = int(parameters[1])
-            except:
-                cmd = splitAndCombine(parameters[1])
+        if type(syscall) is AnnotatedSyscall:
+            return AnnotatedSyscall(materialized, syscall.timestamp,
+                                    syscall.duration, syscall.fdAnnotation)
 
-            if cmd == -1:
-                continue
+        return copyTiming(materialized, syscall)
 
-            if cmd != F_DUPFD and cmd != F_SETFD and cmd != F_SETFL:
-                continue
+    return syscall
 
-            if len(parameters) > 2:
 
-                try:
-                    args = int(parameters[2])
-                except:
-                    args = splitAndCombine(parameters[2])
 
-                if DEBUG:
-                    log(command, fd, cmd, args, straceResult)
 
-                if cmd == UNIMPLEMENTED_ERROR or args == UNIMPLEMENTED_ERROR:
+def parseSockaddr(sockaddr):
+    """
+    Returns the (ip, port) of an AF_INET or AF_INET6 sockaddr struct as
+    printed by strace. Either value is UNIMPLEMENTED_ERROR if it can't be
+    found, e.g. for AF_UNIX addresses or unprinted pointers.
+    """
 
-                    if DEBUG:
-                        log("Unimplemented parameter, skipping...")
+    family, ip, port = parseSockaddrStruct(sockaddr)
 
-                else:
-                    TRACE.append(('fcntl_syscall', (pid, fd, cmd, args), straceResult))
+    if family not in INET_FAMILIES:
+        return UNIMPLEMENTED_ERROR, UNIMPLEMENTED_ERROR
 
-                if args == -1:
-                    continue
+    return ip, port
 
-            else:
 
-                if DEBUG:
-                    log(command, fd, cmd, straceResult)
 
-                if cmd == UNIMPLEMENTED_ERROR:
 
-                    if DEBUG:
-                        log("Unimplemented parameter, skipping...")
+def parseSockaddrStruct(sockaddr):
+    """
+    Returns (family, ip, port) for a sockaddr struct as printed by strace,
+    remembering recently parsed structs (see SOCKADDR_CACHE). family is
+    'AF_INET', 'AF_INET6', 'AF_UNIX' or 'AF_NETLINK', or None if it isn't
+    one of those. AF_UNIX addresses give their path (starting with '@'
+    for abstract sockets) and a port of None, and AF_NETLINK addresses
+    give their nl_pid and nl_groups. Values that can't be found are
+    UNIMPLEMENTED_ERROR.
+    """
 
-                else:
-                    # POTENTIAL BUG: I have to put some kind of mode value for the fcntl syscall. For now it's 0.
-                    TRACE.append(('fcntl_syscall', (pid, fd, cmd), straceResult))
+    global SOCKADDR_CACHE, OLD_SOCKADDR_CACHE
 
+    try:
+        return SOCKADDR_CACHE[sockaddr]
+    except KeyError:
+        pass
 
-        ##### IOCTL #####
+    result = OLD_SOCKADDR_CACHE.get(sockaddr)
 
-        elif command == "ioctl":
+    if result is None:
+        result = parseUncachedSockaddr(sockaddr)
 
-            fd = int(parameters[0])
-            cmd = parameters[1]
+    if len(SOCKADDR_CACHE) >= MAX_SOCKADDRS:
+        OLD_SOCKADDR_CACHE = SOCKADDR_CACHE
+        SOCKADDR_CACHE = {}
 
-            if cmd == "FIONBIO":
-                val = int(parameters[2].strip("[]"))
+    SOCKADDR_CACHE[sockaddr] = result
+    return result
 
-                if DEBUG:
-                    log(command, fd, cmd, val, straceResult)
-                else:
-                    TRACE.append(('ioctl_syscall', (pid, fd, cmd, val), straceResult))
 
 
-        ##### SP: CLONE #####
 
-        elif command == "clone":
+def parseUncachedSockaddr(sockaddr):
+    """
+    Does the work of parseSockaddrStruct, without the cache.
+    """
 
-            try:
-                flags = int(parameters[1].strip("flags="))
-            except:
-                flags = splitAndCombine(parameters[1].strip("flags="))
+    ip = UNIMPLEMENTED_ERROR
+    port = UNIMPLEMENTED_ERROR
 
-            if DEBUG:
-                log(command, pid, straceResult)
+    if sockaddr.find('AF_UNIX') != -1 or sockaddr.find('AF_FILE') != -1 or \
+            sockaddr.find('AF_LOCAL') != -1:
+        pathStart = sockaddr.find('path=')
+        if pathStart != -1:
+            path = sockaddr[pathStart+5:sockaddr.rfind('}')]
+            if path.startswith('@'):
+                ip = '@' + path[1:].strip('"')
             else:
-                TRACE.append(('clone_syscall',(pid, flags), straceResult))
+                ip = path.strip('"')
 
+        return 'AF_UNIX', ip, None
 
-        ##### EG: SELECT #####
+    if sockaddr.find('AF_NETLINK') != -1:
+        pidStart = sockaddr.find('nl_pid=')
+        if pidStart != -1:
+            pidStart += len('nl_pid=')
+            pidEnd = sockaddr.find(',', pidStart)
+            ip = int(sockaddr[pidStart:pidEnd])
 
-        elif command == "select": 
+        groupsStart = sockaddr.find('nl_groups=')
+        if groupsStart != -1:
+            groupsStart += len('nl_groups=')
+            port = int(sockaddr[groupsStart:sockaddr.find('}', groupsStart)], 16)
 
-            # if no candidate fds
-            if parameters[0] == 0:
-                continue
+        return 'AF_NETLINK', ip, port
 
-            if parameters[1] == 'NULL':
-                readfds = []
-            else:
-                readfds = map(int, parameters[1].strip('\'[]').split())
+    if sockaddr.find('AF_INET6') != -1:
+        family = 'AF_INET6'
+        portPrefix = "sin6_port=htons("
 
-            if parameters[2] == 'NULL':
-                writefds = []
-            else:
-                writefds = map(int, parameters[2].strip('\'[]').split())
+        # The address is the quoted string inside inet_pton(...)
+        addrEnd = sockaddr.find("&sin6_addr")
+        if addrEnd != -1:
+            addrEnd = sockaddr.rfind("\"", 0, addrEnd)
+            ip = sockaddr[sockaddr.rfind("\"", 0, addrEnd)+1:addrEnd]
 
-            if parameters[3] == 'NULL':
-                errorfds = []
-            else:
-                errorfds = map(int, parameters[3].strip('\'[]').split())
+    else:
+        # Anything that isn't obviously another family is read as AF_INET.
+        family = 'AF_INET'
+        portPrefix = "sin_port=htons("
 
-            if parameters[4] == 'NULL':
-                timeout = ()
-            else:
-                timeout = (int(parameters[4].strip('{')), int(parameters[5].strip('}')))
+        addrStart = sockaddr.find("sin_addr=inet_addr(\"")
+        if addrStart != -1:
+            addrStart += len("sin_addr=inet_addr(\"")
+            ip = sockaddr[addrStart:sockaddr.find("\"", addrStart)]
 
-            result = line[line.rfind('=')+2:].split(' ', 1)[1].strip('()')
+    portStart = sockaddr.find(portPrefix)
+    if portStart != -1:
+        portStart += len(portPrefix)
+        port = int(sockaddr[portStart:sockaddr.find(")", portStart)])
 
-            r_in = []
-            r_out = []
+    if family == 'AF_INET' and sockaddr.find('AF_INET') == -1 and \
+            ip == UNIMPLEMENTED_ERROR and port == UNIMPLEMENTED_ERROR:
+        family = None
 
-            if result.find('[') != -1:
-                for subresult in result.split(', '):
-                    if subresult.startswith("in"):
-                        r_in = subresult[subresult.index('[')+1:subresult.index(']')].split()
+    return family, ip, port
 
-                    if subresult.startswith("out"):
-                        r_out = subresult[subresult.index('[')+1:subresult.index(']')].split()
 
 
-            if straceResult[1] == None:
-                if straceResult[0] == 0:
-                    straceResult = (straceResult[0], result)
-                else:
-                    straceResult = (map(int, r_in), map(int, r_out))
 
+def parseTimestamp(timestamp):
+    """
+    Converts a -t/-tt timestamp (HH:MM:SS[.usec]) to seconds since
+    midnight, or a -ttt timestamp (seconds.usec) to a float.
+    """
 
-            if DEBUG:
-                log(command, pid, readfds, writefds, errorfds, timeout, straceResult)
-            else:
-                TRACE.append(('select_syscall',(pid, readfds, writefds, errorfds, timeout), straceResult))
-
-
-        ##### EG: POLL #####
-
-        elif command == "poll":
-
-	    if line.rfind(')') == len(line) - 1:
-		parameterChunk = line[line.find('(')+1:line.find(')')].strip()
-		args = parameterChunk.split(", ")
-		results = line[line.find(')')+1:].strip().split(' ')
-		
-		timeout = int(args[-1])
-		nfds = int(args[-2])
-
-		args = args[0:-2]
-		results = results[2:]
-
-		# I only parse POLLIN, POLLOUT and POLLERR, it seems adequate for now
-		zipped_args = zip(args[0::2], args[1::2])
-		zipped_results = zip(results[0::2], results[1::2])
-
-		pollin = []
-		pollout = []
-		pollerr = []
-
-		for pair in zipped_args:
-
-		    fd = int(pair[0].strip('([{').split('=')[1])
-		    event = pair[1].strip('}])').split('=')[1]
-
-		    if event.find('POLLIN') != -1:
-			pollin.append(fd)
-		    if event.find('POLLOUT') != -1:
-			pollout.append(fd)
-		    if event.find('POLLERR') != -1:
-			pollerr.append(fd)
-		    elif event.find('POLLIN') == -1 and event.find('POLLOUT') == -1:
-			print "We don't handle this case!"
-
-		if straceResult[0] > 0:
-		    r_in = []
-		    r_out = []
-		    r_err = []
-
-		    for pair in zipped_results:
-
-			fd = int(pair[0].strip('([{,').split('=')[1])
-			event = pair[1].strip('}]),').split('=')[1]
-
-			if event.find('POLLIN') != -1:
-			    r_in.append(fd)
-			if event.find('POLLOUT') != -1:
-			    r_out.append(fd)
-			if event.find('POLLERR') != -1:
-			    r_err.append(fd)
-			elif event.find('POLLIN') == -1 and event.find('POLLOUT') == -1:
-			    print "We don't handle this case!"
-
-	    if straceResult[0] == 0:
-		result = line.split(']')[1].split('(')[1].strip(')')
-		straceResult = (straceResult[0], result)
-	    elif straceResult[0] == -1:
-		pass
-	    else:
-                try:
-		    straceResult = ((r_in, r_out, r_err), None)
-                except Exception:
-                    continue
+    if ':' not in timestamp:
+        return float(timestamp)
 
-            if DEBUG:
-                log(command, pid, fds, events, timeout, straceResult)
-            else:
-                TRACE.append(('poll_syscall',(pid, pollin, pollout, pollerr, timeout), straceResult))
-	    
+    hours, minutes, seconds = timestamp.split(':')
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
 
-        ##### NOT IMPLEMENTED #####
 
-        else:
-            if DEBUG:
-                log("Command " + command + " currently not supported. Skipping...")
 
-        if DEBUG:
-            log('\n')
 
-        if len(TRACE) >= 1:
-            return TRACE
+def copyTiming(syscall, timedSyscall):
+    """
+    Returns syscall with the timing of timedSyscall, if it has any.
+    """
 
+    if isinstance(timedSyscall, TimedSyscall) and \
+            (timedSyscall.timestamp is not None or
+             timedSyscall.duration is not None):
+        return TimedSyscall(syscall, timedSyscall.timestamp,
+                            timedSyscall.duration)
 
-    return TRACE
+    return syscall
 
 
 
 
-def merge(parameters, start, end):
+def addPendingStrace(pending):
 
-    for i in range(start, end - 1):
-        parameters[start] += ", " + parameters[start+1]
-        parameters.pop(start+1)
+    global lastPendingSweep
 
+    key = (pending.pid, pending.command)
 
+    if key not in pendingStraceTable:
+        pendingStraceTable[key] = deque()
 
+    queue = pendingStraceTable[key]
+    queue.append(pending)
 
-def mergeQuoteParameters(parameters):
+    if len(queue) > PENDING_STRACE_LIMIT:
+        queue.popleft()
+        parseCounters.orphanedUnfinished += 1
 
-    removeEmptyParameters(parameters)
+    if pending.lineNumber - lastPendingSweep >= PENDING_STRACE_SWEEP_INTERVAL:
+        lastPendingSweep = pending.lineNumber
+        evictStalePendingStraces(pending.lineNumber - PENDING_STRACE_MAX_AGE)
 
-    if len(parameters) <= 1:
-        return
 
-    index = 0
 
-    while index < len(parameters):
-        if  parameters[index][0] == "\"":
 
-            while index+1 < len(parameters):
-                if endsInUnescapedQuote(parameters[index].strip(".")):
-                    break
+def findPendingStrace(pid, command):
+    """
+    Removes and returns the oldest pending strace for this pid and
+    command, or None if there isn't one.
+    """
 
-                parameters[index] += ", " + parameters[index+1]
-                parameters.pop(index+1)
+    queue = pendingStraceTable.get((pid, command))
 
-        index += 1
+    if not queue:
+        return None
 
+    pending = queue.popleft()
 
+    if not queue:
+        del pendingStraceTable[(pid, command)]
 
+    return pending
 
-def endsInUnescapedQuote(string):
 
-    if not string or string[-1] != '"':
-        return False
 
-    for index in xrange(-2, -len(string)-1, -1):
-        if string[index] != '\\':
-            return index % 2 == 0
 
-    return False
+def evictStalePendingStraces(oldestLineNumber):
+    """
+    Drops every pending strace that started before oldestLineNumber and
+    counts it as orphaned.
+    """
 
+    for key in pendingStraceTable.keys():
+        queue = pendingStraceTable[key]
 
+        while queue and queue[0].lineNumber < oldestLineNumber:
+            queue.popleft()
+            parseCounters.orphanedUnfinished += 1
 
+        if not queue:
+            del pendingStraceTable[key]
 
-def removeEmptyParameters(parameters):
 
-    for i in range(-1, -len(parameters), -1):
-        if len(parameters[i]) == 0:
-            parameters.pop(i)
 
 
+##### SOCKET #####
 
+def parseSocket(pid, parameters, straceResult, line):
 
-def findPendingStrace(table, pid, command):
+    try:
+        domain = int(parameters[0])
+    except:
+        domain = splitAndCombine(parameters[0])
 
-    for index in range(0, len(table), 1):
-        if table[index].pid == pid and table[index].command == command:
-            return index
+    try:
+        socktype = int(parameters[1])
+    except:
+        socktype = splitAndCombine(parameters[1])
 
+    try:
+        protocol = int(parameters[2])
+    except:
+        protocol = splitAndCombine(parameters[2])
 
+    if DEBUG:
+        log("socket", domain, socktype, protocol, straceResult, '\n')
 
+    if domain == UNIMPLEMENTED_ERROR or socktype == UNIMPLEMENTED_ERROR or protocol == UNIMPLEMENTED_ERROR:
 
-def splitAndCombine(string):
+        if DEBUG:
+            log("Unimplemented parameter, skipping...\n")
 
-    result = 0
-    stringParts = string.split("|")
+    else:
+        return ('socket_syscall', (pid, domain, socktype, protocol), straceResult)
 
-    for param in stringParts:
 
-        try:
-            paramValue = convert(param)
-        except:
-            pass
 
-        if paramValue == UNIMPLEMENTED_ERROR:
-            return UNIMPLEMENTED_ERROR
 
-        result |= paramValue
+##### BIND #####
 
-    return result
+def parseBind(pid, parameters, straceResult, line):
 
+    sockfd = int(parameters[0])
 
+    localip, localport = parseSockaddr(parameters[1])
 
+    if DEBUG:
+        log("bind", sockfd, localip, localport, straceResult, '\n')
 
-def convert(string):
+    if localip == UNIMPLEMENTED_ERROR or localport == UNIMPLEMENTED_ERROR:
+
+        if DEBUG:
+            log("Unimplemented parameter, skipping...\n")
+
+    else:
+        return ('bind_syscall',(pid, sockfd, localip, localport), straceResult)
 
-    if string == "MSG_CMSG_CLOEXEC":
-        return FD_CLOEXEC
 
-    elif string == "MSG_DONTWAIT":
-        return O_NONBLOCK
 
-    elif string == "FD_CLOEXEC":
-        return FD_CLOEXEC
 
-#    elif string == "MSG_ERRQUEUE":
-#        return MSG_ERRQUEUE
+##### CONNECT #####
 
-#    elif string == "IP_RECVERR":
-#        return MSG_OOB
+def parseConnect(pid, parameters, straceResult, line):
 
-#    elif string == "MSG_PEEK":
-#        return MSG_PEEK
+    sockfd = int(parameters[0])
 
-#    elif string == "MSG_TRUNC":
-#        return MSG_TRUNC
+    remoteip, remoteport = parseSockaddr(parameters[1])
 
-#    elif string == "MSG_WAITALL":
-#        return MSG_WAITALL
+    if DEBUG:
+        log("connect", sockfd, remoteip, remoteport, straceResult)
 
-    # For CLONE:
+    if remoteip == UNIMPLEMENTED_ERROR or remoteport == UNIMPLEMENTED_ERROR:
+
+        if DEBUG:
+            log("Unimplemented parameter, skipping...")
+
+    else:
+        return ('connect_syscall',(pid, sockfd, remoteip, remoteport), straceResult)
 
-    elif string == "CLONE_CHILD_CLEARTID":
-        return CLONE_CHILD_CLEARTID
 
-    elif string == "CLONE_CHILD_SETTID":
-        return CLONE_CHILD_SETTID
 
-    elif string == "SIGCHLD":
-        return SIGCHLD
 
-    elif string == "CLONE_FILES":
-        return CLONE_FILES
+# BUG: If message is larger than a certain length then strace will cut it off with '...' which could cause a false failure in comparison
 
-    elif string == "CLONE_FS":
-        return CLONE_FS
+##### SENDTO #####
 
-    elif string == "CLONE_VM":
-        return CLONE_VM
+def parseSendto(pid, parameters, straceResult, line):
 
-    elif string == "CLONE_SIGHAND":
-        return CLONE_SIGHAND
+    sockfd = int(parameters[0])
 
-    elif string == "CLONE_PTRACE":
-        return CLONE_PTRACE
+    # Get the message without quotes
 
-    elif string == "CLONE_VFORK":
-        return CLONE_VFORK
+    if parameters[1].endswith("..."):
+        message = parameters[1][1:len(parameters[1])-4]
+    else:
+        message = parameters[1][1:len(parameters[1])-1]
 
-    elif string == "CLONE_PARENT":
-        return CLONE_PARENT
+    #message += "*" * (int(parameters[2]) - len(message))
 
-    elif string == "CLONE_THREAD":
-        return CLONE_THREAD
+    try:
+        flags = int(parameters[3])
+    except:
+        flags = splitAndCombine(parameters[3])
 
-    elif string == "CLONE_NEWNS":
-        return CLONE_NEWNS
+    if parameters[4] == "NULL":
+        remoteip = ''
+        remoteport = 0
 
-    elif string == "CLONE_SYSVSEM":
-        return CLONE_SYSVSEM
+    else:
+        remoteip, remoteport = parseSockaddr(parameters[4])
 
-    elif string == "CLONE_SETTLS":
-        return CLONE_SETTLS
+    if DEBUG:
+        log("sendto", sockfd, message, flags, remoteip, remoteport, straceResult)
 
-    elif string == "CLONE_PARENT_SETTID":
-        return CLONE_PARENT_SETTID
+    if remoteip == UNIMPLEMENTED_ERROR or remoteport == UNIMPLEMENTED_ERROR or flags == UNIMPLEMENTED_ERROR:
 
-    elif string == "CLONE_DETACHED":
-        return CLONE_DETACHED
+        if DEBUG:
+            log("Unimplemented parameter, skipping...")
 
-    elif string == "CLONE_UNTRACED":
-        return CLONE_UNTRACED
+    else:
+        return ('sendto_syscall',(pid, sockfd, message, flags, remoteip, remoteport), straceResult)
 
-    elif string == "CLONE_NEWUTS":
-        return CLONE_NEWUTS
 
-    elif string == "CLONE_NEWIPC":
-        return CLONE_NEWIPC
 
-    elif string == "CLONE_NEWUSER":
-        return CLONE_NEWUSER
 
-    elif string == "CLONE_NEWPID":
-        return CLONE_NEWPID
+##### SEND #####
 
-    elif string == "CLONE_NEWNET":
-        return CLONE_NEWNET
+def parseSend(pid, parameters, straceResult, line):
 
-    elif string == "CLONE_IO":
-        return CLONE_IO
+    parameters = splitPayloadParameters(line, 2)
 
-    ####
+    sockfd = int(parameters[0])
 
-    elif string == "SOCK_STREAM":
-        return SOCK_STREAM
+    # The message without quotes, decoded when it's first used
+    message = parameters[1]
 
-    elif string == "SOCK_DGRAM":
-        return SOCK_DGRAM
+    #message += "*" * (int(parameters[2]) - len(message))
 
-    elif string == "SOCK_RAW":
-        return SOCK_RAW
+    try:
+        flags = int(parameters[-1])
+    except:
+        flags = splitAndCombine(parameters[-1])
 
-    elif string == "SOCK_RDM":
-        return SOCK_RDM
+    if DEBUG:
+        log("send", sockfd, message, flags, straceResult)
 
-    elif string == "SOCK_SEQPACKET":
-        return SOCK_SEQPACKET
+    if flags == UNIMPLEMENTED_ERROR:
 
-    elif string == "AF_UNSPEC":
-        return AF_UNSPEC
+        if DEBUG:
+            log("Unimplemented parameter, skipping...")
 
-    elif string == "AF_UNIX":
-        return AF_UNIX
+    else:
+        return ('send_syscall',(pid, sockfd, message, flags), straceResult)
 
-    elif string == "AF_LOCAL":
-        return AF_LOCAL
 
-    elif string == "PF_FILE":
-        return PF_FILE
 
-    elif string == "AF_INET":
-        return AF_INET
 
-    elif string == "AF_IMPLINK":
-        return AF_IMPLINK
+##### EG: WRITE #####
 
-    elif string == "AF_PUP":
-        return AF_PUP
+def parseWrite(pid, parameters, straceResult, line):
 
-    elif string == "AF_CHAOS":
-        return AF_CHAOS
+    parameters = splitPayloadParameters(line, 1)
 
-    elif string == "AF_NS":
-        return AF_NS
+    sockfd = int(parameters[0])
 
-    elif string == "AF_ISO":
-        return AF_ISO
+    # The message without quotes, decoded when it's first used
+    message = parameters[1]
 
-    elif string == "AF_OSI":
-        return AF_OSI
+    #message += "*" * (int(parameters[2]) - len(message))
 
-    elif string == "AF_ECMA":
-        return AF_ECMA
+    if DEBUG:
+        log("write", sockfd, message, straceResult)
 
-    elif string == "AF_DATAKIT":
-        return AF_DATAKIT
 
-    elif string == "AF_CCITT":
-        return AF_CCITT
+    return ('write_syscall',(pid, sockfd, message), straceResult)
 
-    elif string == "AF_SNA":
-        return AF_SNA
 
-    elif string == "AF_DECnet":
-        return AF_DECnet
 
-    elif string == "AF_DLI":
-        return AF_DLI
 
-    elif string == "AF_LAT":
-        return AF_LAT
+##### EG: WRITEV #####
 
-    elif string == "AF_HYLINK":
-        return AF_HYLINK
+def parseWritev(pid, parameters, straceResult, line):
 
-    elif string == "AF_APPLETALK":
-        return AF_APPLETALK
+    sockfd = int(parameters[0])
 
-    elif string == "AF_ROUTE":
-        return AF_ROUTE
+    parameterChunk = getParameterChunk(line)[:-1]
+    paratmp = parameterChunk.split(',', 1)
+    paratmp2 = paratmp[1].rsplit(',', 1)
 
-    elif string == "AF_LINK":
-        return AF_LINK
+    parameters = []
+    parameters.insert(0, paratmp[0])
+    parameters.insert(1, paratmp2[0])
+    parameters.insert(2, paratmp2[1])
 
-    elif string == "pseudo_AF_XTP":
-        return pseudo_AF_XTP
+    iocount = int(parameters[2])
+    ioi = 0
+    rs = parameters[1].split('},')
+    message = ""
 
-    elif string == "AF_COIP":
-        return AF_COIP
+    # we concatanate all the messages together
+    # this is what the receiver will see
+    # stupid and sloppy string operations! there may be a smarter way to do it!
 
-    elif string == "AF_CNT":
-        return AF_CNT
+    while ioi < iocount:
 
-    elif string == "pseudo_AF_RTIP":
-        return pseudo_AF_RTIP
+        if ioi == 0:
+            rs[ioi] = rs[ioi].replace('[', '', 1)
 
-    elif string == "AF_IPX":
-        return AF_IPX
+        if ioi == iocount-1:
+            if rs[ioi][len(rs[ioi])-1] == ']':
+                rs[ioi] = rs[ioi][:-1]
 
-    elif string == "AF_SIP":
-        return AF_SIP
+        rs[ioi] = rs[ioi].strip().replace('{', '', 1)
 
-    elif string == "pseudo_AF_PIP":
-        return pseudo_AF_PIP
+        if rs[ioi][len(rs[ioi])-1] == '}':
+            rs[ioi] = rs[ioi][:-1]
 
-    elif string == "pseudo_AF_BLUE":
-        return pseudo_AF_BLUE
+        table = rs[ioi].rsplit(',', 1)
 
-    elif string == "AF_NDRV":
-        return AF_NDRV
+        if table[0] == 'NULL' or table[0] == "":
+            message += table[0]
 
-    elif string == "AF_ISDN":
-        return AF_ISDN
+        else:
+            # Get the message without quotes
 
-    elif string == "AF_E164":
-        return AF_E164
+            if table[0].rfind("...") != -1:
+                partmessage = table[0].strip("...")[1:len(table[0])-4]
+            else:
+                partmessage = table[0][1:len(table[0])-1]
 
-    elif string == "pseudo_AF_KEY":
-        return pseudo_AF_KEY
+            message += partmessage
+            #message += "*" * (int(table[1]) - len(message))
 
-    elif string == "AF_INET6":
-        return AF_INET6
+        ioi += 1
 
-    elif string == "AF_NATM":
-        return AF_NATM
+    if DEBUG:
+        log("writev", sockfd, message, iocount, straceResult)
 
-    elif string == "AF_SYSTEM":
-        return AF_SYSTEM
 
-    elif string == "AF_NETBIOS":
-        return AF_NETBIOS
+    return ('writev_syscall',(pid, sockfd, message, iocount), straceResult)
 
-    elif string == "AF_PPP":
-        return AF_PPP
 
-    elif string == "pseudo_AF_HDRCMPLT":
-        return pseudo_AF_HDRCMPLT
 
-    elif string == "AF_RESERVED_36":
-        return AF_RESERVED_36
 
-    elif string == "AF_IEEE80211":
-        return AF_IEEE80211
+##### EG: SENDFILE #####
 
-    elif string == "AF_MAX":
-        return AF_MAX
+def parseSendfile(pid, parameters, straceResult, line):
 
-    elif string == "IPPROTO_IP":
-        return IPPROTO_IP
+    sockfd = int(parameters[0])
 
-    elif string == "IPPROTO_ICMP":
-        return IPPROTO_ICMP
+    in_fd = int(parameters[1])
 
-    elif string == "IPPROTO_IGMP":
-        return IPPROTO_IGMP
+    if parameters[2] == "NULL":
+        offset = 0
+    else:
+        offset = int(parameters[2].replace('[', '').replace(']', ''))
 
-    elif string == "IPPROTO_GGP":
-        return IPPROTO_GGP
+    count = int(parameters[3])
 
-    elif string == "IPPROTO_IPV4":
-        return IPPROTO_IPV4
+    if DEBUG:
+        log("sendfile", sockfd, in_fd, offset, count, straceResult)
 
-    elif string == "IPPROTO_IPIP":
-        return IPPROTO_IPIP
 
-    elif string == "IPPROTO_TCP":
-        return IPPROTO_TCP
+    return ('sendfile_syscall',(pid, sockfd, in_fd, offset, count), straceResult)
 
-    elif string == "IPPROTO_ST":
-        return IPPROTO_ST
 
-    elif string == "IPPROTO_EGP":
-        return IPPROTO_EGP
 
-    elif string == "IPPROTO_PIGP":
-        return IPPROTO_PIGP
 
-    elif string == "IPPROTO_RCCMON":
-        return IPPROTO_RCCMON
+##### EG: READ #####
 
-    elif string == "IPPROTO_NVPII":
-        return IPPROTO_NVPII
+def parseRead(pid, parameters, straceResult, line):
 
-    elif string == "IPPROTO_PUP":
-        return IPPROTO_PUP
+    parameters = splitPayloadParameters(line, 1)
 
-    elif string == "IPPROTO_ARGUS":
-        return IPPROTO_ARGUS
+    sockfd = int(parameters[0])
 
-    elif string == "IPPROTO_EMCON":
-        return IPPROTO_EMCON
+    if straceResult[0] == -1:
+        message = None
+    # The message without quotes, decoded when it's first used
+    else:
+        message = parameters[1]
 
-    elif string == "IPPROTO_XNET":
-        return IPPROTO_XNET
+    length = int(parameters[2])
 
-    elif string == "IPPROTO_CHAOS":
-        return IPPROTO_CHAOS
+    if DEBUG:
+        log("read", sockfd, message, length, straceResult)
 
-    elif string == "IPPROTO_UDP":
-        return IPPROTO_UDP
 
-    elif string == "IPPROTO_MUX":
-        return IPPROTO_MUX
+    return ('read_syscall',(pid, sockfd, message, length), straceResult)
 
-    elif string == "IPPROTO_MEAS":
-        return IPPROTO_MEAS
 
-    elif string == "IPPROTO_HMP":
-        return IPPROTO_HMP
 
-    elif string == "IPPROTO_PRM":
-        return IPPROTO_PRM
 
-    elif string == "IPPROTO_IDP":
-        return IPPROTO_IDP
+##### RECVFROM #####
 
-    elif string == "IPPROTO_TRUNK1":
-        return IPPROTO_TRUNK1
+def parseRecvfrom(pid, parameters, straceResult, line):
 
-    elif string == "IPPROTO_TRUNK2":
-        return IPPROTO_TRUNK2
+    sockfd = int(parameters[0])
 
-    elif string == "IPPROTO_LEAF1":
-        return IPPROTO_LEAF1
+    if straceResult[0] == -1:
+        message = None
+    # Get the message without quotes
+    elif parameters[1].endswith("..."):
+        message = parameters[1][1:len(parameters[1])-4]
+    else:
+        message = parameters[1][1:len(parameters[1])-1]
 
-    elif string == "IPPROTO_LEAF2":
-        return IPPROTO_LEAF2
+    length = int(parameters[2])
 
-    elif string == "IPPROTO_RDP":
-        return IPPROTO_RDP
+    try:
+        flags = int(parameters[3])
+    except:
+        flags = splitAndCombine(parameters[3])
 
-    elif string == "IPPROTO_IRTP":
-        return IPPROTO_IRTP
+    if parameters[4] == "NULL":
+        remoteip = ''
+        remoteport = 0
 
-    elif string == "IPPROTO_TP":
-        return IPPROTO_TP
+    else:
+        remoteip, remoteport = parseSockaddr(parameters[4])
 
-    elif string == "IPPROTO_BLT":
-        return IPPROTO_BLT
+    if DEBUG:
+        log("recvfrom", sockfd, message, remoteip, remoteport, flags, straceResult)
 
-    elif string == "IPPROTO_NSP":
-        return IPPROTO_NSP
+    if remoteip == UNIMPLEMENTED_ERROR or remoteport == UNIMPLEMENTED_ERROR or flags == UNIMPLEMENTED_ERROR:
 
-    elif string == "IPPROTO_INP":
-        return IPPROTO_INP
+        if DEBUG:
+            log("Unimplemented parameter, skipping...")
 
-    elif string == "IPPROTO_SEP":
-        return IPPROTO_SEP
+    else:
+        return ('recvfrom_syscall',(pid, sockfd, message, length, flags, remoteip, remoteport), straceResult)
 
-    elif string == "IPPROTO_3PC":
-        return IPPROTO_3PC
 
-    elif string == "IPPROTO_IDPR":
-        return IPPROTO_IDPR
 
-    elif string == "IPPROTO_XTP":
-        return IPPROTO_XTP
 
-    elif string == "IPPROTO_DDP":
-        return IPPROTO_DDP
+##### RECV #####
 
-    elif string == "IPPROTO_CMTP":
-        return IPPROTO_CMTP
+def parseRecv(pid, parameters, straceResult, line):
 
-    elif string == "IPPROTO_TPXX":
-        return IPPROTO_TPXX
+    parameters = splitPayloadParameters(line, 2)
 
-    elif string == "IPPROTO_IL":
-        return IPPROTO_IL
+    sockfd = int(parameters[0])
 
-    elif string == "IPPROTO_IPV6":
-        return IPPROTO_IPV6
+    if straceResult[0] == -1:
+        message = None
+    # The message without quotes, decoded when it's first used
+    else:
+        message = parameters[1]
 
-    elif string == "IPPROTO_SDRP":
-        return IPPROTO_SDRP
+    length = int(parameters[-2])
 
-    elif string == "IPPROTO_ROUTING":
-        return IPPROTO_ROUTING
+    try:
+        flags = int(parameters[-1])
+    except:
+        flags = splitAndCombine(parameters[-1])
 
-    elif string == "IPPROTO_FRAGMENT":
-        return IPPROTO_FRAGMENT
+    if DEBUG:
+        log("recv", sockfd, length, flags, straceResult)
 
-    elif string == "IPPROTO_IDRP":
-        return IPPROTO_IDRP
+    if flags == UNIMPLEMENTED_ERROR:
 
-    elif string == "IPPROTO_RSVP":
-        return IPPROTO_RSVP
+        if DEBUG:
+            log("Unimplemented parameter, skipping...")
 
-    elif string == "IPPROTO_GRE":
-        return IPPROTO_GRE
+    else:
+        return ('recv_syscall',(pid, sockfd, message, length, flags), straceResult)
 
-    elif string == "IPPROTO_MHRP":
-        return IPPROTO_MHRP
 
-    elif string == "IPPROTO_BHA":
-        return IPPROTO_BHA
 
-    elif string == "IPPROTO_ESP":
-        return IPPROTO_ESP
 
-    elif string == "IPPROTO_AH":
-        return IPPROTO_AH
+##### GETSOCKNAME #####
 
-    elif string == "IPPROTO_INLSP":
-        return IPPROTO_INLSP
+def parseGetsockname(pid, parameters, straceResult, line):
 
-    elif string == "IPPROTO_SWIPE":
-        return IPPROTO_SWIPE
+    sockfd = int(parameters[0])
 
-    elif string == "IPPROTO_NHRP":
-        return IPPROTO_NHRP
+    localip, localport = parseSockaddr(parameters[1])
 
-    elif string == "IPPROTO_ICMPV6":
-        return IPPROTO_ICMPV6
+    if DEBUG:
+        log("getsockname", sockfd, localip, localport, straceResult)
 
-    elif string == "IPPROTO_NONE":
-        return IPPROTO_NONE
+    if localip == UNIMPLEMENTED_ERROR or localport == UNIMPLEMENTED_ERROR:
 
-    elif string == "IPPROTO_DSTOPTS":
-        return IPPROTO_DSTOPTS
+        if DEBUG:
+            log("Unimplemented parameter, skipping...")
 
-    elif string == "IPPROTO_AHIP":
-        return IPPROTO_AHIP
+    else:
+        straceResult = ((localip, localport),) + straceResult[1:]
+        return ('getsockname_syscall',(pid, sockfd), straceResult)
 
-    elif string == "IPPROTO_CFTP":
-        return IPPROTO_CFTP
 
-    elif string == "IPPROTO_HELLO":
-        return IPPROTO_HELLO
 
-    elif string == "IPPROTO_SATEXPAK":
-        return IPPROTO_SATEXPAK
 
-    elif string == "IPPROTO_KRYPTOLAN":
-        return IPPROTO_KRYPTOLAN
+##### GETPEERNAME #####
 
-    elif string == "IPPROTO_RVD":
-        return IPPROTO_RVD
+def parseGetpeername(pid, parameters, straceResult, line):
 
-    elif string == "IPPROTO_IPPC":
-        return IPPROTO_IPPC
+    sockfd = int(parameters[0])
 
-    elif string == "IPPROTO_ADFS":
-        return IPPROTO_ADFS
+    remoteip, remoteport = parseSockaddr(parameters[1])
 
-    elif string == "IPPROTO_SATMON":
-        return IPPROTO_SATMON
+    if DEBUG:
+        log("getpeername", sockfd, remoteip, remoteport, straceResult)
 
-    elif string == "IPPROTO_VISA":
-        return IPPROTO_VISA
+    if remoteip == UNIMPLEMENTED_ERROR or remoteport == UNIMPLEMENTED_ERROR:
 
-    elif string == "IPPROTO_IPCV":
-        return IPPROTO_IPCV
+        if DEBUG:
+            log("Unimplemented parameter, skipping...")
 
-    elif string == "IPPROTO_CPNX":
-        return IPPROTO_CPNX
+    else:
+        straceResult = ((remoteip,remoteport),) + straceResult[1:]
+        return ('getpeername_syscall',(pid, sockfd), straceResult)
 
-    elif string == "IPPROTO_CPHB":
-        return IPPROTO_CPHB
 
-    elif string == "IPPROTO_WSN":
-        return IPPROTO_WSN
 
-    elif string == "IPPROTO_PVP":
-        return IPPROTO_PVP
 
-    elif string == "IPPROTO_BRSATMON":
-        return IPPROTO_BRSATMON
+##### LISTEN  #####
 
-    elif string == "IPPROTO_ND":
-        return IPPROTO_ND
+def parseListen(pid, parameters, straceResult, line):
 
-    elif string == "IPPROTO_WBMON":
-        return IPPROTO_WBMON
+    sockfd = int(parameters[0])
 
-    elif string == "IPPROTO_WBEXPAK":
-        return IPPROTO_WBEXPAK
+    try:
+        backlog = int(parameters[1])
+    except:
+        backlog = splitAndCombine(parameters[1])
 
-    elif string == "IPPROTO_EON":
-        return IPPROTO_EON
+    if DEBUG:
+        log("listen", sockfd, backlog, straceResult)
 
-    elif string == "IPPROTO_VMTP":
-        return IPPROTO_VMTP
+    return ('listen_syscall',(pid, sockfd, backlog), straceResult)
 
-    elif string == "IPPROTO_SVMTP":
-        return IPPROTO_SVMTP
 
 
 
-    elif string == "IPPROTO_VINES":
-        return IPPROTO_VINES
+##### ACCEPT #####
 
-    elif string == "IPPROTO_TTP":
-        return IPPROTO_TTP
+# TODO: change it to parse accept4 syscall
 
-    elif string == "IPPROTO_IGP":
-        return IPPROTO_IGP
+def parseAccept(pid, parameters, straceResult, line):
 
-    elif string == "IPPROTO_DGP":
-        return IPPROTO_DGP
+    sockfd = int(parameters[0])
 
-    elif string == "IPPROTO_TCF":
-        return IPPROTO_TCF
+    remoteip, remoteport = parseSockaddr(parameters[1])
 
-    elif string == "IPPROTO_IGRP":
-        return IPPROTO_IGRP
+    if DEBUG:
+        log("accept", sockfd, remoteip, remoteport, straceResult)
 
-    elif string == "IPPROTO_OSPFIGP":
-        return IPPROTO_OSPFIGP
+    if remoteip == UNIMPLEMENTED_ERROR or remoteport == UNIMPLEMENTED_ERROR:
 
-    elif string == "IPPROTO_SRPC":
-        return IPPROTO_SRPC
+        if DEBUG:
+            log("Unimplemented parameter, skipping...")
 
-    elif string == "IPPROTO_LARP":
-        return IPPROTO_LARP
+    else:
+        return ('accept_syscall',(pid, sockfd,remoteip,remoteport), straceResult)
 
-    elif string == "IPPROTO_MTP":
-        return IPPROTO_MTP
 
-    elif string == "IPPROTO_AX25":
-        return IPPROTO_AX25
 
-    elif string == "IPPROTO_IPEIP":
-        return IPPROTO_IPEIP
 
-    elif string == "IPPROTO_MICP":
-        return IPPROTO_MICP
+##### GETSOCKOPT #####
 
-    elif string == "IPPROTO_SCCSP":
-        return IPPROTO_SCCSP
+def parseGetsockopt(pid, parameters, straceResult, line):
 
-    elif string == "IPPROTO_ETHERIP":
-        return IPPROTO_ETHERIP
+    sockfd = int(parameters[0])
 
-    elif string == "IPPROTO_ENCAP":
-        return IPPROTO_ENCAP
+    try:
+        level = int(parameters[1])
+    except:
+        level = splitAndCombine(parameters[1])
 
-    elif string == "IPPROTO_APES":
-        return IPPROTO_APES
+    try:
+        optname = int(parameters[2])
+    except:
+        optname = splitAndCombine(parameters[2])
 
-    elif string == "IPPROTO_GMTP":
-        return IPPROTO_GMTP
+    # TODO: handle opt_val correctly!!
 
-    elif string == "IPPROTO_PIM":
-        return IPPROTO_PIM
+    try:
+        if optname == SO_RCVTIMEO or optname == IP_ADD_MEMBERSHIP:
+            optval = parameters[3].strip('\"')
 
-    elif string == "IPPROTO_IPCOMP":
-        return IPPROTO_IPCOMP
+        else:
+            try:
+                optval = int(parameters[3].strip("[]"))
 
-    elif string == "IPPROTO_PGM":
-        return IPPROTO_PGM
+            except:
+                optval = splitAndCombine(parameters[3])
 
-    elif string == "IPPROTO_SCTP":
-        return IPPROTO_SCTP
+        result = (optval, None)
 
-    elif string == "IPPROTO_DIVERT":
-        return IPPROTO_DIVERT
+    except:
+        result = straceResult
 
-    elif string == "IPPROTO_RAW":
-        return IPPROTO_RAW
+    if DEBUG:
+        log("getsockopt", sockfd, level, optname, result)
 
-    elif string == "IPPROTO_MAX":
-        return IPPROTO_MAX
+    if level == UNIMPLEMENTED_ERROR or optname == UNIMPLEMENTED_ERROR:
 
-    elif string == "IPPROTO_DONE":
-        return IPPROTO_DONE
+        if DEBUG:
+            log("Unimplemented parameter, skipping...")
 
-    elif string == "PF_UNSPEC":
-        return PF_UNSPEC
+    else:
+        return ('getsockopt_syscall',(pid, sockfd, level, optname), result)
 
-    elif string == "PF_LOCAL":
-        return PF_LOCAL
 
-    elif string == "PF_UNIX":
-        return PF_UNIX
 
-    elif string == "PF_FILE":
-        return PF_FILE
 
-    elif string == "PF_INET":
-        return PF_INET
+##### SETSOCKOPT #####
 
-    elif string == "PF_IMPLINK":
-        return PF_IMPLINK
+def parseSetsockopt(pid, parameters, straceResult, line):
 
-    elif string == "PF_PUP":
-        return PF_PUP
+    sockfd = int(parameters[0])
 
-    elif string == "PF_CHAOS":
-        return PF_CHAOS
+    try:
+        level = int(parameters[1])
+    except:
+        level = splitAndCombine(parameters[1])
 
-    elif string == "PF_NS":
-        return PF_NS
+    try:
+        optname = int(parameters[2])
+    except:
+        optname = splitAndCombine(parameters[2])
 
-    elif string == "PF_ISO":
-        return PF_ISO
+    if optname == SO_RCVTIMEO or optname == IP_ADD_MEMBERSHIP:
+        optval = parameters[3].strip('\"')
 
-    elif string == "PF_OSI":
-        return PF_OSI
+    elif optname == SO_LINGER:
+        lingerStruct = tokenizeParameters(parameters[3][1:-1])
+        onoff = lingerStruct[0][lingerStruct[0].find('=')+1:]
+        linger = lingerStruct[1][lingerStruct[1].rfind('=')+1:]
+        optval = (int(onoff), int(linger))
 
-    elif string == "PF_ECMA":
-        return PF_ECMA
+    else:
+        try:
+            optval = int(parameters[3].strip("[]"))
+        except:
+            optval = splitAndCombine(parameters[3])
 
-    elif string == "PF_DATAKIT":
-        return PF_DATAKIT
+    if DEBUG:
+        log("setsockopt", sockfd, level, optname, optval, straceResult)
 
-    elif string == "PF_CCITT":
-        return PF_CCITT
+    if level == UNIMPLEMENTED_ERROR or optname == UNIMPLEMENTED_ERROR:
 
-    elif string == "PF_SNA":
-        return PF_SNA
+        if DEBUG:
+            log("Unimplemented parameter, skipping...")
 
-    elif string == "PF_DECnet":
-        return PF_DECnet
+    else:
+        return ('setsockopt_syscall',(pid, sockfd, level, optname, optval), straceResult)
 
-    elif string == "PF_DLI":
-        return PF_DLI
 
-    elif string == "PF_LAT":
-        return PF_LAT
 
-    elif string == "PF_HYLINK":
-        return PF_HYLINK
 
-    elif string == "PF_APPLETALK":
-        return PF_APPLETALK
+##### SHUTDOWN #####
 
-    elif string == "PF_ROUTE":
-        return PF_ROUTE
+def parseShutdown(pid, parameters, straceResult, line):
 
-    elif string == "PF_LINK":
-        return PF_LINK
+    sockfd = int(parameters[0])
 
-    elif string == "PF_XTP":
-        return PF_XTP
+    if " " in parameters[1]:
+        parameters[1] = parameters[1][:parameters[1].find(" ")]
 
-    elif string == "PF_COIP":
-        return PF_COIP
+    try:
+        how = int(parameters[1])
+    except:
+        how = splitAndCombine(parameters[1])
 
-    elif string == "PF_CNT":
-        return PF_CNT
+    if DEBUG:
+        log("shutdown", sockfd, how, straceResult)
 
-    elif string == "PF_SIP":
-        return PF_SIP
+    if how == UNIMPLEMENTED_ERROR:
 
-    elif string == "PF_IPX":
-        return PF_IPX
+        if DEBUG:
+            log("Unimplemented parameter, skipping...")
 
-    elif string == "PF_RTIP":
-        return PF_RTIP
+    else:
+        return ('shutdown_syscall',(pid, sockfd, how), straceResult)
 
-    elif string == "PF_PIP":
-        return PF_PIP
 
-    elif string == "PF_NDRV":
-        return PF_NDRV
 
-    elif string == "PF_ISDN":
-        return PF_ISDN
 
-    elif string == "PF_KEY":
-        return PF_KEY
+##### CLOSE #####
 
-    elif string == "PF_INET6":
-        return PF_INET6
+def parseClose(pid, parameters, straceResult, line):
 
-    elif string == "PF_NATM":
-        return PF_NATM
+    sockfd = int(parameters[0])
 
-    elif string == "PF_SYSTEM":
-        return PF_SYSTEM
+    if DEBUG:
+        log("close", sockfd, straceResult)
 
-    elif string == "PF_NETBIOS":
-        return PF_NETBIOS
+    return ('close_syscall', (pid, sockfd), straceResult)
 
-    elif string == "PF_PPP":
-        return PF_PPP
 
-    elif string == "PF_RESERVED_36":
-        return PF_RESERVED_36
 
-    elif string == "PF_MAX":
-        return PF_MAX
 
-    elif string == "SOMAXCONN":
-        return SOMAXCONN
+# TODO I need to take care of these cases: eg: recvmsg(21, 0xabeceeac, 0)
 
-    elif string == "MSG_OOB":
-        return MSG_OOB
+# Not done yet!!
 
-    elif string == "MSG_PEEK":
-        return MSG_PEEK
+##### EG: RECVMSG #####
 
-    elif string == "MSG_DONTROUTE":
-        return MSG_DONTROUTE
+def parseRecvmsg(pid, parameters, straceResult, line):
 
-    elif string == "MSG_EOR":
-        return MSG_EOR
+    sockfd = int(parameters[0])
 
-    elif string == "MSG_TRUNC":
-        return MSG_TRUNC
+    message = UNIMPLEMENTED_ERROR
 
-    elif string == "MSG_CTRUNC":
-        return MSG_CTRUNC
+    all_message = ""
+    len_msg = 0
 
-    elif string == "MSG_WAITALL":
-        return MSG_WAITALL
+    parameterChunk = getParameterChunk(line)
 
-    elif string == "MSG_DONTWAIT":
-        return MSG_DONTWAIT
+    if parameterChunk.find("msg_iov") != -1:
 
-    elif string == "MSG_EOF":
-        return MSG_EOF
+        if parameterChunk.find('[{') == -1 or parameterChunk.rfind('}],') == -1:
+            return None
 
-    elif string == "MSG_WAITSTREAM":
-        return MSG_WAITSTREAM
+        table = parameterChunk[parameterChunk.find('[{')+1:parameterChunk.rfind('}],')]
+        table = table.split('}, {')
 
-    elif string == "MSG_FLUSH":
-        return MSG_FLUSH
+        for index in range(len(table)):
 
-    elif string == "MSG_HOLD":
-        return MSG_HOLD
+            p = table[index]
+            message = p[p.find("\"")+1:p.rfind("\"")]
 
-    elif string == "MSG_SEND":
-        return MSG_SEND
+            if message == "":
+                continue
 
-    elif string == "MSG_HAVEMORE":
-        return MSG_HAVEMORE
+            len_msg = int(p.rsplit(', ', 1)[1])
+            message += "*" * (len_msg - len(message))
+            all_message += message
 
-    elif string == "MSG_RCVMORE":
-        return MSG_RCVMORE
+    try:
+        flags = int(parameters[-1])
+    except:
+        flags = splitAndCombine(parameters[-1])
 
-    elif string == "MSG_NEEDSA":
-        return MSG_NEEDSA
+    remoteip, remoteport = parseSockaddr(parameters[1])
 
-    elif string == "SHUT_RD":
-        return SHUT_RD
+    if remoteip == -1:
+        remoteip = ''
 
-    elif string == "SHUT_WR":
-        return SHUT_WR
+    if remoteport == -1:
+        remoteport = 0
 
-    elif string == "SHUT_RDWR":
-        return SHUT_RDWR
+    if DEBUG:
+        log("recvmsg", sockfd, all_message, remoteip, remoteport, flags, straceResult)
 
-    elif string == "SOL_IP":
-        return SOL_IP
+    if flags == UNIMPLEMENTED_ERROR:
 
-    elif string == "IP_MULTICAST_IF":
-        return IP_MULTICAST_IF
+        if DEBUG:
+            log("Unimplemented parameter, skipping...")
 
-    elif string == "IP_MULTICAST_TTL":
-        return IP_MULTICAST_TTL
+    else:
+        return ('recvmsg_syscall',(pid, sockfd, all_message, len_msg, remoteip, remoteport, flags), straceResult)
 
-    elif string == "IP_MULTICAST_LOOP":
-        return IP_MULTICAST_LOOP
 
-    elif string == "IP_ADD_MEMBERSHIP":
-        return IP_ADD_MEMBERSHIP
 
-    elif string == "IP_DROP_MEMBERSHIP":
-        return IP_DROP_MEMBERSHIP
 
-    elif string == "SO_DEBUG":
-        return SO_DEBUG
+##### EG: SENDMSG #####
 
-    elif string == "SO_ACCEPTCONN":
-        return SO_ACCEPTCONN
+def parseSendmsg(pid, parameters, straceResult, line):
 
-    elif string == "SO_REUSEADDR":
-        return SO_REUSEADDR
+    sockfd = int(parameters[0])
 
-    elif string == "SO_KEEPALIVE":
-        return SO_KEEPALIVE
+    message = UNIMPLEMENTED_ERROR
+    all_message = ""
 
-    elif string == "SO_DONTROUTE":
-        return SO_DONTROUTE
+    parameterChunk = getParameterChunk(line)
 
-    elif string == "SO_BROADCAST":
-        return SO_BROADCAST
+    if parameterChunk.find("msg_iov") != -1:
 
-    elif string == "SO_USELOOPBACK":
-        return SO_USELOOPBACK
+        if parameterChunk.find('[{') == -1 or parameterChunk.rfind('}],') == -1:
+            return None
 
-    elif string == "SO_LINGER":
-        return SO_LINGER
+        table = parameterChunk[parameterChunk.find('[{')+1:parameterChunk.rfind('}],')]
+        table = table.split('}, {')
 
-    elif string == "SO_OOBINLINE":
-        return SO_OOBINLINE
+        for index in range(len(table)):
 
-    elif string == "SO_REUSEPORT":
-        return SO_REUSEPORT
+            p = table[index]
+            message = p[p.find("\"")+1:p.rfind("\"")]
 
-    elif string == "SO_TIMESTAMP":
-        return SO_TIMESTAMP
+            if message == "":
+                continue
 
-    elif string == "SO_ACCEPTFILTER":
-        return SO_ACCEPTFILTER
+            len_msg = int(p.rsplit(', ', 1)[1])
+            message += "*" * (len_msg - len(message))
+            all_message += message
 
-    elif string == "SO_DONTTRUNC":
-        return SO_DONTTRUNC
+    try:
+        flags = int(parameters[-1])
+    except:
+        flags = splitAndCombine(parameters[-1])
 
-    elif string == "SO_WANTMORE":
-        return SO_WANTMORE
+    remoteip, remoteport = parseSockaddr(parameters[1])
 
-    elif string == "SO_WANTOOBFLAG":
-        return SO_WANTOOBFLAG
+    if remoteip == -1:
+        remoteip = ''
 
-    elif string == "SO_SNDBUF":
-        return SO_SNDBUF
+    if remoteport == -1:
+        remoteport = 0
 
-    elif string == "SO_RCVBUF":
-        return SO_RCVBUF
+    if DEBUG:
+        log("sendmsg", sockfd, all_message, remoteip, remoteport, flags, straceResult)
 
-    elif string == "SO_SNDLOWAT":
-        return SO_SNDLOWAT
+    if remoteip == UNIMPLEMENTED_ERROR or remoteport == UNIMPLEMENTED_ERROR or flags == UNIMPLEMENTED_ERROR:
 
-    elif string == "SO_RCVLOWAT":
-        return SO_RCVLOWAT
+        if DEBUG:
+            log("Unimplemented parameter, skipping...")
 
-    elif string == "SO_SNDTIMEO":
-        return SO_SNDTIMEO
+    else:
+        return ('sendmsg_syscall',(pid, sockfd, all_message, remoteip, remoteport, flags), straceResult)
 
-    elif string == "SO_RCVTIMEO":
-        return SO_RCVTIMEO
 
-    elif string == "SO_ERROR":
-        return SO_ERROR
 
-    elif string == "SO_TYPE":
-        return SO_TYPE
 
-    elif string == "SO_NREAD":
-        return SO_NREAD
+##### EG: DUP #####
 
-    elif string == "SO_NKE":
-        return SO_NKE
+def parseDup(pid, parameters, straceResult, line):
 
-    elif string == "SO_NOSIGPIPE":
-        return SO_NOSIGPIPE
+    sockfd = int(parameters[0])
 
-    elif string == "SO_NOADDRERR":
-        return SO_NOADDRERR
+    if DEBUG:
+        log("dup", sockfd, straceResult)
 
-    elif string == "SO_NWRITE":
-        return SO_NWRITE
 
-    elif string == "SO_REUSESHAREUID":
-        return SO_REUSESHAREUID
+    return ('dup_syscall',(pid, sockfd), straceResult)
 
-    elif string == "SO_NOTIFYCONFLICT":
-        return SO_NOTIFYCONFLICT
 
-    elif string == "SO_UPCALLCLOSEWAIT":
-        return SO_UPCALLCLOSEWAIT
 
-    elif string == "SO_LINGER_SEC":
-        return SO_LINGER_SEC
 
-    elif string == "SO_RESTRICTIONS":
-        return SO_RESTRICTIONS
+##### EG: DUP2 #####
 
-    elif string == "SO_RESTRICT_DENYIN":
-        return SO_RESTRICT_DENYIN
+def parseDup2(pid, parameters, straceResult, line):
 
-    elif string == "SO_RESTRICT_DENYOUT":
-        return SO_RESTRICT_DENYOUT
+    sockfd = int(parameters[0])
+    sockfd2 = int(parameters[1])
 
-    elif string == "SO_RESTRICT_DENYSET":
-        return SO_RESTRICT_DENYSET
+    if DEBUG:
+        log("dup2", sockfd, sockfd2, straceResult)
 
-    elif string == "SO_RANDOMPORT":
-        return SO_RANDOMPORT
 
-    elif string == "SO_NP_EXTENSIONS":
-        return SO_NP_EXTENSIONS
+    return ('dup2_syscall',(pid, sockfd, sockfd2), straceResult)
 
-    elif string == "SO_LABEL":
-        return SO_LABEL
 
-    elif string == "SO_PEERLABEL":
-        return SO_PEERLABEL
 
-    elif string == "SO_PRIORITY":
-        return SO_PRIORITY
 
-    elif string == "TCP_NODELAY":
-        return TCP_NODELAY
+##### FCNTL #####
 
-    elif string == "TCP_MAXSEG":
-        return TCP_MAXSEG
+def parseFcntl(pid, parameters, straceResult, line):
 
-    elif string == "TCP_NOPUSH":
-        return TCP_NOPUSH
+    fd = int(parameters[0])
 
-    elif string == "TCP_NOOPT":
-        return TCP_NOOPT
+    try:
+        cmd = int(parameters[1])
+    except:
+        cmd = splitAndCombine(parameters[1])
 
-    elif string == "TCP_KEEPALIVE":
-        return TCP_KEEPALIVE
+    if cmd == -1:
+        return None
 
-    elif string == "TCP_CONNECTIONTIMEOUT":
-        return TCP_CONNECTIONTIMEOUT
+    if cmd != F_DUPFD and cmd != F_SETFD and cmd != F_SETFL:
+        return None
 
-    elif string == "PERSIST_TIMEOUT":
-        return PERSIST_TIMEOUT
+    if len(parameters) > 2:
 
-    elif string == "TCP_RXT_CONNDROPTIME":
-        return TCP_RXT_CONNDROPTIME
+        try:
+            args = int(parameters[2])
+        except:
+            args = splitAndCombine(parameters[2])
 
-    elif string == "TCP_RXT_FINDROP":
-        return TCP_RXT_FINDROP
+        if DEBUG:
+            log("fcntl", fd, cmd, args, straceResult)
 
-    elif string == "SOL_SOCKET":
-        return SOL_SOCKET
+        if cmd == UNIMPLEMENTED_ERROR or args == UNIMPLEMENTED_ERROR:
 
-    elif string == "SOL_TCP":
-        return SOL_TCP
+            if DEBUG:
+                log("Unimplemented parameter, skipping...")
 
-    elif string == "SOL_UDP":
-        return SOL_UDP
+        else:
+            return ('fcntl_syscall', (pid, fd, cmd, args), straceResult)
 
-    elif string == "F_OK":
-        return F_OK
+    else:
 
-    elif string == "X_OK":
-        return X_OK
+        if DEBUG:
+            log("fcntl", fd, cmd, straceResult)
 
-    elif string == "W_OK":
-        return W_OK
+        if cmd == UNIMPLEMENTED_ERROR:
 
-    elif string == "R_OK":
-        return R_OK
+            if DEBUG:
+                log("Unimplemented parameter, skipping...")
 
-    elif string == "O_RDONLY":
-        return O_RDONLY
+        else:
+            # POTENTIAL BUG: I have to put some kind of mode value for the fcntl syscall. For now it's 0.
+            return ('fcntl_syscall', (pid, fd, cmd), straceResult)
 
-    elif string == "O_WRONLY":
-        return O_WRONLY
 
-    elif string == "O_RDWR":
-        return O_RDWR
 
-    elif string == "O_RDWRFLAGS":
-        return O_RDWRFLAGS
 
-    elif string == "O_CREAT":
-        return O_CREAT
+##### IOCTL #####
 
-    elif string == "O_EXCL":
-        return O_EXCL
+def parseIoctl(pid, parameters, straceResult, line):
 
-    elif string == "O_NOCTTY":
-        return O_NOCTTY
+    fd = int(parameters[0])
+    cmd = parameters[1]
 
-    elif string == "O_TRUNC":
-        return O_TRUNC
+    if cmd == "FIONBIO":
+        val = int(parameters[2].strip("[]"))
 
-    elif string == "O_APPEND":
-        return O_APPEND
+        if DEBUG:
+            log("ioctl", fd, cmd, val, straceResult)
 
-    elif string == "O_NONBLOCK":
-        return O_NONBLOCK
+        return ('ioctl_syscall', (pid, fd, cmd, val), straceResult)
 
-    elif string == "O_SYNC":
-        return O_SYNC
 
-    elif string == "O_ASYNC":
-        return O_ASYNC
 
-    elif string == "S_IRWXA":
-        return S_IRWXA
 
-    elif string == "S_IRWXU":
-        return S_IRWXU
+##### SP: CLONE #####
 
-    elif string == "S_IRUSR":
-        return S_IRUSR
+def parseClone(pid, parameters, straceResult, line):
 
-    elif string == "S_IWUSR":
-        return S_IWUSR
+    try:
+        flags = int(parameters[1].strip("flags="))
+    except:
+        flags = splitAndCombine(parameters[1].strip("flags="))
 
-    elif string == "S_IXUSR":
-        return S_IXUSR
+    if DEBUG:
+        log("clone", pid, straceResult)
 
-    elif string == "S_IRWXG":
-        return S_IRWXG
+    return ('clone_syscall',(pid, flags), straceResult)
 
-    elif string == "S_IRGRP":
-        return S_IRGRP
 
-    elif string == "S_IWGRP":
-        return S_IWGRP
 
-    elif string == "S_IXGRP":
-        return S_IXGRP
 
-    elif string == "S_IRWXO":
-        return S_IRWXO
+##### EG: SELECT #####
 
-    elif string == "S_IROTH":
-        return S_IROTH
+def parseSelect(pid, parameters, straceResult, line):
 
-    elif string == "S_IWOTH":
-        return S_IWOTH
+    # if no candidate fds
+    if parameters[0] == 0:
+        return None
 
-    elif string == "S_IXOTH":
-        return S_IXOTH
+    if parameters[1] == 'NULL':
+        readfds = []
+    else:
+        readfds = map(int, parameters[1].strip('\'[]').split())
 
-    elif string == "S_IFBLK":
-        return S_IFBLK
+    if parameters[2] == 'NULL':
+        writefds = []
+    else:
+        writefds = map(int, parameters[2].strip('\'[]').split())
 
-    elif string == "S_IFCHR":
-        return S_IFCHR
+    if parameters[3] == 'NULL':
+        errorfds = []
+    else:
+        errorfds = map(int, parameters[3].strip('\'[]').split())
 
-    elif string == "S_IFDIR":
-        return S_IFDIR
+    if parameters[4] == 'NULL':
+        timeout = ()
+    else:
+        timeout = tuple(map(int, tokenizeParameters(parameters[4][1:-1])))
 
-    elif string == "S_IFIFO":
-        return S_IFIFO
+    result = line[line.rfind('=')+2:].split(' ', 1)[1].strip('()')
 
-    elif string == "S_IFLNK":
-        return S_IFLNK
+    r_in = []
+    r_out = []
 
-    elif string == "S_IFREG":
-        return S_IFREG
+    if result.find('[') != -1:
+        for subresult in result.split(', '):
+            if subresult.startswith("in"):
+                r_in = subresult[subresult.index('[')+1:subresult.index(']')].split()
 
-    elif string == "S_IFSOCK":
-        return S_IFSOCK
+            if subresult.startswith("out"):
+                r_out = subresult[subresult.index('[')+1:subresult.index(']')].split()
 
-    elif string == "S_FILETYPEFLAGS":
-        return S_FILETYPEFLAGS
 
-    elif string == "S_IWRITE":
-        return S_IWRITE
+    if straceResult[1] == None:
+        if straceResult[0] == 0:
+            straceResult = (straceResult[0], result)
+        else:
+            straceResult = (map(int, r_in), map(int, r_out))
 
-    elif string == "S_ISUID":
-        return S_ISUID
 
-    elif string == "S_IREAD":
-        return S_IREAD
+    if DEBUG:
+        log("select", pid, readfds, writefds, errorfds, timeout, straceResult)
 
-    elif string == "S_ENFMT":
-        return S_ENFMT
+    return ('select_syscall',(pid, readfds, writefds, errorfds, timeout), straceResult)
 
-    elif string == "S_ISGID":
-        return S_ISGID
 
-    elif string == "SEEK_SET":
-        return SEEK_SET
 
-    elif string == "SEEK_CUR":
-        return SEEK_CUR
 
-    elif string == "SEEK_END":
-        return SEEK_END
+##### EG: POLL #####
 
-    elif string == "F_DUPFD":
-        return F_DUPFD
+def parsePoll(pid, parameters, straceResult, line):
 
-    elif string == "F_GETFD":
-        return F_GETFD
+    if line.rfind(')') == len(line) - 1:
+        parameterChunk = line[line.find('(')+1:line.find(')')].strip()
+        args = parameterChunk.split(", ")
+        results = line[line.find(')')+1:].strip().split(' ')
 
-    elif string == "F_SETFD":
-        return F_SETFD
+        timeout = int(args[-1])
+        nfds = int(args[-2])
 
-    elif string == "F_GETFL":
-        return F_GETFL
+        args = args[0:-2]
+        results = results[2:]
 
-    elif string == "F_SETFL":
-        return F_SETFL
+        # I only parse POLLIN, POLLOUT and POLLERR, it seems adequate for now
+        zipped_args = zip(args[0::2], args[1::2])
+        zipped_results = zip(results[0::2], results[1::2])
 
-    elif string == "F_GETLK":
-        return F_GETLK
+        pollin = []
+        pollout = []
+        pollerr = []
 
-    elif string == "F_GETLK64":
-        return F_GETLK64
+        for pair in zipped_args:
 
-    elif string == "F_SETLK":
-        return F_SETLK
+            fd = int(pair[0].strip('([{').split('=')[1])
+            event = pair[1].strip('}])').split('=')[1]
 
-    elif string == "F_SETLK64":
-        return F_SETLK64
+            if event.find('POLLIN') != -1:
+                pollin.append(fd)
+            if event.find('POLLOUT') != -1:
+                pollout.append(fd)
+            if event.find('POLLERR') != -1:
+                pollerr.append(fd)
+            elif event.find('POLLIN') == -1 and event.find('POLLOUT') == -1:
+                print "We don't handle this case!"
 
-    elif string == "F_SETLKW":
-        return F_SETLKW
+        if straceResult[0] > 0:
+            r_in = []
+            r_out = []
+            r_err = []
+
+            for pair in zipped_results:
+
+                fd = int(pair[0].strip('([{,').split('=')[1])
+                event = pair[1].strip('}]),').split('=')[1]
+
+                if event.find('POLLIN') != -1:
+                    r_in.append(fd)
+                if event.find('POLLOUT') != -1:
+                    r_out.append(fd)
+                if event.find('POLLERR') != -1:
+                    r_err.append(fd)
+                elif event.find('POLLIN') == -1 and event.find('POLLOUT') == -1:
+                    print "We don't handle this case!"
+
+    if straceResult[0] == 0:
+        result = line.split(']')[1].split('(')[1].strip(')')
+        straceResult = (straceResult[0], result)
+    elif straceResult[0] == -1:
+        pass
+    else:
+        try:
+            straceResult = ((r_in, r_out, r_err), None)
+        except Exception:
+            return None
 
-    elif string == "F_SETLKW64":
-        return F_SETLKW64
+    if DEBUG:
+        log("poll", pid, pollin, pollout, pollerr, timeout, straceResult)
 
-    elif string == "F_SETOWN":
-        return F_SETOWN
+    return ('poll_syscall',(pid, pollin, pollout, pollerr, timeout), straceResult)
 
-    elif string == "F_GETOWN":
-        return F_GETOWN
 
-    elif string == "F_SETSIG":
-        return F_SETSIG
 
-    elif string == "F_GETSIG":
-        return F_GETSIG
 
-    elif string == "F_SETLEASE":
-        return F_SETLEASE
+##### PARSER REGISTRY #####
 
-    elif string == "F_GETLEASE":
-        return F_GETLEASE
+# Maps a system call name to a function of the form
+# parse(pid, parameters, straceResult, line) that returns a
+# (syscall_name, args, ret) tuple, or None if the line should be skipped.
+SYSCALL_PARSERS = {}
 
-    elif string == "F_NOTIFY":
-        return F_NOTIFY
+# Commands whose parsers split the line themselves and get None for
+# parameters.
+UNTOKENIZED_COMMANDS = set()
 
-    elif string == "F_RDLCK":
-        return F_RDLCK
 
-    elif string == "F_WRLCK":
-        return F_WRLCK
+def registerSyscallParser(command, parser, tokenize=True):
+    """
+    Makes getValidTraceLine parse lines for the system call named command
+    with parser. Registering a command that already has a parser replaces
+    the old one. If tokenize is False, the parser is passed None instead
+    of the tokenized arguments and has to pull what it needs from line.
+    """
 
-    elif string == "F_UNLCK":
-        return F_UNLCK
+    SYSCALL_PARSERS[command] = parser
+    ALL_COMMANDS.add(command)
 
-    elif string == "F_EXLCK":
-        return F_EXLCK
+    if tokenize:
+        UNTOKENIZED_COMMANDS.discard(command)
+    else:
+        UNTOKENIZED_COMMANDS.add(command)
+
+
+registerSyscallParser("socket", parseSocket)
+registerSyscallParser("bind", parseBind)
+registerSyscallParser("connect", parseConnect)
+registerSyscallParser("sendto", parseSendto)
+registerSyscallParser("send", parseSend, tokenize=False)
+registerSyscallParser("write", parseWrite, tokenize=False)
+registerSyscallParser("writev", parseWritev)
+registerSyscallParser("sendfile", parseSendfile)
+registerSyscallParser("read", parseRead, tokenize=False)
+registerSyscallParser("recvfrom", parseRecvfrom)
+registerSyscallParser("recv", parseRecv, tokenize=False)
+registerSyscallParser("getsockname", parseGetsockname)
+registerSyscallParser("getpeername", parseGetpeername)
+registerSyscallParser("listen", parseListen)
+registerSyscallParser("accept", parseAccept)
+registerSyscallParser("getsockopt", parseGetsockopt)
+registerSyscallParser("setsockopt", parseSetsockopt)
+registerSyscallParser("shutdown", parseShutdown)
+registerSyscallParser("close", parseClose)
+registerSyscallParser("recvmsg", parseRecvmsg)
+registerSyscallParser("sendmsg", parseSendmsg)
+registerSyscallParser("dup", parseDup)
+registerSyscallParser("dup2", parseDup2)
+registerSyscallParser("fcntl", parseFcntl)
+registerSyscallParser("fcntl64", parseFcntl)
+registerSyscallParser("ioctl", parseIoctl)
+registerSyscallParser("clone", parseClone)
+registerSyscallParser("select", parseSelect)
+registerSyscallParser("poll", parsePoll)
 
-    elif string == "F_SHLCK":
-        return F_SHLCK
 
-    elif string == "PATH_MAX":
-        return PATH_MAX
 
-    elif string == "MAX_FD":
-        return MAX_FD
 
-    elif string == "DT_UNKNOWN":
-        return DT_UNKNOWN
+def splitAndCombine(string):
 
-    elif string == "DT_FIFO":
-        return DT_FIFO
+    # Flag expressions repeat constantly, so remember each one we've seen.
+    try:
+        return FLAG_EXPRESSION_CACHE[string]
+    except KeyError:
+        pass
 
-    elif string == "DT_CHR":
-        return DT_CHR
+    result = 0
+    stringParts = string.split("|")
 
-    elif string == "DT_DIR":
-        return DT_DIR
+    for param in stringParts:
 
-    elif string == "DT_BLK":
-        return DT_BLK
+        paramValue = convert(param)
 
-    elif string == "DT_REG":
-        return DT_REG
+        if paramValue == UNIMPLEMENTED_ERROR:
+            result = UNIMPLEMENTED_ERROR
+            break
 
-    elif string == "DT_LNK":
-        return DT_LNK
+        result |= paramValue
 
-    elif string == "DT_SOCK":
-        return DT_SOCK
+    if len(FLAG_EXPRESSION_CACHE) < MAX_FLAG_EXPRESSIONS:
+        FLAG_EXPRESSION_CACHE[string] = result
 
-    elif string == "DT_WHT":
-        return DT_WHT
+    return result
 
-    # Parameters that don't translate to POSIX model but are often used...
 
-    # Ignoring MSG_NOSIGNAL
-    elif string == "MSG_NOSIGNAL":
-        return 0
 
-    # Ignoring SOCK_CLOEXEC because it seems to be needed more for multi-threading
-    elif string == "SOCK_CLOEXEC":
-        return 0
 
-    # SOCK_NONBLOCK is the same as O_NONBLOCK
-    elif string == "SOCK_NONBLOCK":
-        return O_NONBLOCK
+def convert(string):
 
-    else:
+    try:
+        return CONSTANTS[string]
+    except KeyError:
         if DEBUG:
             log("INVALID CONSTANT: " + string, '\n')
         return UNIMPLEMENTED_ERROR
@@ -2646,12 +2081,8 @@ def main(file_name):
 
     fh = open(file_name, "r")
 
-    trace = getValidTraceLine(fh)
-
-    while trace:
-        log(trace.pop(0))
-        if not trace:
-            trace += getValidTraceLine(fh)
+    for syscall in getValidTraceLines(fh, None):
+        log(syscall)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,116 @@
+"""
+- This file compares how fast posix_preprocessor.get_trace_from_filename
+  reads plain trace files and the same traces compressed with gzip, bzip2
+  and (if backports.lzma is installed) xz.
+- To run the benchmark, run the following command from the netcheck/ directory:
+  'python -m tests.benchmarks.compressed_benchmark [TRACE_FILE ...]'
+
+- If no trace files are given, every trace in traces_for_int_tests/ is used.
+  The compressed copies are written to a temporary directory, and each
+  file is read REPEAT times with the best time reported.
+"""
+
+import bz2
+import gzip
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import posix_preprocessor
+
+
+TRACE_DIR = 'traces_for_int_tests'
+
+REPEAT = 3
+
+
+def compress(filename, directory):
+    """
+    Writes compressed copies of the given file into directory and returns
+    a list of (format, filename) for the plain file and every copy.
+    """
+
+    name = os.path.join(directory, os.path.basename(filename))
+    copies = [('plain', filename)]
+
+    writers = [('gz', gzip.GzipFile), ('bz2', bz2.BZ2File)]
+    if posix_preprocessor.lzma is not None:
+        writers.append(('xz', posix_preprocessor.lzma.LZMAFile))
+
+    for extension, writer in writers:
+        copy = writer(name + '.' + extension, 'wb')
+        trace_file = open(filename, 'rb')
+        shutil.copyfileobj(trace_file, copy)
+        trace_file.close()
+        copy.close()
+        copies.append((extension, name + '.' + extension))
+
+    return copies
+
+
+def time_read(filename):
+    """
+    Returns (seconds, syscalls) for the fastest of REPEAT full reads of
+    the given trace file.
+    """
+
+    best = None
+
+    for i in range(REPEAT):
+        syscalls = 0
+
+        start = time.time()
+        for syscall in posix_preprocessor.get_trace_from_filename(filename):
+            syscalls += 1
+        elapsed = time.time() - start
+
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return best, syscalls
+
+
+def main(filenames):
+
+    if not filenames:
+        filenames = sorted(os.path.join(TRACE_DIR, name)
+                           for name in os.listdir(TRACE_DIR))
+
+    directory = tempfile.mkdtemp()
+    totals = {}
+    formats = []
+
+    print "%-45s %6s %10s %8s %10s" % ("trace", "format", "bytes",
+                                       "syscalls", "MB/sec")
+
+    try:
+        for filename in filenames:
+            size = os.path.getsize(filename)
+
+            for format, copy in compress(filename, directory):
+                elapsed, syscalls = time_read(copy)
+
+                if format not in totals:
+                    formats.append(format)
+                    totals[format] = [0, 0.0]
+                totals[format][0] += size
+                totals[format][1] += elapsed
+
+                # Throughput is measured in uncompressed bytes for every format.
+                print "%-45s %6s %10d %8d %10.2f" % (
+                    os.path.basename(filename), format,
+                    os.path.getsize(copy), syscalls,
+                    size / max(elapsed, 1e-9) / 1e6)
+    finally:
+        shutil.rmtree(directory)
+
+    for format in formats:
+        size, elapsed = totals[format]
+        print "%-45s %6s %10d %8s %10.2f" % ("TOTAL", format, size, "",
+                                             size / max(elapsed, 1e-9) / 1e6)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,96 @@
+"""
+- This file benchmarks the strace parser in posix_test_harness_functions.py.
+- To run the benchmark, run the following command from the netcheck/ directory:
+  'python -m tests.benchmarks.parser_benchmark [TRACE_FILE ...]'
+
+- If no trace files are given, every trace in traces_for_int_tests/ is used.
+  Each file is parsed REPEAT times and the best time is reported.
+"""
+
+import os
+import sys
+import time
+
+import posix_test_harness_functions as parser
+
+
+TRACE_DIR = 'traces_for_int_tests'
+
+REPEAT = 5
+
+
+def count_lines(filename):
+    """
+    Returns the number of lines in the given file.
+    """
+
+    trace_file = open(filename, 'r')
+    lines = 0
+    for line in trace_file:
+        lines += 1
+    trace_file.close()
+    return lines
+
+
+def time_parse(filename):
+    """
+    Returns (seconds, syscalls, skipped) for the fastest of REPEAT full
+    parses of the given file, where skipped is the number of lines the
+    parser threw away without looking past the system call name (calls
+    it doesn't parse, signals and process events).
+    """
+
+    best = None
+
+    for i in range(REPEAT):
+        trace_file = open(filename, 'r')
+        syscalls = 0
+        parser.parseCounters = parser.ParseCounters()
+
+        start = time.time()
+        while parser.getValidTraceLine(trace_file):
+            syscalls += 1
+        elapsed = time.time() - start
+
+        counters = parser.parseCounters
+        skipped = (counters.ignoredCalls + counters.signalLines +
+                   counters.processLines + counters.unrecognizedLines)
+        trace_file.close()
+
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return best, syscalls, skipped
+
+
+def main(filenames):
+
+    if not filenames:
+        filenames = sorted(os.path.join(TRACE_DIR, name)
+                           for name in os.listdir(TRACE_DIR))
+
+    total_lines = 0
+    total_skipped = 0
+    total_time = 0.0
+
+    print "%-45s %8s %8s %8s %12s" % ("trace", "lines", "skipped",
+                                      "syscalls", "lines/sec")
+
+    for filename in filenames:
+        lines = count_lines(filename)
+        elapsed, syscalls, skipped = time_parse(filename)
+
+        total_lines += lines
+        total_skipped += skipped
+        total_time += elapsed
+
+        print "%-45s %8d %8d %8d %12.0f" % (os.path.basename(filename), lines,
+                                            skipped, syscalls,
+                                            lines / max(elapsed, 1e-9))
+
+    print "%-45s %8d %8d %8s %12.0f" % ("TOTAL", total_lines, total_skipped,
+                                        "", total_lines / max(total_time, 1e-9))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
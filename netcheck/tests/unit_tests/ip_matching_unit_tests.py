@@ -0,0 +1,76 @@
+"""
+- This file contains unit doc tests for the functions in ip_matching.py.
+- To run the tests, run the following command from the netcheck/ directory:
+  'python -m tests.unit_tests.ip_matching_unit_tests'
+"""
+
+import ip_matching
+
+
+REQUEST = 'GET /index.html HTTP/1.0\r\n'
+RESPONSE = 'HTTP/1.0 200 OK\r\n\r\n'
+
+# A connects three times to B. The first connection sends a request and
+# gets a response, the second sends a request B never accepted, and the
+# third sends fewer than MATCH_KEY_SIZE bytes.
+CONNECT_TRACE = [
+  ('socket_syscall', (2, 1, 6), (3, None)),
+  ('connect_syscall', (3, '10.0.0.2', 80), (0, None)),
+  ('send_syscall', (3, REQUEST, 0), (len(REQUEST), None)),
+  ('recv_syscall', (3, RESPONSE, 100, 0), (len(RESPONSE), None)),
+  ('socket_syscall', (2, 1, 6), (4, None)),
+  ('connect_syscall', (4, '10.0.0.2', 80), (0, None)),
+  ('send_syscall', (4, 'GET /other.html HTTP/1.0\r\n', 0), (26, None)),
+  ('socket_syscall', (2, 1, 6), (5, None)),
+  ('connect_syscall', (5, '10.0.0.2', 80), (0, None)),
+  ('send_syscall', (5, 'hi', 0), (2, None))]
+
+ACCEPT_TRACE = [
+  ('socket_syscall', (2, 1, 6), (3, None)),
+  ('accept_syscall', (3, '10.0.0.1', 4000), (4, None)),
+  ('recv_syscall', (4, REQUEST, 100, 0), (len(REQUEST), None)),
+  ('send_syscall', (4, RESPONSE, 0), (len(RESPONSE), None)),
+  ('accept_syscall', (3, '10.0.0.1', 4001), (5, None)),
+  ('recv_syscall', (5, 'hi', 100, 0), (2, None))]
+
+
+def test_get_match_key():
+    """
+    StreamFingerprint -> str or None
+
+    Streams are keyed by their first MATCH_KEY_SIZE bytes, if that many
+    are known.
+
+    >>> import payload_digest
+    >>> fingerprint = payload_digest.StreamFingerprint()
+    >>> fingerprint.add('GET /', 5)
+    >>> ip_matching.get_match_key(fingerprint)
+    >>> fingerprint.add('index.html HTTP/1.0', 19)
+    >>> ip_matching.get_match_key(fingerprint)
+    'GET /index.html '
+    """
+    return
+
+def test_find_tcp_matches():
+    """
+    dict -> None
+
+    Sockets are only matched up when each received a prefix of what the
+    other sent. A connection with a keyed stream is found through the
+    index, one whose key B never saw isn't matched, and one with too
+    little data to key is compared with every accepted socket.
+
+    >>> ip_matching.tcp_sockets.clear()
+    >>> ip_matching.tcp_matches.clear()
+    >>> ip_matching.find_tcp_matches({'A': CONNECT_TRACE, 'B': ACCEPT_TRACE})
+    >>> sorted(ip_matching.tcp_matches)
+    [(('A', 3), ('B', 4)), (('A', 5), ('B', 5))]
+    >>> sorted(ip_matching.tcp_sockets)
+    [('A', 3), ('A', 4), ('A', 5), ('B', 4), ('B', 5)]
+    """
+    return
+
+# Make sure doctests run when script is run
+if __name__ == '__main__':
+    import doctest
+    print doctest.testmod(verbose=False)
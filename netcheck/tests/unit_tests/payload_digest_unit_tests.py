@@ -0,0 +1,173 @@
+"""
+- This file contains unit doc tests for the functions in payload_digest.py.
+- To run the tests, run the following command from the netcheck/ directory:
+  'python -m tests.unit_tests.payload_digest_unit_tests'
+"""
+
+import payload_digest
+
+
+def test_join_hashes():
+    """
+    int, int, int -> int
+
+    The hash of two payloads joined together comes from their hashes.
+
+    >>> payload_digest.join_hashes(payload_digest.get_hash('GET / '),
+    ...     payload_digest.get_hash('HTTP/1.0'), 8) == payload_digest.get_hash('GET / HTTP/1.0')
+    True
+
+    Bytes, and blocks of bytes, swapped 61 apart hash differently (they
+    didn't with a base of 256).
+
+    >>> payload_digest.get_hash('a' + 'x' * 60 + 'b') == payload_digest.get_hash('b' + 'x' * 60 + 'a')
+    False
+    >>> first, second = 'p' * 61, 'q' * 61
+    >>> payload_digest.get_hash(first + second) == payload_digest.get_hash(second + first)
+    False
+
+    Long payloads are hashed in chunks, the same as if they were joined.
+
+    >>> data = ''.join(chr(i % 251) for i in range(20001))
+    >>> payload_digest.join_hashes(payload_digest.get_hash(data[:12345]),
+    ...     payload_digest.get_hash(data[12345:]), 20001 - 12345) == payload_digest.get_hash(data)
+    True
+    """
+    return
+
+def test_payload_digest():
+    """
+    str -> PayloadDigest
+
+    Digests compare, hash and add up like the payloads they stand for,
+    showing only their sample.
+
+    >>> old_size = payload_digest.SAMPLE_SIZE
+    >>> payload_digest.SAMPLE_SIZE = 4
+    >>> digest = payload_digest.get_payload_digest('ping pong')
+    >>> digest, len(digest)
+    ('ping'..., 9)
+    >>> digest == payload_digest.get_payload_digest('ping pong')
+    True
+    >>> digest == 'ping pang', digest != 'ping pang'
+    (False, True)
+    >>> {digest: 1}.get(payload_digest.get_payload_digest('ping pong'))
+    1
+    >>> payload_digest.get_payload_digest('ping ') + 'pong' == digest
+    True
+
+    Streams built with += remember where each piece ended, so prefixes
+    there (or within the sample) are known. Others compare equal to any
+    payload of their length.
+
+    >>> data = ''
+    >>> data += payload_digest.get_payload_digest('ping ')
+    >>> data += payload_digest.get_payload_digest('pong')
+    >>> data == digest, data[:5] == 'ping ', data[:5] == 'pong '
+    (True, True, False)
+    >>> data[:3] == 'pin', data[:7] == 'ping po', data[:7] == 'xxxxxxx'
+    (True, True, True)
+
+    >>> digest.startswith(payload_digest.get_payload_digest('pin'))
+    True
+    >>> digest.startswith(payload_digest.get_payload_digest('pong'))
+    False
+
+    >>> payload_digest.SAMPLE_SIZE = old_size
+    """
+    return
+
+def test_payload_stream():
+    """
+    PayloadDigest -> PayloadStream
+
+    Receives are checked where they end at the end of a send, however the
+    data was split up.
+
+    >>> digest = payload_digest.get_payload_digest
+    >>> stream = payload_digest.PayloadStream()
+    >>> stream = stream.send(digest('GET / HTTP/1.0')).send(digest('\\r\\n\\r\\n'))
+    >>> len(stream)
+    18
+    >>> stream.is_match(digest('GET /'))
+    True
+    >>> stream = stream.receive(digest('GET /'), 5)
+    >>> stream.is_match(digest(' HTTP/1.1'))
+    False
+    >>> stream.is_match(digest(' HTTP/1.0'))
+    True
+    >>> stream = stream.receive(digest(' HTTP/1.0\\r\\n\\r\\n'), 13)
+    >>> len(stream)
+    0
+
+    Data received after a truncated receive is not known, until the known
+    data starts over.
+
+    >>> stream = stream.send(digest('abc')).send(digest('def'))
+    >>> stream = stream.receive(digest('a'), 2)
+    >>> stream.is_match(digest('xxxx'))
+    True
+    >>> stream = stream.receive(digest('xxxx'), 4)
+    >>> stream = stream.send(digest('ghi'))
+    >>> stream.is_match(digest('gh!'))
+    False
+    """
+    return
+
+def test_stream_fingerprint():
+    """
+    str, int -> StreamFingerprint
+
+    Streams sent and received in different pieces match as far as both
+    are known, by their heads and then their hashes.
+
+    >>> old_head_size = payload_digest.FINGERPRINT_HEAD_SIZE
+    >>> old_offsets = payload_digest.FINGERPRINT_OFFSETS
+    >>> payload_digest.FINGERPRINT_HEAD_SIZE = 4
+    >>> payload_digest.FINGERPRINT_OFFSETS = (6,)
+    >>> sent = payload_digest.StreamFingerprint()
+    >>> sent.add('GET / ', 6)
+    >>> sent.add('HTTP/1.0', 8)
+    >>> sent.length, sent.head, sorted(sent.prefixes)
+    (14, 'GET ', [6])
+    >>> received = payload_digest.StreamFingerprint()
+    >>> received.add('GET / HTTP', 10)
+    >>> received.add('/1.0', 4)
+    >>> received.is_prefix_match(sent, 14)
+    True
+    >>> other = payload_digest.StreamFingerprint()
+    >>> other.add('GET / HTTP/1.1', 14)
+    >>> other.is_prefix_match(sent, 14), other.is_prefix_match(sent, 7)
+    (False, True)
+
+    Nothing past the first truncated payload is known.
+
+    >>> truncated = payload_digest.StreamFingerprint()
+    >>> truncated.add('GET / HT', 10)
+    >>> truncated.add('xxxx', 4)
+    >>> truncated.length, truncated.known
+    (14, 8)
+    >>> truncated.is_prefix_match(sent, 14)
+    False
+    >>> truncated.is_prefix_match(sent, 8)
+    True
+
+    Past the head, streams are told apart by their hashes, even when they
+    only differ by bytes swapped 61 apart.
+
+    >>> first = payload_digest.StreamFingerprint()
+    >>> first.add('GET ' + 'a' + 'x' * 60 + 'b', 66)
+    >>> second = payload_digest.StreamFingerprint()
+    >>> second.add('GET ' + 'b' + 'x' * 60 + 'a', 66)
+    >>> first.is_prefix_match(second, 66), first.is_prefix_match(second, 4)
+    (False, True)
+
+    >>> payload_digest.FINGERPRINT_HEAD_SIZE = old_head_size
+    >>> payload_digest.FINGERPRINT_OFFSETS = old_offsets
+    """
+    return
+
+# Make sure doctests run when script is run
+if __name__ == '__main__':
+    import doctest
+    print doctest.testmod(verbose=False)
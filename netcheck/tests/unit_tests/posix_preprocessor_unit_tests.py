@@ -0,0 +1,575 @@
+"""
+- This file contains unit doc tests for the functions in posix_preprocessor.py.
+- To run the tests, run the following command from the netcheck/ directory:
+  'python -m tests.unit_tests.posix_preprocessor_unit_tests'
+"""
+
+import bz2
+import gzip
+import mmap
+import os
+import tempfile
+
+import posix_preprocessor as preprocessor
+
+
+def write_trace(contents):
+    """
+    Writes contents to a new temporary file and returns its name.
+    """
+
+    fd, filename = tempfile.mkstemp()
+    os.write(fd, contents)
+    os.close(fd)
+    return filename
+
+
+TRACE = '''7  socket(PF_INET, SOCK_STREAM, IPPROTO_TCP) = 3
+7  mmap2(NULL, 8192, PROT_READ, MAP_PRIVATE, -1, 0) = 0xb7777000
+7  connect(3, {sa_family=AF_INET, sin_port=htons(80), sin_addr=inet_addr("10.0.0.1")}, 16) = 0
+7  send(3, "GET /, HTTP/1.0\\r\\n\\r\\n", 19, 0) = 19
+7  close(3) = 0'''
+
+
+def test_get_lines_from_mmap():
+    """
+    file -> generator of str
+
+    Yields the same lines as iterating over the file object.
+
+    >>> filename = write_trace(TRACE)
+    >>> list(preprocessor.get_lines_from_mmap(open(filename))) == list(open(filename))
+    True
+
+    >>> os.remove(filename)
+
+    Lines which cross the boundary between two mapped windows are put back
+    together.
+
+    >>> filename = write_trace('\\n'.join([TRACE] * 100))
+    >>> old_size = preprocessor.MMAP_WINDOW_SIZE
+    >>> preprocessor.MMAP_WINDOW_SIZE = mmap.ALLOCATIONGRANULARITY
+    >>> os.path.getsize(filename) > 2 * preprocessor.MMAP_WINDOW_SIZE
+    True
+    >>> list(preprocessor.get_lines_from_mmap(open(filename))) == list(open(filename))
+    True
+
+    >>> preprocessor.MMAP_WINDOW_SIZE = old_size
+    >>> os.remove(filename)
+    """
+    return
+
+def test_get_trace_from_filename_mmap():
+    """
+    str -> generator of (str, tuple, tuple)
+
+    Reading a trace through mmap produces the same system calls.
+
+    >>> filename = write_trace(TRACE)
+    >>> plain = list(preprocessor.get_trace_from_filename(filename))
+    >>> old_size = preprocessor.MMAP_MIN_FILE_SIZE
+    >>> preprocessor.MMAP_MIN_FILE_SIZE = 1
+    >>> list(preprocessor.get_trace_from_filename(filename)) == plain
+    True
+
+    >>> len(plain)
+    4
+
+    >>> empty = write_trace('')
+    >>> list(preprocessor.get_trace_from_filename(empty))
+    []
+
+    >>> preprocessor.MMAP_MIN_FILE_SIZE = old_size
+    >>> os.remove(filename)
+    >>> os.remove(empty)
+    """
+    return
+
+def test_get_trace_batches_from_filename():
+    """
+    str -> generator of [(str, tuple, tuple), ...]
+
+    Traces can be read and preprocessed in lists of up to
+    TRACE_BATCH_SIZE system calls.
+
+    >>> filename = write_trace(TRACE)
+    >>> old_size = preprocessor.TRACE_BATCH_SIZE
+    >>> preprocessor.TRACE_BATCH_SIZE = 3
+    >>> [len(batch) for batch in preprocessor.get_trace_batches_from_filename(filename)]
+    [3, 1]
+    >>> batches = preprocessor.get_trace_batches_from_filename(filename)
+    >>> list(preprocessor.preprocess_trace_batches(batches, 'A')) == \\
+    ...     list(preprocessor.preprocess_trace(preprocessor.get_trace_from_filename(filename), 'A'))
+    True
+
+    >>> preprocessor.TRACE_BATCH_SIZE = old_size
+    >>> os.remove(filename)
+    """
+    return
+
+def test_get_trace_batches_from_filename_once():
+    """
+    str -> (generator of [(str, tuple, tuple), ...], generator of [...])
+
+    A trace read twice is only parsed the first time, and the second read
+    gives the same system calls (with timing) from the spill file.
+
+    >>> filename = write_trace('''7  10:00:00.000100 socket(PF_INET, SOCK_STREAM, IPPROTO_TCP) = 3 <0.000010>
+    ... 7  10:00:00.000200 send(3, "hi", 2, 0) = 2
+    ... 7  10:00:00.000300 close(3) = 0''')
+    >>> batches, replayed_batches = preprocessor.get_trace_batches_from_filename_once(filename)
+    >>> first = [list(batch) for batch in batches]
+    >>> os.remove(filename)
+    >>> second = list(replayed_batches)
+    >>> second == first
+    True
+    >>> [syscall.timestamp for syscall in second[0]]
+    [36000.0001, 36000.0002, 36000.0003]
+    """
+    return
+
+def test_get_trace_from_filename_compressed():
+    """
+    str -> generator of (str, tuple, tuple)
+
+    gzip and bzip2 compressed traces produce the same system calls as the
+    uncompressed trace.
+
+    >>> filename = write_trace(TRACE)
+    >>> plain = list(preprocessor.get_trace_from_filename(filename))
+
+    >>> gz_file = gzip.open(filename + '.gz', 'wb')
+    >>> gz_file.write(TRACE)
+    274
+    >>> gz_file.close()
+    >>> list(preprocessor.get_trace_from_filename(filename + '.gz')) == plain
+    True
+
+    >>> bz2_file = bz2.BZ2File(filename + '.bz2', 'w')
+    >>> bz2_file.write(TRACE)
+    >>> bz2_file.close()
+    >>> list(preprocessor.get_trace_from_filename(filename + '.bz2')) == plain
+    True
+
+    Lines split across two reads are put back together.
+
+    >>> old_size = preprocessor.COMPRESSED_READ_SIZE
+    >>> preprocessor.COMPRESSED_READ_SIZE = 7
+    >>> lines = preprocessor.get_lines_from_compressed_file(gzip.open(filename + '.gz'))
+    >>> list(lines) == list(open(filename))
+    True
+
+    >>> preprocessor.COMPRESSED_READ_SIZE = old_size
+    >>> os.remove(filename)
+    >>> os.remove(filename + '.gz')
+    >>> os.remove(filename + '.bz2')
+    """
+    return
+
+UNFINISHED_TRACE = '''7  socket(PF_INET, SOCK_STREAM, IPPROTO_TCP) = 3
+8  socket(PF_INET, SOCK_STREAM, IPPROTO_TCP) = 4
+7  connect(3, {sa_family=AF_INET, sin_port=htons(80), sin_addr=inet_addr("10.0.0.1")}, 16 <unfinished ...>
+8  send(4, "ping", 4, 0 <unfinished ...>
+8  <... send resumed> ) = 4
+7  <... connect resumed> ) = 0
+7  <... recv resumed> "pong", 4, 0) = 4
+7  close(3) = 0'''
+
+
+def test_get_trace_from_filename_parallel():
+    """
+    str -> generator of (str, tuple, tuple)
+
+    Parsing a trace in chunks produces the same system calls in the same
+    order, even when unfinished and resumed lines are in different chunks.
+
+    >>> filename = write_trace(UNFINISHED_TRACE)
+    >>> plain = list(preprocessor.get_trace_from_filename(filename))
+    >>> [syscall[0] for syscall in plain]
+    ['socket_syscall', 'socket_syscall', 'send_syscall', 'connect_syscall', 'close_syscall']
+
+    >>> old_size = preprocessor.PARALLEL_PARSE_CHUNK_SIZE
+    >>> preprocessor.PARALLEL_PARSE_MIN_FILE_SIZE = 0
+    >>> preprocessor.PARALLEL_PARSE_CHUNK_SIZE = 60
+    >>> preprocessor.PARALLEL_PARSE_PROCESSES = 2
+    >>> len(preprocessor.get_trace_chunks(filename, os.path.getsize(filename))) > 1
+    True
+    >>> list(preprocessor.get_trace_from_filename(filename)) == plain
+    True
+
+    >>> preprocessor.PARALLEL_PARSE_MIN_FILE_SIZE = None
+    >>> preprocessor.PARALLEL_PARSE_CHUNK_SIZE = old_size
+    >>> preprocessor.PARALLEL_PARSE_PROCESSES = None
+    >>> os.remove(filename)
+
+    A line in a chunk that can't be parsed fails the chunk, rather than
+    cutting it short.
+
+    >>> filename = write_trace('''7  close(3) = 0
+    ... 7  bind(xyz, {sa_family=AF_INET, sin_port=htons(80), sin_addr=inet_addr("0.0.0.0")}, 16) = 0
+    ... 7  close(4) = 0
+    ... ''')
+    >>> preprocessor.parse_trace_chunk((filename, 0, os.path.getsize(filename)))
+    Traceback (most recent call last):
+    ...
+    ValueError: invalid literal for int() with base 10: 'xyz'
+    >>> preprocessor.parser.keepUnmatchedResumedLines = False
+    >>> os.remove(filename)
+    """
+    return
+
+def test_strace_ff_files():
+    """
+    str -> generator of (str, tuple, tuple)
+
+    A trace name with only 'strace -ff' per process files is read by
+    merging the files on their timestamps, keeping the pid of each line.
+
+    >>> directory = tempfile.mkdtemp()
+    >>> filename = os.path.join(directory, 'server')
+    >>> parent = open(filename + '.100', 'w')
+    >>> parent.write('''10:00:00.000100 socket(PF_INET, SOCK_STREAM, IPPROTO_TCP) = 3
+    ... 10:00:00.000200 clone(child_stack=0, flags=SIGCHLD, child_tidptr=0xb7) = 101
+    ... 10:00:00.000400 close(3) = 0''')
+    >>> parent.close()
+    >>> child = open(filename + '.101', 'w')
+    >>> child.write('''10:00:00.000300 send(3, "hi", 2, 0) = 2
+    ... 10:00:00.000500 close(3) = 0''')
+    >>> child.close()
+
+    >>> [pid for pid, name in preprocessor.get_strace_ff_filenames(filename)]
+    [100, 101]
+    >>> pid_filenames = preprocessor.get_strace_ff_filenames(filename)
+    >>> for line in preprocessor.get_lines_from_strace_ff_files(pid_filenames):
+    ...     print line.split('(')[0]
+    100  10:00:00.000100 socket
+    100  10:00:00.000200 clone
+    101  10:00:00.000300 send
+    100  10:00:00.000400 close
+    101  10:00:00.000500 close
+
+    The child's send is on the socket it inherited, which is only closed
+    once both processes have closed it.
+
+    >>> for syscall in preprocessor.preprocess_trace(preprocessor.get_trace_from_filename(filename), 'A'):
+    ...     print syscall
+    ('socket_syscall', (2, 1, 6), (0, None))
+    ('send_syscall', (0, 'hi', 0), (2, None))
+    ('close_syscall', (0,), (0, None))
+
+    Without timestamps the files are read one after another, with a
+    warning that the calls are out of order.
+
+    >>> for name in [filename + '.100', filename + '.101']:
+    ...     trace_file = open(name, 'w')
+    ...     trace_file.write('close(3) = 0\\n')
+    ...     trace_file.close()
+    >>> for line in preprocessor.get_lines_from_strace_ff_files(pid_filenames): # doctest: +ELLIPSIS
+    ...     print line.strip()
+    [Warning] '.../server.100' has no timestamps, so the 'strace -ff' files can't be merged in the order the calls were made. Capture with -tt or -ttt.
+    100  close(3) = 0
+    101  close(3) = 0
+
+    >>> os.remove(filename + '.100')
+    >>> os.remove(filename + '.101')
+    >>> os.rmdir(directory)
+    """
+    return
+
+def test_trace_cache():
+    """
+    str -> generator of (str, tuple, tuple)
+
+    The first read of a trace writes a cache next to it, which later reads
+    use instead of parsing the trace.
+
+    >>> filename = write_trace(TRACE)
+    >>> preprocessor.ENABLE_TRACE_CACHE = False
+    >>> plain = list(preprocessor.get_trace_from_filename(filename))
+
+    >>> preprocessor.ENABLE_TRACE_CACHE = True
+    >>> list(preprocessor.get_trace_from_filename(filename)) == plain
+    True
+    >>> cache_filename = filename + preprocessor.TRACE_CACHE_EXTENSION
+    >>> cache_file = preprocessor.open_trace_cache(cache_filename, filename)
+    >>> sum(preprocessor.get_trace_batches_from_cache(cache_file), []) == plain
+    True
+    >>> list(preprocessor.get_trace_from_filename(filename)) == plain
+    True
+
+    A cache isn't written if the trace isn't read to the end.
+
+    >>> os.remove(cache_filename)
+    >>> batches = preprocessor.get_trace_batches_from_filename(filename)
+    >>> batch = batches.next()
+    >>> batches.close()
+    >>> os.path.exists(cache_filename)
+    False
+
+    The cache is out of date once the parser or the trace changes.
+
+    >>> len(list(preprocessor.get_trace_from_filename(filename)))
+    4
+    >>> old_version = preprocessor.PARSER_VERSION
+    >>> preprocessor.PARSER_VERSION = 'changed'
+    >>> print preprocessor.open_trace_cache(cache_filename, filename)
+    None
+    >>> preprocessor.PARSER_VERSION = old_version
+
+    >>> trace_file = open(filename, 'a')
+    >>> trace_file.write('\\n7  close(4) = 0')
+    >>> trace_file.close()
+    >>> print preprocessor.open_trace_cache(cache_filename, filename)
+    None
+    >>> len(list(preprocessor.get_trace_from_filename(filename)))
+    5
+
+    >>> preprocessor.ENABLE_TRACE_CACHE = False
+    >>> os.remove(filename)
+    >>> os.remove(cache_filename)
+    """
+    return
+
+def test_timing():
+    """
+    str -> generator of (str, tuple, tuple)
+
+    Timestamps and durations survive preprocessing and the trace cache.
+
+    >>> filename = write_trace('''7  10:00:00.000100 socket(PF_INET, SOCK_STREAM, IPPROTO_TCP) = 3 <0.000010>
+    ... 7  10:00:00.000200 close(3) = 0 <0.000020>''')
+    >>> preprocessor.ENABLE_TRACE_CACHE = True
+    >>> for trace in range(2):
+    ...     for syscall in preprocessor.preprocess_trace(preprocessor.get_trace_from_filename(filename), 'A'):
+    ...         print syscall, syscall.timestamp, syscall.duration
+    ('socket_syscall', (2, 1, 6), (0, None)) 36000.0001 1e-05
+    ('close_syscall', (0,), (0, None)) 36000.0002 2e-05
+    ('socket_syscall', (2, 1, 6), (0, None)) 36000.0001 1e-05
+    ('close_syscall', (0,), (0, None)) 36000.0002 2e-05
+
+    >>> preprocessor.ENABLE_TRACE_CACHE = False
+    >>> os.remove(filename)
+    >>> os.remove(filename + preprocessor.TRACE_CACHE_EXTENSION)
+    """
+    return
+
+def test_fd_annotations():
+    """
+    str -> generator of (str, tuple, tuple)
+
+    Calls on files and pipes in a strace -yy trace are dropped by the
+    parser, and the socket annotations are checked against the sockets
+    the preprocessor is tracking, through the trace cache too.
+
+    >>> filename = write_trace('''7  socket(PF_INET, SOCK_STREAM, IPPROTO_TCP) = 3<TCP:[1001]>
+    ... 7  read(5</var/log/x>, "log", 3) = 3
+    ... 7  connect(3<TCP:[1001]>, {sa_family=AF_INET, sin_port=htons(80), sin_addr=inet_addr("10.0.0.2")}, 16) = 0
+    ... 7  write(3<TCP:[10.0.0.1:4000->10.0.0.2:8080]>, "hi", 2) = 2
+    ... 7  write(4<pipe:[1002]>, "x", 1) = 1
+    ... 7  send(6<UDP:[10.0.0.1:5000->10.0.0.3:53]>, "q", 1, 0) = 1
+    ... 7  close(3<TCP:[10.0.0.1:4000->10.0.0.2:8080]>) = 0''')
+    >>> preprocessor.ENABLE_TRACE_CACHE = True
+    >>> for trace in range(2):
+    ...     for syscall in preprocessor.preprocess_trace(preprocessor.get_trace_from_filename(filename), 'A'):
+    ...         print syscall
+    ('socket_syscall', (2, 1, 6), (0, None))
+    ('connect_syscall', (0, '10.0.0.2', 80), (0, None))
+    [Warning] Socket A0 (fd 3 of process 7) is connected to 10.0.0.2:8080, not 10.0.0.2:80 as the trace suggests
+    ('write_syscall', (0, 'hi'), (2, None))
+    [Warning] fd 6 of process 7 is a UDP socket, but the call that created it was not in the trace
+    ('close_syscall', (0,), (0, None))
+    ('socket_syscall', (2, 1, 6), (0, None))
+    ('connect_syscall', (0, '10.0.0.2', 80), (0, None))
+    [Warning] Socket A0 (fd 3 of process 7) is connected to 10.0.0.2:8080, not 10.0.0.2:80 as the trace suggests
+    ('write_syscall', (0, 'hi'), (2, None))
+    [Warning] fd 6 of process 7 is a UDP socket, but the call that created it was not in the trace
+    ('close_syscall', (0,), (0, None))
+
+    >>> preprocessor.ENABLE_TRACE_CACHE = False
+    >>> os.remove(filename)
+    >>> os.remove(filename + preprocessor.TRACE_CACHE_EXTENSION)
+    """
+    return
+
+def test_duplicate_fds():
+    """
+    list of (str, tuple, tuple) -> generator of (str, tuple, tuple)
+
+    A socket is only closed once the last fd referring to it is closed or
+    reused, and sockets still open at the end of the trace are closed.
+
+    >>> trace = [('socket_syscall', (7, 2, 1, 6), (3, None)),
+    ...          ('dup_syscall', (7, 3), (4, None)),
+    ...          ('socket_syscall', (7, 2, 1, 6), (5, None)),
+    ...          ('close_syscall', (7, 3), (0, None)),
+    ...          ('dup2_syscall', (7, 5, 4), (4, None)),
+    ...          ('close_syscall', (7, 5), (0, None))]
+    >>> for syscall in preprocessor.preprocess_trace(trace, 'A'):
+    ...     print syscall
+    ('socket_syscall', (2, 1, 6), (0, None))
+    ('socket_syscall', (2, 1, 6), (1, None))
+    ('close_syscall', (0,), (0, None))
+    ('close_syscall', (1,), (0, None))
+    """
+    return
+
+def test_clone_fds():
+    """
+    list of (str, tuple, tuple) -> generator of (str, tuple, tuple)
+
+    A child cloned without CLONE_FILES starts with its parent's fds, which
+    either process can then change without affecting the other.
+
+    >>> trace = [('socket_syscall', (7, 2, 1, 6), (3, None)),
+    ...          ('clone_syscall', (7, 0x11), (8, None)),
+    ...          ('close_syscall', (7, 3), (0, None)),
+    ...          ('socket_syscall', (7, 2, 1, 6), (3, None)),
+    ...          ('send_syscall', (8, 3, 'child', 0), (5, None)),
+    ...          ('send_syscall', (7, 3, 'parent', 0), (6, None)),
+    ...          ('close_syscall', (8, 3), (0, None))]
+    >>> for syscall in preprocessor.preprocess_trace(trace, 'A'):
+    ...     print syscall
+    ('socket_syscall', (2, 1, 6), (0, None))
+    ('socket_syscall', (2, 1, 6), (1, None))
+    ('send_syscall', (0, 'child', 0), (5, None))
+    ('send_syscall', (1, 'parent', 0), (6, None))
+    ('close_syscall', (0,), (0, None))
+    ('close_syscall', (1,), (0, None))
+    """
+    return
+
+def test_ignored_addrs():
+    """
+    list of (str, tuple, tuple) -> generator of (str, tuple, tuple)
+
+    Once a socket connects or binds to an ignored address, only its
+    connects and final close are passed on.
+
+    >>> trace = [('socket_syscall', (7, 2, 2, 0), (3, None)),
+    ...          ('connect_syscall', (7, 3, '127.0.0.1', 53), (0, None)),
+    ...          ('send_syscall', (7, 3, 'query', 0), (5, None)),
+    ...          ('recv_syscall', (7, 3, 'answer', 512, 0), (6, None)),
+    ...          ('connect_syscall', (7, 3, '10.0.0.1', 53), (0, None)),
+    ...          ('send_syscall', (7, 3, 'query', 0), (5, None)),
+    ...          ('socket_syscall', (7, 2, 1, 6), (4, None)),
+    ...          ('bind_syscall', (7, 4, '127.0.0.1', 8080), (0, None)),
+    ...          ('listen_syscall', (7, 4, 5), (0, None)),
+    ...          ('close_syscall', (7, 4), (0, None))]
+    >>> is_ignored_addr = lambda ip, port: ip == '127.0.0.1'
+    >>> for syscall in preprocessor.preprocess_trace(trace, 'A', True, is_ignored_addr):
+    ...     print syscall
+    ('socket_syscall', (2, 2, 0), (0, None))
+    ('connect_syscall', (0, '127.0.0.1', 53), (0, None))
+    ('connect_syscall', (0, '10.0.0.1', 53), (0, None))
+    ('send_syscall', (0, 'query', 0), (5, None))
+    ('socket_syscall', (2, 1, 6), (1, None))
+    ('bind_syscall', (1, '127.0.0.1', 8080), (0, None))
+    ('close_syscall', (1,), (0, None))
+    ('close_syscall', (0,), (0, None))
+    """
+    return
+
+def test_structured_traces():
+    """
+    str -> generator of (str, tuple, tuple)
+
+    The format of a trace file is chosen by its extension, past any
+    compression extension.
+
+    >>> preprocessor.get_trace_format('trace.ndjson')
+    'ndjson'
+    >>> preprocessor.get_trace_format('trace.jsonl.gz')
+    'ndjson'
+    >>> preprocessor.get_trace_format('trace.msgpack.xz')
+    'msgpack'
+    >>> preprocessor.get_trace_format('trace.strace.gz')
+    'strace'
+
+    NDJSON records produce the same system calls as the strace output they
+    were converted from, with byte strings, tuples and timing restored.
+
+    >>> filename = write_trace('''7  socket(PF_INET, SOCK_STREAM, IPPROTO_TCP) = 3
+    ... 7  connect(3, {sa_family=AF_INET, sin_port=htons(80), sin_addr=inet_addr("10.0.0.1")}, 16) = 0
+    ... 7  send(3, "ping", 4, 0) = 4
+    ... 7  close(3) = 0''')
+    >>> plain = list(preprocessor.get_trace_from_filename(filename))
+    >>> os.remove(filename)
+
+    >>> filename = write_trace('''["socket_syscall", [7, 2, 1, 6], [3, null]]
+    ...
+    ... ["connect_syscall", [7, 3, "10.0.0.1", 80], [0, null]]
+    ... ["send_syscall", [7, 3, "ping", 0], [4, null]]
+    ... ["close_syscall", [7, 3], [0, null]]''')
+    >>> os.rename(filename, filename + '.ndjson')
+    >>> list(preprocessor.get_trace_from_filename(filename + '.ndjson')) == plain
+    True
+
+    >>> gz_file = gzip.open(filename + '.jsonl.gz', 'wb')
+    >>> gz_file.write('''["getsockname_syscall", [7, 3], [["10.0.0.1", 4000], null], [36000.0001, 1e-05]]
+    ... ["poll_syscall", [7, [3], [], [], 0], [[[3], []], null], [null, null]]
+    ... ["write_syscall", [7, 3, "\\\\u00ff\\\\u0000"], [2, null], [36000.0002, null], "TCP:[1001]"]''')
+    238
+    >>> gz_file.close()
+    >>> for syscall in preprocessor.get_trace_from_filename(filename + '.jsonl.gz'):
+    ...     print repr(syscall), syscall.timestamp, syscall.duration
+    ('getsockname_syscall', (7, 3), (('10.0.0.1', 4000), None)) 36000.0001 1e-05
+    ('poll_syscall', (7, [3], [], [], 0), (([3], []), None)) None None
+    ('write_syscall', (7, 3, '\\\\xff\\\\x00'), (2, None)) 36000.0002 None
+
+    Payloads in records are the bytes themselves, and come out escaped the
+    way strace prints them, so backslashes and newlines survive being
+    unescaped again.
+
+    >>> escaped_filename = write_trace('''["send_syscall", [7, 3, "C:\\\\\\\\", 0], [3, null]]
+    ... ["recv_syscall", [7, 3, "a\\\\nb\\\\\\\\n", 100, 0], [5, null]]''')
+    >>> os.rename(escaped_filename, escaped_filename + '.ndjson')
+    >>> for syscall in preprocessor.get_trace_from_filename(escaped_filename + '.ndjson'):
+    ...     print syscall, repr(syscall[1][2].decode('string_escape'))
+    ('send_syscall', (7, 3, 'C:\\\\\\\\', 0), (3, None)) 'C:\\\\'
+    ('recv_syscall', (7, 3, 'a\\\\nb\\\\\\\\n', 100, 0), (5, None)) 'a\\nb\\\\n'
+    >>> os.remove(escaped_filename + '.ndjson')
+
+    Bad records are reported with their line number.
+
+    >>> bad_filename = write_trace('''["close_syscall", [7, 3], [0, null]]
+    ... ["close_syscall", [7, 3], [0, null]''')
+    >>> os.rename(bad_filename, bad_filename + '.ndjson')
+    >>> list(preprocessor.get_trace_from_filename(bad_filename + '.ndjson')) # doctest: +ELLIPSIS
+    Traceback (most recent call last):
+    ...
+    Exception: Line 2 of '....ndjson' is not valid JSON
+
+    >>> os.remove(filename + '.ndjson')
+    >>> os.remove(filename + '.jsonl.gz')
+    >>> os.remove(bad_filename + '.ndjson')
+    """
+    return
+
+def test_payload_digests():
+    """
+    str -> generator of (str, tuple, tuple)
+
+    With ENABLE_PAYLOAD_DIGESTS set, payloads of calls on sockets are
+    replaced by digests of the bytes the call returned.
+
+    >>> filename = write_trace(TRACE)
+    >>> preprocessor.ENABLE_PAYLOAD_DIGESTS = True
+    >>> for syscall in preprocessor.preprocess_trace(preprocessor.get_trace_from_filename(filename), 'A'):
+    ...     print syscall
+    ('socket_syscall', (2, 1, 6), (0, None))
+    ('connect_syscall', (0, '10.0.0.1', 80), (0, None))
+    ('send_syscall', (0, 'GET /, HTTP/1.0\\r\\n\\r\\n', 0), (19, None))
+    ('close_syscall', (0,), (0, None))
+    >>> trace = preprocessor.preprocess_trace(preprocessor.get_trace_from_filename(filename), 'A')
+    >>> send = list(trace)[2]
+    >>> type(send[1][1]).__name__, len(send[1][1])
+    ('PayloadDigest', 19)
+    >>> preprocessor.ENABLE_PAYLOAD_DIGESTS = False
+    >>> os.remove(filename)
+    """
+    return
+
+# Make sure doctests run when script is run
+if __name__ == '__main__':
+    import doctest
+    print doctest.testmod(verbose=False)
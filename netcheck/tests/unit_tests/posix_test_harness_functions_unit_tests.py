@@ -0,0 +1,434 @@
+"""
+- This file contains unit doc tests for the strace parser in
+  posix_test_harness_functions.py.
+- To run the tests, run the following command from the netcheck/ directory:
+  'python -m tests.unit_tests.posix_test_harness_functions_unit_tests'
+"""
+
+import posix_test_harness_functions as parser
+
+
+def test_tokenize_parameters():
+    """
+    str -> listof str
+
+    Splits the arguments of a system call on top-level ", " separators.
+
+    ### test0: plain arguments ###
+
+    >>> parser.tokenizeParameters('3, 1024, 0')
+    ['3', '1024', '0']
+
+    >>> parser.tokenizeParameters('')
+    ['']
+
+
+    ### test1: separators and escaped quotes inside payloads ###
+
+    >>> parser.tokenizeParameters('6, "a, b\\\\", c", 8, MSG_PEEK')
+    ['6', '"a, b\\\\", c"', '8', 'MSG_PEEK']
+
+    >>> parser.tokenizeParameters('6, "ends in a backslash\\\\\\\\", 22')
+    ['6', '"ends in a backslash\\\\\\\\"', '22']
+
+
+    ### test2: truncated payloads keep their "..." marker ###
+
+    >>> parser.tokenizeParameters('6, "x, y"..., 4096, 0')
+    ['6', '"x, y"...', '4096', '0']
+
+
+    ### test3: structs and fd sets are single arguments ###
+
+    >>> parser.tokenizeParameters('3, {sa_family=AF_INET, sin_port=htons(80), sin_addr=inet_addr("1.2.3.4")}, [16]')
+    ['3', '{sa_family=AF_INET, sin_port=htons(80), sin_addr=inet_addr("1.2.3.4")}', '[16]']
+
+    >>> parser.tokenizeParameters('5, [3 4], NULL, NULL, {1, 0}')
+    ['5', '[3 4]', 'NULL', 'NULL', '{1, 0}']
+
+    >>> parser.tokenizeParameters('6, [{"a, }", 4}, {"b", 1}], 2')
+    ['6', '[{"a, }", 4}, {"b", 1}]', '2']
+    """
+    return
+
+def test_parse_sockaddr():
+    """
+    str -> (str, int)
+
+    Extracts the address and port of an AF_INET or AF_INET6 sockaddr.
+
+    >>> parser.parseSockaddr('{sa_family=AF_INET, sin_port=htons(8080), sin_addr=inet_addr("10.0.0.1")}')
+    ('10.0.0.1', 8080)
+
+    >>> parser.parseSockaddr('{sa_family=AF_INET6, sin6_port=htons(80), inet_pton(AF_INET6, "::1", &sin6_addr), sin6_flowinfo=0, sin6_scope_id=0}')
+    ('::1', 80)
+
+    >>> parser.parseSockaddr('{sa_family=AF_FILE, path="/dev/log"}')
+    (-1, -1)
+
+    >>> parser.parseSockaddr('0xbfb3c4d0')
+    (-1, -1)
+
+    parseSockaddrStruct also gives the family, and understands AF_UNIX
+    and AF_NETLINK addresses.
+
+    >>> parser.parseSockaddrStruct('{sa_family=AF_INET, sin_port=htons(53), sin_addr=inet_addr("8.8.8.8")}')
+    ('AF_INET', '8.8.8.8', 53)
+    >>> parser.parseSockaddrStruct('{sa_family=AF_UNIX, sun_path="/var/run/nscd/socket"}')
+    ('AF_UNIX', '/var/run/nscd/socket', None)
+    >>> parser.parseSockaddrStruct('{sa_family=AF_UNIX, sun_path=@"/tmp/.X11-unix/X0"}')
+    ('AF_UNIX', '@/tmp/.X11-unix/X0', None)
+    >>> parser.parseSockaddrStruct('{sa_family=AF_NETLINK, nl_pid=0, nl_groups=00000010}')
+    ('AF_NETLINK', 0, 16)
+    >>> parser.parseSockaddrStruct('0xbfb3c4d0')
+    (None, -1, -1)
+
+    Structs that haven't been used recently are forgotten.
+
+    >>> old_max = parser.MAX_SOCKADDRS
+    >>> parser.MAX_SOCKADDRS = 2
+    >>> parser.SOCKADDR_CACHE.clear()
+    >>> parser.OLD_SOCKADDR_CACHE.clear()
+    >>> sockaddr = '{sa_family=AF_INET, sin_port=htons(%d), sin_addr=inet_addr("1.2.3.4")}'
+    >>> for port in [1, 2, 1, 3, 1, 4, 5]:
+    ...     result = parser.parseSockaddrStruct(sockaddr % port)
+    >>> sorted(port for family, ip, port in parser.SOCKADDR_CACHE.values() +
+    ...                                      parser.OLD_SOCKADDR_CACHE.values())
+    [1, 3, 4, 5]
+    >>> parser.MAX_SOCKADDRS = old_max
+    """
+    return
+
+def test_split_and_combine():
+    """
+    str -> int
+
+    Resolves a '|' separated flag expression to its value.
+
+    >>> parser.splitAndCombine('SOCK_STREAM')
+    1
+
+    >>> parser.splitAndCombine('SOCK_STREAM|SOCK_NONBLOCK|SOCK_CLOEXEC')
+    2049
+
+    >>> 'SOCK_STREAM|SOCK_NONBLOCK|SOCK_CLOEXEC' in parser.FLAG_EXPRESSION_CACHE
+    True
+
+    >>> parser.splitAndCombine('CLONE_VM|NOT_A_CONSTANT')
+    -1
+
+    >>> parser.convert('PF_INET6')
+    30
+
+    Lind constants convert never resolved still aren't.
+
+    >>> parser.convert('CSIGNAL'), parser.convert('F_FREESP')
+    (-1, -1)
+    """
+    return
+
+def test_pending_strace_table():
+    """
+    Interrupted system calls are matched with their resumed halves
+    per (pid, command), and ones that never resume are evicted.
+
+    >>> from StringIO import StringIO
+    >>> trace = StringIO('''7  recv(3,  <unfinished ...>
+    ... 8  recv(4,  <unfinished ...>
+    ... 8  <... recv resumed> "b", 10, 0) = 1
+    ... 7  <... recv resumed> "a", 10, 0) = 1
+    ... ''')
+    >>> parser.getNumberValidTraceLines(trace, -1)
+    [('recv_syscall', (8, 4, 'b', 10, 0), (1, None)), ('recv_syscall', (7, 3, 'a', 10, 0), (1, None))]
+
+    >>> parser.pendingStraceTable
+    {}
+
+    >>> old_limit = parser.PENDING_STRACE_LIMIT
+    >>> parser.PENDING_STRACE_LIMIT = 1
+    >>> orphans = parser.parseCounters.orphanedUnfinished
+    >>> trace = StringIO('''9  recv(3,  <unfinished ...>
+    ... 9  recv(5,  <unfinished ...>
+    ... 9  <... recv resumed> "c", 10, 0) = 1
+    ... ''')
+    >>> parser.getNumberValidTraceLines(trace, -1)
+    [('recv_syscall', (9, 5, 'c', 10, 0), (1, None))]
+
+    >>> parser.parseCounters.orphanedUnfinished - orphans
+    1
+
+    >>> parser.PENDING_STRACE_LIMIT = old_limit
+    """
+    return
+
+def test_get_valid_trace_lines():
+    """
+    Lines are parsed in batches of up to count system calls. A line that
+    can't be parsed doesn't lose the calls before it in a batch of count
+    calls; its error is raised by the next call instead.
+
+    >>> from StringIO import StringIO
+    >>> trace = StringIO('''7  listen(3, 5) = 0
+    ... 7  futex(0x8, FUTEX_WAKE, 1) = 0
+    ... 7  close(3) = 0
+    ... 7  poll([{fd=3, events=POLLIN}], 1, 0) = 0
+    ... 7  close(4) = 0
+    ... ''')
+    >>> parser.getValidTraceLines(trace, 1)
+    [('listen_syscall', (7, 3, 5), (0, None))]
+    >>> parser.getValidTraceLines(trace, 10)
+    [('close_syscall', (7, 3), (0, None))]
+
+    The error is held back for that trace alone.
+
+    >>> parser.getValidTraceLine(StringIO('''8  close(5) = 0
+    ... '''))
+    [('close_syscall', (8, 5), (0, None))]
+    >>> parser.getValidTraceLines(trace, 10)
+    Traceback (most recent call last):
+    ...
+    IndexError: list index out of range
+    >>> parser.getValidTraceLines(trace, None)
+    [('close_syscall', (7, 4), (0, None))]
+    >>> parser.getValidTraceLines(trace, None)
+    []
+
+    Parsing to the end of a trace raises the error straight away, as
+    there is no next call.
+
+    >>> parser.getNumberValidTraceLines(StringIO('''7  close(3) = 0
+    ... 7  poll([{fd=3, events=POLLIN}], 1, 0) = 0
+    ... 7  close(4) = 0
+    ... '''), -1)
+    Traceback (most recent call last):
+    ...
+    IndexError: list index out of range
+    >>> parser.pendingParseErrors
+    {}
+    """
+    return
+
+def test_syscall_name_prefilter():
+    """
+    Lines are accepted or dropped based on the system call name alone.
+
+    >>> def name(line):
+    ...     match = parser.SYSCALL_NAME_RE.match(line)
+    ...     return match and (match.group(1) or match.group(2), match.group(4))
+
+    >>> name('6675  mmap2(NULL, 8192, PROT_READ, MAP_PRIVATE, -1, 0) = 0xb7777000')
+    ('6675', 'mmap2')
+
+    >>> name('[pid   101] <... recv resumed> "late", 100, 0) = 4')
+    ('101', 'recv')
+
+    >>> name('12:34:56.123456 connect(3, {sa_family=AF_INET}, 16) = 0')
+    (None, 'connect')
+
+    >>> name('--- SIGCHLD (Child exited) @ 0 (0) ---')
+
+    >>> name('Process 101 detached')
+
+    >>> from StringIO import StringIO
+    >>> skipped = parser.parseCounters.ignoredCalls
+    >>> parser.getValidTraceLine(StringIO('''7  futex(0x8, FUTEX_WAKE, 1) = 0
+    ... 7  close(3) = 0
+    ... '''))
+    [('close_syscall', (7, 3), (0, None))]
+    >>> parser.parseCounters.ignoredCalls - skipped
+    1
+    """
+    return
+
+def test_timing():
+    """
+    Timestamps (-t, -tt, -ttt) and durations (-T) are kept as attributes
+    of the system call tuple. Traces without them give plain tuples.
+
+    >>> from StringIO import StringIO
+    >>> syscall = parser.getValidTraceLine(StringIO('''7  10:00:01.500000 close(3) = 0 <0.000020>
+    ... '''))[0]
+    >>> syscall
+    ('close_syscall', (7, 3), (0, None))
+    >>> syscall.timestamp, syscall.duration
+    (36001.5, 2e-05)
+
+    >>> syscall = parser.getValidTraceLine(StringIO('''1390000000.250000 listen(3, 5) = 0
+    ... '''))[0]
+    >>> syscall.timestamp, syscall.duration
+    (1390000000.25, None)
+
+    >>> type(parser.getValidTraceLine(StringIO('''7  close(3) = 0
+    ... '''))[0])
+    <type 'tuple'>
+
+    A "[pid N]" prefix and a timestamp both come before the call name.
+
+    >>> syscall = parser.getValidTraceLine(StringIO('''[pid  123] 12:00:00.123456 read(3, "hi", 4096) = 2 <0.000010>
+    ... '''))[0]
+    >>> syscall
+    ('read_syscall', (123, 3, 'hi', 4096), (2, None))
+    >>> syscall.timestamp, syscall.duration
+    (43200.123456, 1e-05)
+
+    Only a number in brackets after the result is a duration.
+
+    >>> parser.getValidTraceLine(StringIO('''7  close(3) = ? <unavailable>
+    ... '''))
+    [('close_syscall', (7, 3), (-1, '<unavailable>'))]
+
+    An unfinished call keeps the time it started and the duration printed
+    when it resumed.
+
+    >>> trace = StringIO('''8  10:00:02.000000 recv(4,  <unfinished ...>
+    ... 9  10:00:02.100000 close(5) = 0
+    ... 8  10:00:03.000000 <... recv resumed> "hi", 100, 0) = 2 <1.000000>
+    ... ''')
+    >>> parser.getValidTraceLine(trace)
+    [('close_syscall', (9, 5), (0, None))]
+    >>> syscall = parser.getValidTraceLine(trace)[0]
+    >>> syscall
+    ('recv_syscall', (8, 4, 'hi', 100, 0), (2, None))
+    >>> syscall.timestamp, syscall.duration
+    (36002.0, 1.0)
+
+    copyTiming gives a rewritten system call the timing of the original.
+
+    >>> parser.copyTiming(('close_syscall', (4,), (0, None)), syscall).timestamp
+    36002.0
+    """
+    return
+
+def test_lazy_payload():
+    """
+    read, write, send and recv payloads stay in the trace line until
+    they are used, and behave like the payload string when they are.
+
+    >>> from StringIO import StringIO
+    >>> syscall = parser.getValidTraceLine(StringIO('''7  send(5, "a, b), c"..., 100, MSG_NOSIGNAL) = 100
+    ... '''))[0]
+    >>> syscall
+    ('send_syscall', (7, 5, 'a, b), c', 0), (100, None))
+    >>> type(syscall[1][2]).__name__
+    'LazyPayload'
+    >>> str(syscall[1][2]) == 'a, b), c'
+    True
+    >>> type(parser.materializePayload(syscall)[1][2])
+    <type 'str'>
+
+    >>> parser.splitPayloadParameters('read(3, "", 4096) = 0', 1)
+    ['3', '', '4096']
+    >>> parser.getValidTraceLine(StringIO('''7  read(3, 0xbfb3c4d0, 4096) = -1 EAGAIN (Resource temporarily unavailable)
+    ... '''))
+    [('read_syscall', (7, 3, None, 4096), (-1, 'EAGAIN'))]
+    """
+    return
+
+def test_fd_annotations():
+    """
+    strace -yy fd annotations are taken out of the line. Reads, writes
+    and closes on files and pipes are dropped, and socket annotations are
+    kept with the call.
+
+    >>> from StringIO import StringIO
+    >>> trace = StringIO('''7  socket(PF_INET, SOCK_STREAM, IPPROTO_TCP) = 3<TCP:[1001]>
+    ... 7  read(5</var/log/x>, "<td>1</td>", 4096) = 10
+    ... 7  write(3<TCP:[10.0.0.1:4000->10.0.0.2:80]>, "<td>1</td>", 10) = 10
+    ... 7  dup2(3<TCP:[10.0.0.1:4000->10.0.0.2:80]>, 1</dev/pts/0>) = 1<TCP:[10.0.0.1:4000->10.0.0.2:80]>
+    ... ''')
+    >>> nonSocket = parser.parseCounters.nonSocketCalls
+    >>> parser.getNumberValidTraceLines(trace, -1)
+    [('socket_syscall', (7, 2, 1, 6), (3, None)), ('write_syscall', (7, 3, '<td>1</td>'), (10, None)), ('dup2_syscall', (7, 3, 1), (1, None))]
+    >>> parser.parseCounters.nonSocketCalls - nonSocket
+    1
+
+    >>> parser.parseFdAnnotation('TCP:[10.0.0.1:4000->10.0.0.2:80]')
+    ('TCP', ('10.0.0.1', 4000), ('10.0.0.2', 80))
+    >>> parser.parseFdAnnotation('TCPv6:[[::1]:4000->[::1]:80]')
+    ('TCPv6', ('::1', 4000), ('::1', 80))
+    >>> parser.parseFdAnnotation('TCP:[1001]')
+    ('TCP', None, None)
+    >>> parser.isSocketAnnotation('anon_inode:[eventpoll]')
+    False
+    """
+    return
+
+def test_register_syscall_parser():
+    """
+    str, function -> None
+
+    New system calls can be parsed by registering a parser for them.
+
+    >>> from StringIO import StringIO
+    >>> line = '42  fsync(3) = 0\\n'
+    >>> parser.getValidTraceLine(StringIO(line))
+    []
+
+    >>> def parseFsync(pid, parameters, straceResult, line):
+    ...     return ('fsync_syscall', (pid, int(parameters[0])), straceResult)
+    >>> parser.registerSyscallParser('fsync', parseFsync)
+    >>> parser.getValidTraceLine(StringIO(line))
+    [('fsync_syscall', (42, 3), (0, None))]
+
+    >>> del parser.SYSCALL_PARSERS['fsync']
+    >>> parser.ALL_COMMANDS.discard('fsync')
+    """
+    return
+
+def test_parse_counters():
+    """
+    Lines read, lines thrown away and why, calls parsed and payload
+    characters are counted in parseCounters.
+
+    >>> import json
+    >>> from StringIO import StringIO
+    >>> old_counters = parser.parseCounters
+    >>> parser.parseCounters = parser.ParseCounters()
+    >>> parser.getNumberValidTraceLines(StringIO('''Process 7 attached
+    ... 7  --- SIGCHLD {si_signo=SIGCHLD} ---
+    ... 7  futex(0x8, FUTEX_WAKE, 1) = 0
+    ... 7  connect(3, {sa_family=AF_UNIX, sun_path="/tmp/x"}, 110) = 0
+    ... 7  <... recv resumed> "x", 1, 0) = 1
+    ... 7  send(3, "hello", 5, 0) = 5
+    ... 7  recv(3, "hi"..., 10, 0) = 10
+    ... 7  send(3, "x", 1, 0
+    ... garbage
+    ... 7  +++ exited with 0 +++
+    ... '''), -1)
+    [('send_syscall', (7, 3, 'hello', 0), (5, None)), ('recv_syscall', (7, 3, 'hi', 10, 0), (10, None))]
+    >>> counts = parser.parseCounters.asDict()
+    >>> counts['lines'], sorted(counts['syscalls'].items()), counts['payloadChars']
+    (10, [('recv_syscall', 1), ('send_syscall', 1)], 7)
+    >>> print json.dumps(counts['rejected'], sort_keys=True, indent=0,
+    ...                  separators=(',', ': '))
+    {
+    "ignoredCalls": 1,
+    "incompleteLines": 1,
+    "nonSocketCalls": 0,
+    "orphanedResumed": 1,
+    "orphanedUnfinished": 0,
+    "parseErrors": 0,
+    "processLines": 2,
+    "signalLines": 1,
+    "unimplementedCalls": 1,
+    "unknownCalls": 0,
+    "unrecognizedLines": 1
+    }
+
+    Payloads are counted as the text strace printed, escapes included.
+
+    >>> parser.parseCounters = parser.ParseCounters()
+    >>> parser.getValidTraceLine(StringIO('''7  send(3, "\\\\r\\\\n", 2, 0) = 2
+    ... '''))
+    [('send_syscall', (7, 3, '\\\\r\\\\n', 0), (2, None))]
+    >>> parser.parseCounters.payloadChars
+    4
+
+    >>> parser.parseCounters = old_counters
+    """
+    return
+
+# Make sure doctests run when script is run
+if __name__ == '__main__':
+    import doctest
+    print doctest.testmod(verbose=False)
@@ -0,0 +1,71 @@
+"""
+- This file contains unit doc tests for the functions in trace_index.py.
+- To run the tests, run the following command from the netcheck/ directory:
+  'python -m tests.unit_tests.trace_index_unit_tests'
+"""
+
+import os
+
+import posix_preprocessor
+import trace_index
+
+
+def test_get_config_trace_filenames():
+    """
+    str -> list of str
+
+    Trace files are found relative to the configuration file.
+
+    >>> filenames = trace_index.get_config_trace_filenames(
+    ...     'config_files/mtu_detection/mtu_detection_config.txt')
+    >>> [os.path.relpath(filename) for filename in filenames]
+    ['config_files/mtu_detection/mtu.brown.strace', 'config_files/mtu_detection/mtu.washington.strace', 'config_files/mtu_detection/mtu.uottawa.strace', 'config_files/mtu_detection/mtu.virtues.fi.strace']
+    """
+    return
+
+def test_find_config_files():
+    """
+    list of str -> list of str
+
+    Directories are searched for configuration files, other paths are
+    used as they are.
+
+    >>> trace_index.find_config_files(['config_files/mtu_detection', 'more/example_config.txt'])
+    ['config_files/mtu_detection/mtu_detection_config.txt', 'more/example_config.txt']
+    """
+    return
+
+def test_index_trace():
+    """
+    str -> (str, int or None, int, float, str or None)
+
+    Traces that can't be read are reported back instead of exiting the
+    pool worker.
+
+    >>> trace_index.index_trace('config_files')
+    'config_files' is a directory...exiting
+    <BLANKLINE>
+    ('config_files', None, 0, 0.0, 'could not be read')
+
+    Each trace is parsed from a clean slate, so a call left unfinished at
+    the end of one trace isn't finished by a resumed line in the next.
+
+    >>> import tempfile
+    >>> directory = tempfile.mkdtemp()
+    >>> first = os.path.join(directory, 'first.strace')
+    >>> second = os.path.join(directory, 'second.strace')
+    >>> open(first, 'w').write('7  recv(3,  <unfinished ...>\\n')
+    >>> open(second, 'w').write('7  <... recv resumed> "hi", 100, 0) = 2\\n')
+    >>> [trace_index.index_trace(name)[1:3] for name in [first, second]]
+    [(1, 0), (1, 0)]
+    >>> for name in os.listdir(directory):
+    ...     os.remove(os.path.join(directory, name))
+    >>> os.rmdir(directory)
+    >>> posix_preprocessor.ENABLE_TRACE_CACHE = False
+    """
+    return
+
+# Make sure doctests run when script is run
+if __name__ == '__main__':
+    import doctest
+    print doctest.testmod(verbose=False)
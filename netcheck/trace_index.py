@@ -0,0 +1,193 @@
+"""
+Purpose: To parse every trace referenced by a set of configuration files
+ahead of time, using a pool of processes, and store the results as trace
+caches (see posix_preprocessor) so later verification runs can skip
+parsing the strace output.
+
+Usage: python netcheck.py index [-j PROCESSES] CONFIG_FILE_OR_DIR [...]
+
+"""
+
+import posix_preprocessor
+import posix_test_harness_functions as parser
+import multiprocessing
+import os
+import sys
+import time
+
+
+# Directories given to the indexer are searched for configuration files
+# with this extension.
+CONFIG_EXTENSION = '.txt'
+
+
+
+def get_config_trace_filenames(config_filename):
+  """
+  Returns the names of the trace files referenced by 'trace' commands in
+  the given configuration file. Trace files are relative to the directory
+  the configuration file is in.
+  """
+
+  base_dir = os.path.split(os.path.abspath(config_filename))[0]
+  filenames = []
+
+  config_file = open(config_filename, 'r')
+
+  for line in config_file:
+    tokens = line.split()
+    if len(tokens) >= 2 and tokens[0].lower() == 'trace':
+      filenames.append(os.path.join(base_dir, tokens[1]))
+
+  config_file.close()
+  return filenames
+
+
+
+def find_config_files(paths):
+  """
+  Returns the configuration files named by paths, searching any
+  directories for files ending in CONFIG_EXTENSION.
+  """
+
+  config_filenames = []
+
+  for path in paths:
+    if not os.path.isdir(path):
+      config_filenames.append(path)
+      continue
+
+    for dirpath, dirnames, filenames in os.walk(path):
+      dirnames.sort()
+      for filename in sorted(filenames):
+        if filename.endswith(CONFIG_EXTENSION):
+          config_filenames.append(os.path.join(dirpath, filename))
+
+  return config_filenames
+
+
+
+def index_trace(filename):
+  """
+  Parses the given trace file and writes its trace cache, unless it
+  already has an up to date one. Returns (filename, lines, syscalls,
+  seconds, error), where lines is None if the trace was already cached
+  and error is None unless the trace couldn't be indexed.
+
+  Runs in a pool worker, so failures (including the sys.exit calls the
+  preprocessor makes for traces it can't read) are handed back to main
+  rather than raised, which would leave the pool waiting on the worker.
+  """
+
+  cache_filename = posix_preprocessor.get_trace_cache_filename(filename)
+  cache_file = posix_preprocessor.open_trace_cache(cache_filename, filename)
+  if cache_file is not None:
+    cache_file.close()
+    return filename, None, 0, 0.0, None
+
+  posix_preprocessor.ENABLE_TRACE_CACHE = True
+
+  # Pool workers index many traces, so start each one with the parser
+  # state a fresh process would have, or an unfinished call left over from
+  # the last trace could be matched with a resumed line in this one.
+  parser.pendingStraceTable = {}
+  parser.traceLineNumber = 0
+  parser.lastPendingSweep = 0
+  parser.pendingParseErrors = {}
+  parser.parseCounters = parser.ParseCounters()
+
+  syscalls = 0
+
+  start = time.time()
+  try:
+    for batch in posix_preprocessor.get_trace_batches_from_filename(filename):
+      syscalls += len(batch)
+  except SystemExit:
+    return filename, None, 0, 0.0, "could not be read"
+  except Exception, e:
+    return filename, None, 0, 0.0, "%s: %s" % (type(e).__name__, e)
+  elapsed = time.time() - start
+
+  return filename, parser.traceLineNumber, syscalls, elapsed, None
+
+
+
+def main(args):
+  """
+  Entry point for 'python netcheck.py index'.
+  """
+
+  processes = None
+
+  if len(args) >= 2 and args[0] == '-j':
+    processes = int(args[1])
+    args = args[2:]
+
+  if not args:
+    print "usage: python netcheck.py index [-j PROCESSES] CONFIG_FILE_OR_DIR [...]"
+    return
+
+  trace_filenames = []
+  seen = set()
+
+  for config_filename in find_config_files(args):
+    for filename in get_config_trace_filenames(config_filename):
+      if filename in seen:
+        continue
+      seen.add(filename)
+
+      if os.path.isfile(filename):
+        trace_filenames.append(filename)
+      elif posix_preprocessor.get_strace_ff_filenames(filename):
+        print "not cached ('strace -ff' files)", filename
+      else:
+        print "missing", filename
+
+  if not trace_filenames:
+    return
+
+  total_lines = 0
+  total_time = 0.0
+
+  print "%-60s %10s %8s %8s %12s" % ("trace", "lines", "syscalls",
+                                     "seconds", "lines/sec")
+
+  start = time.time()
+  pool = multiprocessing.Pool(processes)
+
+  failed = 0
+
+  for filename, lines, syscalls, elapsed, error in pool.imap(index_trace,
+                                                             trace_filenames):
+    name = os.path.relpath(filename)
+    if name.startswith(os.pardir):
+      name = filename
+
+    if error is not None:
+      print "%-60s %10s (%s)" % (name, "failed", error)
+      failed += 1
+      continue
+
+    if lines is None:
+      print "%-60s %10s" % (name, "cached")
+      continue
+
+    total_lines += lines
+    total_time += elapsed
+
+    print "%-60s %10d %8d %8.2f %12.0f" % (name, lines, syscalls, elapsed,
+                                           lines / max(elapsed, 1e-9))
+
+  pool.close()
+  pool.join()
+  wall_time = time.time() - start
+
+  print "%-60s %10d %8s %8.2f %12.0f" % ("TOTAL (parse time)", total_lines, "",
+                                         total_time,
+                                         total_lines / max(total_time, 1e-9))
+  print "%-60s %10s %8s %8.2f %12.0f" % ("TOTAL (wall time)", "", "",
+                                         wall_time,
+                                         total_lines / max(wall_time, 1e-9))
+
+  if failed:
+    print failed, "trace(s) could not be indexed"
@@ -9,6 +9,14 @@ Purpose: To order system calls from traces collected across multiple trace.
 import trace_output
 
 
+# When choosing between system calls with the same priority, try the one
+# that started first if the traces were captured with timestamps (system
+# call tuples with a timestamp attribute). This relies on the clocks of
+# the traced hosts being reasonably well synchronized, so it is off unless
+# asked for.
+ORDER_BY_TIMESTAMP = False
+
+
 ###### Exception Classes 
 
 class SyscallException(Exception):
@@ -60,7 +68,8 @@ def verify_traces(trace_dict, model, priority=None):
   <Arguments>
     trace_dict:
       A dictionary mapping trace IDs to iterable objects that yield
-      (syscall_name, args, ret) tuples.
+      (syscall_name, args, ret) tuples. The tuples may also have
+      timestamp and duration attributes.
     model:
       A dictionary mapping syscall names to functions of the form
       syscall_name(trace_id, args, ret) that return expected ret values.
@@ -129,12 +138,17 @@ def choose_next_syscall(syscall_dict, model, priority=None):
 
   syscall_list = syscall_dict.items()
 
-  # Sort the system calls based on priority.
-  if priority:
+  # Sort the system calls based on priority, then on when they started.
+  if priority or ORDER_BY_TIMESTAMP:
     def syscall_key(item):
       trace_id, syscall = item
       name, args, ret = syscall
-      return priority(trace_id, name, args, ret)
+      key = 0
+      if priority:
+        key = priority(trace_id, name, args, ret)
+      if ORDER_BY_TIMESTAMP:
+        return key, getattr(syscall, 'timestamp', None)
+      return key
 
     syscall_list.sort(key=syscall_key)
 